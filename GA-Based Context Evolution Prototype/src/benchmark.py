@@ -0,0 +1,310 @@
+"""
+性能基准
+逻辑：setup / context / selection 对模拟链路中的固定开销做微基准测试，不调用任何LLM；
+      evolution 经离线模拟后端（LLM_BACKEND=fake，见 src/fake_llm.py）跑完整进化，测端到端吞吐与延迟
+目的：量化优化前后每个Agent的准备成本与整个进化循环的性能
+
+用法: python -m src.benchmark setup [--iterations N] [--scenario NAME]
+      python -m src.benchmark context [--steps N] [--scenario NAME]
+      python -m src.benchmark evolution [--populations 8,32] [--generations 2] [--concurrency 1,8] [--out DIR]
+      python -m src.benchmark selection [--populations 1000,10000,50000] [--iterations N]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+from typing import Callable, Dict, List
+
+from rich.console import Console
+from rich.table import Table
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.context import get_context_policy, extractive_summary
+from src.environment import EnvironmentManager
+from src.models import EnvironmentStep, Gene
+from src.prompts import agent_gene_prompt, build_agent_system_message, build_agent_turn_message, assemble_agent_prompt
+from src.simulation import create_simulation_graph, SimulationRuntime
+from src.judge_cache import JudgeCache, set_judge_cache
+from src.population import PopulationStats
+
+console = Console()
+
+
+def _time_per_call(fn: Callable[[], object], iterations: int) -> Dict[str, float]:
+    """执行 fn 多次，返回单次耗时的中位数和均值（毫秒）"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": median(samples), "mean_ms": sum(samples) / len(samples)}
+
+
+def _parse_scenario_uncached(scenario_name: str, base_path: str = "data/environments") -> List[EnvironmentStep]:
+    """
+    无缓存的场景解析（共享运行时之前 EnvironmentManager.load_scenario 的代码路径）
+    逻辑：glob 场景目录下的txt文件，按文件名排序后逐个读取并按 '---' 拆分内容与裁判标准；不建索引、不计算内容哈希
+    目的：作为 setup 基准的 before 基线，不受当前场景索引的实现影响
+    """
+    scenario_path = Path(base_path) / scenario_name
+    if not scenario_path.exists():
+        raise FileNotFoundError(f"场景 {scenario_name} 在 {scenario_path} 未找到")
+    steps = []
+    for i, file_path in enumerate(sorted(scenario_path.glob("*.txt"), key=lambda p: p.name)):
+        with open(file_path, "r", encoding="utf-8") as f:
+            raw_content = f.read()
+        parts = raw_content.split("\n---\n", 1)
+        rubric = parts[1].strip() if len(parts) > 1 else "未提供具体评分标准，请根据目标常识判断。"
+        steps.append(EnvironmentStep(step_id=file_path.stem, content=parts[0].strip(), rubric=rubric,
+                                     order=i, file_path=str(file_path)))
+    return steps
+
+
+def bench_setup_overhead(iterations: int = 50, scenario_name: str = "tutorial_island") -> Dict[str, Dict[str, float]]:
+    """
+    每个Agent的准备开销
+    逻辑：before = 每次都编译图并从磁盘解析场景（旧 run_simulation 的行为，见 _parse_scenario_uncached）
+          after  = 共享 SimulationRuntime，命中场景缓存
+    目的：对比共享运行时带来的节省
+    """
+    def before():
+        create_simulation_graph()
+        _parse_scenario_uncached(scenario_name)
+
+    runtime = SimulationRuntime(EnvironmentManager(), scenario_name)
+    runtime.load_scenario()  # 预热缓存
+
+    def after():
+        runtime.app
+        runtime.load_scenario()
+
+    return {
+        "before": _time_per_call(before, iterations),
+        "after": _time_per_call(after, iterations),
+    }
+
+
+def _print_setup_report(report: Dict[str, Dict[str, float]]):
+    table = Table(title="每个Agent的准备开销")
+    table.add_column("模式", style="cyan")
+    table.add_column("中位数 (ms)", style="magenta")
+    table.add_column("均值 (ms)", style="yellow")
+    for mode, stats in report.items():
+        table.add_row(mode, f"{stats['median_ms']:.3f}", f"{stats['mean_ms']:.3f}")
+    console.print(table)
+    speedup = report["before"]["median_ms"] / max(report["after"]["median_ms"], 1e-9)
+    console.print(f"加速比: [bold green]{speedup:.1f}x[/bold green]")
+
+
+def bench_context_policies(steps: int = 20, scenario_name: str = "tutorial_island",
+                           policies=("full", "window", "budget", "summary")) -> Dict[str, List[int]]:
+    """
+    上下文策略对比
+    逻辑：在同一场景上回放固定的行动/反馈序列（不调用LLM），记录每个策略每步发送的prompt token数
+    目的：直接比较不同策略的每步与总token消耗
+    """
+    scenario = EnvironmentManager().load_scenario(scenario_name)
+    gene = Gene(identity="你是一位冒险的考古学家。你勇敢但谨慎。", strategy="我总是寻找环境中的细节。我会立即使用找到的物品。")
+    action = "我仔细观察四周，" + "检查每一个角落和物品，" * 8 + "然后拾起地上的生锈钥匙。"
+    feedback = "【系统】行动无效。" + "裁判认为你的行动与目标相关但尚未完成，" * 3
+
+    report = {}
+    for name in policies:
+        policy = get_context_policy(name, summarizer=extractive_summary)
+        history, summary, upto, per_step = [], "", 0, []
+        for i in range(steps):
+            env_content = scenario[i % len(scenario)].content
+            turn = build_agent_turn_message(100)
+            window = policy.select(history, build_agent_system_message(agent_gene_prompt(gene, summary), env_content), turn, summary, upto)
+            if window.summary is not None:
+                summary, upto = window.summary, window.summarized_upto
+            prompt = assemble_agent_prompt(build_agent_system_message(agent_gene_prompt(gene, summary), env_content), window.history, turn)
+            per_step.append(prompt.prompt_tokens)
+            history += [AIMessage(content=action), HumanMessage(content=feedback)]
+        report[name] = per_step
+    return report
+
+
+def _print_context_report(report: Dict[str, List[int]]):
+    table = Table(title="上下文策略: 每步prompt tokens")
+    table.add_column("策略", style="cyan")
+    table.add_column("第1步", style="white")
+    table.add_column("最后一步", style="yellow")
+    table.add_column("最大", style="magenta")
+    table.add_column("总计", style="green")
+    for name, per_step in report.items():
+        table.add_row(name, str(per_step[0]), str(per_step[-1]), str(max(per_step)), str(sum(per_step)))
+    console.print(table)
+
+
+def _mock_results(population: int) -> List[Dict]:
+    """离线构造一代评估结果（只含选择与报告用到的字段，基因在少量原型间复用）"""
+    rng = random.Random(0)
+    genes = [Gene(identity=f"原型{i}", strategy=f"策略{i}") for i in range(32)]
+    results = []
+    for i in range(population):
+        solved = rng.randint(0, 3)
+        energy = rng.randint(0, 100)
+        results.append({
+            "agent_id": f"mock_{i}", "fitness": solved * 100 + energy, "solved_steps_count": solved,
+            "final_energy": energy, "is_alive": energy > 0, "gene": genes[i % len(genes)],
+        })
+    return results
+
+
+def bench_selection(populations: List[int], iterations: int = 5) -> List[Dict]:
+    """
+    选择与报告的开销
+    逻辑：before = 旧实现（max/sum/next 各扫描一遍，整体排序两次，每个父代一次 random.sample 锦标赛）
+          after  = PopulationStats（一次提取数组，argpartition 取精英与展示行，向量化锦标赛）
+    目的：确认种群到上万个体时选择与报告仍近似线性
+    """
+    rows = []
+    for population in populations:
+        results = _mock_results(population)
+
+        def before():
+            best = max(r["fitness"] for r in results)
+            sum(r["fitness"] for r in results) / len(results)
+            next(r for r in results if r["fitness"] == best)
+            sorted(results, key=lambda x: x["fitness"], reverse=True)[:50]
+            ordered = sorted(results, key=lambda x: x["fitness"], reverse=True)
+            for _ in range(2 * (population - 1)):
+                max(random.sample(ordered, k=2), key=lambda x: x["fitness"])
+
+        def after():
+            stats = PopulationStats(results)
+            stats.summary()
+            stats.top_indices(50)
+            stats.elites(1)
+            stats.select_parents(population - 1)
+
+        rows.append({
+            "population": population,
+            "before": _time_per_call(before, iterations),
+            "after": _time_per_call(after, iterations),
+        })
+    return rows
+
+
+def _print_selection_report(rows: List[Dict]):
+    table = Table(title="选择与报告开销（离线模拟结果）")
+    table.add_column("种群", style="cyan")
+    table.add_column("旧实现 (ms)", style="yellow")
+    table.add_column("PopulationStats (ms)", style="magenta")
+    table.add_column("加速比", style="green")
+    for r in rows:
+        before, after = r["before"]["median_ms"], r["after"]["median_ms"]
+        table.add_row(str(r["population"]), f"{before:.1f}", f"{after:.1f}", f"{before / max(after, 1e-9):.1f}x")
+    console.print(table)
+
+
+EVOLUTION_CSV_FIELDS = [
+    "population", "generations", "concurrency", "generation", "agents", "duration_s", "agents_per_s",
+    "llm_calls", "llm_calls_per_agent", "llm_errors", "tokens", "step_latency_p50_s", "step_latency_p95_s",
+    "early_stops", "llm_calls_saved", "prefix_token_share", "cached_input_tokens",
+    "speculative_started", "speculative_hit_rate", "speculative_wasted_tokens", "peak_rss_mb", "best_fitness", "avg_fitness",
+]
+
+
+def bench_evolution(populations: List[int], generations: List[int], concurrency_levels: List[int],
+                    judge_cache: bool = False) -> List[Dict]:
+    """
+    进化吞吐基准
+    逻辑：强制使用离线模拟后端，对 种群大小 x 代数 x 并发度 的每个组合跑一次完整进化，
+          每代取引擎记录的性能指标（吞吐、每个体LLM调用、token、步延迟p50/p95、峰值RSS）
+    目的：simulation.py / nodes.py 的性能回退能在同一组数字上直接看出来
+    """
+    from src import evolution, mutator
+    from src.llm import reset_registry
+
+    os.environ["LLM_BACKEND"] = "fake"
+    reset_registry()
+    evolution.console.quiet = True
+    mutator.console.quiet = True
+
+    rows = []
+    for population in populations:
+        for gens in generations:
+            for concurrency in concurrency_levels:
+                # 每个组合使用独立的内存缓存（或关闭缓存），互不影响
+                set_judge_cache(JudgeCache(":memory:") if judge_cache else None)
+                with tempfile.TemporaryDirectory() as log_dir:
+                    engine = evolution.EvolutionEngine(population_size=population, generations=gens,
+                                                       log_dir=log_dir, concurrency=concurrency)
+                    engine.run()
+                for entry in engine.history:
+                    rows.append({
+                        "population": population,
+                        "generations": gens,
+                        "concurrency": concurrency,
+                        "generation": entry["generation"],
+                        "best_fitness": entry["best_fitness"],
+                        "avg_fitness": entry["avg_fitness"],
+                        **entry["perf"],
+                    })
+                console.print(f"完成 pop={population} gens={gens} concurrency={concurrency}")
+    return rows
+
+
+def write_evolution_report(rows: List[Dict], out_dir: str) -> Dict[str, str]:
+    """把基准结果写成 CSV 与 JSON"""
+    os.makedirs(out_dir, exist_ok=True)
+    csv_path = os.path.join(out_dir, "evolution_bench.csv")
+    json_path = os.path.join(out_dir, "evolution_bench.json")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=EVOLUTION_CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+    return {"csv": csv_path, "json": json_path}
+
+
+def _print_evolution_report(rows: List[Dict]):
+    table = Table(title="进化基准（离线模拟后端）")
+    for column in ("种群", "并发", "代", "个体/秒", "调用/个体", "Tokens", "p50 (s)", "p95 (s)", "峰值RSS (MB)"):
+        table.add_column(column)
+    for r in rows:
+        table.add_row(
+            str(r["population"]), str(r["concurrency"]), f"{r['generation']}/{r['generations']}",
+            f"{r['agents_per_s']:.2f}", f"{r['llm_calls_per_agent']:.1f}", str(r["tokens"]),
+            f"{r['step_latency_p50_s']:.3f}", f"{r['step_latency_p95_s']:.3f}", f"{r['peak_rss_mb']:.0f}",
+        )
+    console.print(table)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GA原型性能基准")
+    parser.add_argument("bench", choices=["setup", "context", "evolution", "selection"], help="要运行的基准")
+    parser.add_argument("--iterations", "-n", type=int, default=50, help="重复次数")
+    parser.add_argument("--steps", type=int, default=20, help="回放步数 (context)")
+    parser.add_argument("--populations", type=_int_list, default=[8, 32], help="种群大小列表，逗号分隔 (evolution / selection)")
+    parser.add_argument("--generations", type=_int_list, default=[2], help="代数列表，逗号分隔 (evolution)")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8], help="并发度列表，逗号分隔 (evolution)")
+    parser.add_argument("--judge-cache", action="store_true", help="启用裁判缓存（默认关闭以测量真实调用量） (evolution)")
+    parser.add_argument("--out", type=str, default=os.path.join("logs", f"bench_{time.strftime('%Y%m%d_%H%M%S')}"), help="结果输出目录 (evolution)")
+    parser.add_argument("--scenario", "-s", type=str, default="tutorial_island", help="场景名")
+    args = parser.parse_args()
+
+    if args.bench == "setup":
+        _print_setup_report(bench_setup_overhead(args.iterations, args.scenario))
+    elif args.bench == "context":
+        _print_context_report(bench_context_policies(args.steps, args.scenario))
+    elif args.bench == "evolution":
+        rows = bench_evolution(args.populations, args.generations, args.concurrency, args.judge_cache)
+        _print_evolution_report(rows)
+        paths = write_evolution_report(rows, args.out)
+        console.print(f"结果已写入: {paths['csv']}, {paths['json']}")
+    elif args.bench == "selection":
+        _print_selection_report(bench_selection(args.populations, args.iterations))
@@ -0,0 +1,173 @@
+"""
+进化检查点
+逻辑：在运行目录下追加写入 checkpoint.jsonl，每行一条记录：
+      population = 某代开始时的种群（个体ID与基因哈希）和随机数状态
+      result     = 该代某个个体的评估结果（不含交互日志，日志已单独落盘）；
+                   真实模拟且启用适应度缓存时附带 fitness_cache（场景版本与原始适应度采样），恢复时据此重建缓存
+      generation = 该代完成后的历史统计
+基因文本与父子关系只存在谱系数据库（src/lineage.py）中，检查点里的记录只引用 gene_hash，恢复时从库中还原
+目的：长时间运行中途崩溃后，从最后一个完整的代继续，已评估完的个体不再重跑；检查点大小与基因长度无关
+"""
+import json
+import os
+import random
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.lineage import LineageStore, gene_hash
+from src.models import AgentConfig, Gene
+
+CHECKPOINT_FILENAME = "checkpoint.jsonl"
+
+
+def compact_result(result: Dict) -> Dict:
+    """把模拟结果转成可序列化的精简形式（去掉交互日志与逐步耗时，基因替换为谱系库中的 gene_hash）"""
+    data = {k: v for k, v in result.items() if k not in ("logs", "step_latencies", "gene")}
+    if isinstance(result.get("gene"), Gene):
+        data["gene_hash"] = gene_hash(result["gene"])
+    return data
+
+
+def restore_gene(data: Dict, store: Optional[LineageStore]) -> Optional[Gene]:
+    """按 gene_hash 从谱系库还原基因；兼容旧格式（记录中直接带基因字典）"""
+    if isinstance(data.get("gene"), dict):
+        return Gene(**data["gene"])
+    if store is not None and data.get("gene_hash"):
+        return store.gene_by_hash(data["gene_hash"])
+    return None
+
+
+def restore_result(data: Dict, store: Optional[LineageStore] = None) -> Dict:
+    """从精简形式还原模拟结果"""
+    result = dict(data)
+    gene = restore_gene(data, store)
+    if gene is not None:
+        result["gene"] = gene
+    result.setdefault("logs", [])
+    return result
+
+
+def _encode_rng_state(state) -> list:
+    version, internal, gauss_next = state
+    return [version, list(internal), gauss_next]
+
+
+def _decode_rng_state(data: list):
+    version, internal, gauss_next = data
+    return (version, tuple(internal), gauss_next)
+
+
+@dataclass
+class ResumeState:
+    """
+    恢复所需的全部信息
+    逻辑：generation 为需要（继续）评估的代，results 为该代已完成个体的结果（按种群下标）
+    """
+    generation: int
+    population: List[AgentConfig]
+    results: Dict[int, Dict] = field(default_factory=dict)
+    history: List[Dict] = field(default_factory=list)
+    rng_state: Optional[list] = None
+    fitness_samples: List[tuple] = field(default_factory=list)  # 按写入顺序的 (代数, 结果, 场景版本, 原始适应度)，用于重建适应度缓存
+
+
+class CheckpointStore:
+    """
+    JSONL检查点存储
+    逻辑：只追加写入，每条记录写完立即flush，崩溃时最多丢失正在写的那一行
+    目的：保证检查点本身紧凑且不会因中途崩溃而损坏已有内容
+    """
+    def __init__(self, log_dir: str):
+        self.path = os.path.join(log_dir, CHECKPOINT_FILENAME)
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _append(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+
+    def save_population(self, generation: int, population: List[AgentConfig]):
+        """基因只写 gene_hash（调用方需先把种群登记到谱系库），谱系只存在库中"""
+        self._append({
+            "type": "population",
+            "generation": generation,
+            "population": [
+                {"id": c.id, "gene_hash": gene_hash(c.gene), "initial_energy": c.initial_energy}
+                for c in population
+            ],
+            "rng_state": _encode_rng_state(random.getstate()),
+        })
+
+    def save_result(self, generation: int, index: int, result: Dict, fitness_sample: Optional[Dict] = None):
+        """fitness_sample 为适应度缓存登记的采样 {scenario_version, fitness}（average 策略下结果中的适应度已是均值）"""
+        record = {"type": "result", "generation": generation, "index": index, "result": compact_result(result)}
+        if fitness_sample is not None:
+            record["fitness_cache"] = fitness_sample
+        self._append(record)
+
+    def save_generation(self, generation: int, history_entry: Dict):
+        entry = dict(history_entry)
+        entry["best_agent"] = compact_result(entry["best_agent"])
+        self._append({"type": "generation", "generation": generation, "history": entry})
+
+    def load(self, store: LineageStore) -> Optional[ResumeState]:
+        """
+        读取检查点
+        逻辑：以最后一条 population 记录为恢复点，收集该代已有的 result，以及更早各代的 generation 记录；
+              所有带 fitness_cache 的 result 按顺序收集为适应度采样；基因按 gene_hash 从谱系库还原
+        目的：最后一行若因崩溃而不完整则忽略
+        """
+        if not self.exists():
+            return None
+
+        records = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+
+        last_population = None
+        for record in records:
+            if record["type"] == "population":
+                last_population = record
+        if last_population is None:
+            return None
+
+        generation = last_population["generation"]
+        population = [
+            AgentConfig(id=p["id"], gene=restore_gene(p, store), initial_energy=p["initial_energy"], generation=generation)
+            for p in last_population["population"]
+        ]
+        state = ResumeState(
+            generation=generation,
+            population=population,
+            rng_state=last_population.get("rng_state"),
+        )
+
+        history_by_gen = {}
+        for record in records:
+            if record["type"] == "result" and record["generation"] <= generation and "fitness_cache" in record:
+                sample = record["fitness_cache"]
+                state.fitness_samples.append((record["generation"], restore_result(record["result"], store),
+                                              sample["scenario_version"], sample["fitness"]))
+            if record["type"] == "result" and record["generation"] == generation:
+                state.results[record["index"]] = restore_result(record["result"], store)
+            elif record["type"] == "generation" and record["generation"] < generation:
+                entry = dict(record["history"])
+                entry["best_agent"] = restore_result(entry["best_agent"], store)
+                history_by_gen[record["generation"]] = entry
+        state.history = [history_by_gen[g] for g in sorted(history_by_gen)]
+        return state
+
+    @staticmethod
+    def restore_rng(rng_state: Optional[list]):
+        if rng_state is not None:
+            random.setstate(_decode_rng_state(rng_state))
@@ -0,0 +1,166 @@
+"""
+上下文窗口策略
+逻辑：agent_node 每一步不再发送完整历史，而是由策略决定带上哪些历史消息：
+      full    = 完整历史（默认，即原有行为；prompt随步数线性增长，总成本二次增长）
+      window  = 只保留最近N轮
+      budget  = 在token预算内尽量多地保留最近的消息
+      summary = 较早的轮次压缩成摘要，并入基因的记忆部分（见 src/prompts.py agent_gene_prompt），只保留最近N轮原文
+目的：让每步prompt大小有上界，并可在同一场景下比较不同策略的每步token数
+裁剪会改变Agent看到的内容，从而改变适应度，因此默认不裁剪，由 CONTEXT_POLICY 显式选择
+"""
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from src.tokens import count_message_tokens
+
+load_dotenv()
+
+CONTEXT_POLICY = os.getenv("CONTEXT_POLICY", "full")
+CONTEXT_WINDOW_TURNS = int(os.getenv("CONTEXT_WINDOW_TURNS", "4"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# 每一轮 = Agent行动(AIMessage) + 裁判反馈(HumanMessage)
+MESSAGES_PER_TURN = 2
+
+# 摘要函数：(旧摘要, 待压缩的消息) -> 新摘要
+Summarizer = Callable[[str, List[BaseMessage]], str]
+# 异步摘要函数（异步节点使用），签名同上
+AsyncSummarizer = Callable[[str, List[BaseMessage]], Awaitable[str]]
+
+
+@dataclass
+class ContextWindow:
+    """
+    策略的输出
+    逻辑：history 为本步实际发送的历史消息；summary/summarized_upto 非空时需写回状态
+    目的：让 agent_node 只负责组装提示词，不关心裁剪细节
+    """
+    history: List[BaseMessage]
+    summary: Optional[str] = None
+    summarized_upto: Optional[int] = None
+
+
+class ContextPolicy:
+    """完整历史（不裁剪）"""
+    name = "full"
+
+    def select(self, history: List[BaseMessage], system_msg: SystemMessage, human_msg: HumanMessage,
+               summary: str = "", summarized_upto: int = 0) -> ContextWindow:
+        return ContextWindow(history=list(history))
+
+    async def aselect(self, history: List[BaseMessage], system_msg: SystemMessage, human_msg: HumanMessage,
+                      summary: str = "", summarized_upto: int = 0) -> ContextWindow:
+        """异步版本（异步节点使用）；不调用LLM的策略直接复用 select"""
+        return self.select(history, system_msg, human_msg, summary, summarized_upto)
+
+    def will_summarize(self, history: List[BaseMessage], summarized_upto: int = 0) -> bool:
+        """本步的 select 是否会调用摘要函数（投机请求据此跳过需要额外LLM调用的轮次）"""
+        return False
+
+
+class SlidingWindowPolicy(ContextPolicy):
+    """只保留最近 max_turns 轮"""
+    name = "window"
+
+    def __init__(self, max_turns: int = CONTEXT_WINDOW_TURNS):
+        self.max_messages = max(0, max_turns) * MESSAGES_PER_TURN
+
+    def select(self, history, system_msg, human_msg, summary="", summarized_upto=0):
+        return ContextWindow(history=list(history[-self.max_messages:]) if self.max_messages else [])
+
+
+class TokenBudgetPolicy(ContextPolicy):
+    """从最新消息往前保留，直到总prompt达到 max_tokens"""
+    name = "budget"
+
+    def __init__(self, max_tokens: int = CONTEXT_TOKEN_BUDGET):
+        self.max_tokens = max_tokens
+
+    def select(self, history, system_msg, human_msg, summary="", summarized_upto=0):
+        remaining = self.max_tokens - count_message_tokens([system_msg, human_msg])
+        kept = 0
+        for message in reversed(history):
+            cost = count_message_tokens([message])
+            if cost > remaining:
+                break
+            remaining -= cost
+            kept += 1
+        return ContextWindow(history=list(history[len(history) - kept:]))
+
+
+class SummaryPolicy(ContextPolicy):
+    """
+    摘要策略
+    逻辑：未摘要的消息超过 keep_turns + summarize_every 轮时，把除最近 keep_turns 轮以外的部分并入摘要
+    目的：旧经验以压缩形式保留下来，而不是被直接丢弃
+    """
+    name = "summary"
+
+    def __init__(self, summarizer: Summarizer, keep_turns: int = CONTEXT_WINDOW_TURNS, summarize_every: int = 2,
+                 asummarizer: AsyncSummarizer = None):
+        self.summarizer = summarizer
+        self.asummarizer = asummarizer
+        self.keep_messages = max(1, keep_turns) * MESSAGES_PER_TURN
+        self.batch_messages = max(1, summarize_every) * MESSAGES_PER_TURN
+
+    def _summarize_upto(self, history, summarized_upto) -> Optional[int]:
+        """本步需要并入摘要的消息截止下标，不需要摘要时返回None"""
+        pending = len(history) - summarized_upto
+        if pending < self.keep_messages + self.batch_messages:
+            return None
+        return len(history) - self.keep_messages
+
+    def will_summarize(self, history, summarized_upto=0):
+        return self._summarize_upto(history, summarized_upto) is not None
+
+    def select(self, history, system_msg, human_msg, summary="", summarized_upto=0):
+        upto = self._summarize_upto(history, summarized_upto)
+        if upto is None:
+            return ContextWindow(history=list(history[summarized_upto:]))
+        new_summary = self.summarizer(summary, list(history[summarized_upto:upto]))
+        return ContextWindow(history=list(history[upto:]), summary=new_summary, summarized_upto=upto)
+
+    async def aselect(self, history, system_msg, human_msg, summary="", summarized_upto=0):
+        """没有异步摘要函数时，同步摘要放到线程中执行，避免阻塞事件循环"""
+        upto = self._summarize_upto(history, summarized_upto)
+        if upto is None:
+            return ContextWindow(history=list(history[summarized_upto:]))
+        to_summarize = list(history[summarized_upto:upto])
+        if self.asummarizer is not None:
+            new_summary = await self.asummarizer(summary, to_summarize)
+        else:
+            new_summary = await asyncio.to_thread(self.summarizer, summary, to_summarize)
+        return ContextWindow(history=list(history[upto:]), summary=new_summary, summarized_upto=upto)
+
+
+def extractive_summary(previous: str, messages: List[BaseMessage], max_chars: int = 600) -> str:
+    """
+    抽取式摘要（不调用LLM）
+    逻辑：把每条消息截成一行追加到旧摘要后，超长时保留末尾
+    目的：离线/演示模式及LLM摘要失败时的兜底
+    """
+    lines = [previous] if previous else []
+    for m in messages:
+        role = "行动" if m.type == "ai" else "反馈"
+        lines.append(f"- {role}: {str(m.content).strip().splitlines()[0][:80] if str(m.content).strip() else ''}")
+    text = "\n".join(lines)
+    return text[-max_chars:]
+
+
+def get_context_policy(name: str = None, summarizer: Summarizer = None, asummarizer: AsyncSummarizer = None) -> ContextPolicy:
+    """按名称创建上下文策略（默认读取 CONTEXT_POLICY）"""
+    name = name or CONTEXT_POLICY
+    if name == "full":
+        return ContextPolicy()
+    if name == "window":
+        return SlidingWindowPolicy()
+    if name == "budget":
+        return TokenBudgetPolicy()
+    if name == "summary":
+        return SummaryPolicy(summarizer or extractive_summary, asummarizer=asummarizer)
+    raise ValueError(f"未知的上下文策略: {name}")
@@ -0,0 +1,70 @@
+"""
+多场景评估计划
+逻辑：决定每一代在哪些场景上评估个体 —— 全部场景、每代抽样的子集，或由易到难逐步加入场景的课程
+目的：避免基因只对单一场景过拟合，同时控制每代的模拟开销
+"""
+import hashlib
+import os
+import random
+from typing import List
+
+from dotenv import load_dotenv
+
+from src.environment import EnvironmentManager
+
+load_dotenv()
+
+SCENARIOS = os.getenv("SCENARIOS", "tutorial_island")  # 逗号分隔的场景名，或 all（data/environments 下全部场景）
+SCENARIO_MODE = os.getenv("SCENARIO_MODE", "all")  # all / sample / curriculum
+SCENARIO_SAMPLE_SIZE = int(os.getenv("SCENARIO_SAMPLE_SIZE", "2"))
+CURRICULUM_STAGE_GENERATIONS = int(os.getenv("CURRICULUM_STAGE_GENERATIONS", "2"))
+SCENARIO_SEED = int(os.getenv("SCENARIO_SEED", "0"))
+
+MODES = ("all", "sample", "curriculum")
+
+
+class ScenarioSchedule:
+    """
+    场景调度
+    逻辑：
+      - all: 每代评估场景池中的全部场景
+      - sample: 每代从场景池中抽取 sample_size 个场景，随机数由 (seed, 代数) 决定，同一代所有个体面对相同场景，恢复运行时结果一致
+      - curriculum: 场景按步骤数由少到多排序，每 stage_generations 代多加入一个场景
+    """
+    def __init__(self, env_manager: EnvironmentManager, scenarios: str = SCENARIOS, mode: str = SCENARIO_MODE,
+                 sample_size: int = SCENARIO_SAMPLE_SIZE, stage_generations: int = CURRICULUM_STAGE_GENERATIONS,
+                 seed: int = SCENARIO_SEED):
+        if mode not in MODES:
+            raise ValueError(f"未知的场景模式: {mode}（可选: {', '.join(MODES)}）")
+        self.env_manager = env_manager
+        self.scenarios = scenarios
+        self.mode = mode
+        self.sample_size = max(1, sample_size)
+        self.stage_generations = max(1, stage_generations)
+        self.seed = seed
+
+    def pool(self) -> List[str]:
+        """场景池：显式列出的场景保持给定顺序；all 时取目录中全部场景"""
+        if self.scenarios.strip().lower() == "all":
+            return self.env_manager.scenarios()
+        return [name.strip() for name in self.scenarios.split(",") if name.strip()]
+
+    def select(self, generation: int) -> List[str]:
+        pool = self.pool()
+        if self.mode == "sample" and len(pool) > self.sample_size:
+            rng = random.Random(f"{self.seed}:{generation}")
+            return sorted(rng.sample(pool, self.sample_size), key=pool.index)
+        if self.mode == "curriculum":
+            ordered = sorted(pool, key=lambda name: len(self.env_manager.load_scenario(name)))
+            stage = 1 + (generation - 1) // self.stage_generations
+            return ordered[:min(stage, len(ordered))]
+        return pool
+
+    def version(self, scenarios: List[str]) -> str:
+        """一组场景的组合内容版本（用于适应度缓存键）"""
+        if len(scenarios) == 1:
+            return self.env_manager.scenario_version(scenarios[0])
+        digest = hashlib.sha256()
+        for name in scenarios:
+            digest.update(f"{name}={self.env_manager.scenario_version(name)};".encode("utf-8"))
+        return digest.hexdigest()[:16]
@@ -0,0 +1,85 @@
+"""
+模拟提前终止
+逻辑：每次裁判判决后观察Agent在当前步骤上的连续失败次数与每次失败的能量消耗斜率；
+      判定为无望时提前结束模拟，并按"此后每次尝试都失败"推算出确定的最终状态计算适应度
+目的：卡在同一步骤、只会重复失败直到饿死或超时的Agent不再消耗LLM调用
+"""
+import math
+import os
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 默认关闭：提前终止按推算的结局计算适应度，会改变选择压力，需显式开启（例如 4 / 1）
+EARLY_STOP_MAX_FAILURES = int(os.getenv("EARLY_STOP_MAX_FAILURES", "0"))  # 同一步骤连续失败多少次后终止，0 关闭
+EARLY_STOP_MIN_ATTEMPTS = int(os.getenv("EARLY_STOP_MIN_ATTEMPTS", "0"))  # 按能量斜率推算剩余尝试次数不超过该值时终止，0 关闭
+
+# 一个 感知 -> 行动 -> 判断 循环在图的流中产生的事件数
+EVENTS_PER_CYCLE = 3
+# 每次失败的尝试包含的LLM调用: Agent 行动 + 裁判
+CALLS_PER_ATTEMPT = 2
+
+
+class EarlyStopper:
+    """
+    单次模拟的提前终止判断
+    逻辑：
+      - 连续失败: 同一步骤连续 max_failures 次未解决
+      - 能量推算: 当前步骤已失败过，且按平均每次失败的能量消耗，剩余能量只够 min_attempts 次以内的尝试
+    """
+    def __init__(self, initial_energy: int, max_failures: int = EARLY_STOP_MAX_FAILURES, min_attempts: int = EARLY_STOP_MIN_ATTEMPTS):
+        self.max_failures = max_failures
+        self.min_attempts = min_attempts
+        self._step_index = 0
+        self._failures = 0
+        self._start_energy = initial_energy  # 进入当前步骤时（或上一次解决后）的能量
+        self._energy = initial_energy        # 最近一次判决后的能量
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_failures > 0 or self.min_attempts > 0
+
+    @property
+    def slope(self) -> float:
+        """当前步骤上平均每次失败损失的能量"""
+        return 0.0 if not self._failures else (self._start_energy - self._energy) / self._failures
+
+    def observe(self, step_index: int, energy: int, solved: bool) -> Optional[str]:
+        """在裁判判决后调用（传入判决后的步骤下标、能量与是否解决）；返回终止原因，继续模拟时返回None"""
+        idx = step_index
+        if solved or idx != self._step_index:
+            self._step_index, self._failures, self._start_energy, self._energy = idx, 0, energy, energy
+            return None
+
+        self._failures += 1
+        self._energy = energy
+        if self.max_failures > 0 and self._failures >= self.max_failures:
+            return f"同一步骤连续失败 {self._failures} 次"
+        if self.min_attempts > 0 and self.slope > 0 and energy / self.slope <= self.min_attempts:
+            return f"能量推算: 剩余能量 {energy} 仅够约 {energy / self.slope:.1f} 次尝试"
+        return None
+
+    def project(self, energy: int, step_count: int, max_steps: int) -> Dict:
+        """
+        推算"此后每次尝试都失败"时的最终状态
+        逻辑：能量按当前斜率递减；在超时之前能量耗尽则饿死（能量0），否则以超时结束并保留剩余能量
+        返回：energy / is_alive / cause_of_death（更新到状态中）以及省下的LLM调用数
+        """
+        attempts_left = max(0, (max_steps + 1 - step_count) // EVENTS_PER_CYCLE)
+        slope = self.slope
+        if slope > 0 and math.ceil(energy / slope) <= attempts_left:
+            # 第 ceil(energy/slope) 次尝试在行动节点扣费时饿死，该次不调用LLM
+            return {
+                "energy": 0,
+                "is_alive": False,
+                "cause_of_death": "饥饿（能量耗尽，提前终止推算）",
+                "calls_saved": CALLS_PER_ATTEMPT * (math.ceil(energy / slope) - 1)
+            }
+        return {
+            "energy": max(1, round(energy - slope * attempts_left)),
+            "is_alive": True,
+            "cause_of_death": "Timeout",
+            "calls_saved": CALLS_PER_ATTEMPT * attempts_left
+        }
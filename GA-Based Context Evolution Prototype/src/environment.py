@@ -1,66 +1,170 @@
 import os
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
 from src.models import EnvironmentStep
 
+load_dotenv()
+
+# 场景索引的最短重新扫描间隔（秒）；间隔内的加载直接读索引，不触碰文件系统
+SCENARIO_REFRESH_INTERVAL = float(os.getenv("SCENARIO_REFRESH_INTERVAL", "2"))
+
+@dataclass
+class ScenarioIndex:
+    """单个场景的索引：每个文件的 (mtime, 大小) 与解析出的步骤"""
+    files: Dict[str, Tuple[int, int, EnvironmentStep]] = field(default_factory=dict)
+    steps: List[EnvironmentStep] = field(default_factory=list)
+    version: str = ""
+
+def step_content_hash(step_id: str, content: str, rubric: str) -> str:
+    """步骤的内容哈希（step_id / 环境内容 / 裁判标准），任一改动都会得到新的哈希"""
+    return hashlib.sha256("\0".join([step_id, content, rubric]).encode("utf-8")).hexdigest()[:16]
+
 class EnvironmentManager:
     """
-    环境管理器
-    逻辑：加载和管理多步骤环境场景
-    目的：为Agent提供结构化的环境体验
+    环境管理器（场景目录）
+    逻辑：一次性索引 base_path 下所有场景，每个步骤带内容哈希；重新扫描时只重新解析 mtime/大小 变化的文件
+    目的：为Agent提供结构化的环境体验，多场景评估时不重复读取和解析txt文件
     """
-    def __init__(self, base_path: str = "data/environments"):
+    def __init__(self, base_path: str = "data/environments", refresh_interval: float = SCENARIO_REFRESH_INTERVAL):
         self.base_path = Path(base_path)  # 环境文件的基础路径
+        self.refresh_interval = refresh_interval
+        self._index: Dict[str, ScenarioIndex] = {}
+        self._last_refresh = None  # 上次扫描的时间（perf_counter），None 表示尚未建立索引
+        self._lock = threading.Lock()
+
+    def refresh(self) -> List[str]:
+        """
+        增量刷新索引
+        逻辑：扫描所有场景目录，比对每个txt文件的 (mtime, 大小)，只重新解析新增或改动的文件；删除的文件与场景从索引移除
+        目的：场景文件在运行中被修改时自动生效，同时未变化的文件零解析开销
+        返回：内容发生变化的场景名
+        """
+        with self._lock:
+            changed = []
+            present = set()
+            if self.base_path.exists():
+                for entry in sorted(os.scandir(self.base_path), key=lambda e: e.name):
+                    if not entry.is_dir():
+                        continue
+                    present.add(entry.name)
+                    if self._refresh_scenario(entry.name, Path(entry.path)):
+                        changed.append(entry.name)
+            for name in set(self._index) - present:
+                del self._index[name]
+                changed.append(name)
+            self._last_refresh = time.perf_counter()
+            return changed
+
+    def _refresh_scenario(self, scenario_name: str, scenario_path: Path) -> bool:
+        """刷新单个场景的索引（调用方持有锁），返回场景内容是否变化"""
+        index = self._index.setdefault(scenario_name, ScenarioIndex())
+        files = {}
+        dirty = False
+        for entry in os.scandir(scenario_path):
+            if not entry.name.endswith(".txt") or not entry.is_file():
+                continue
+            st = entry.stat()
+            cached = index.files.get(entry.name)
+            if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+                files[entry.name] = cached
+            else:
+                files[entry.name] = (st.st_mtime_ns, st.st_size, self._parse_step(Path(entry.path)))
+                dirty = True
+        if not dirty and files.keys() == index.files.keys() and index.version:
+            return False
+
+        steps = []
+        for order, name in enumerate(sorted(files)):
+            step = files[name][2]
+            steps.append(step if step.order == order else step.model_copy(update={"order": order}))
+        digest = hashlib.sha256()
+        for step in steps:
+            digest.update(step.content_hash.encode("ascii"))
+        version = digest.hexdigest()[:16]
+        changed = version != index.version
+        index.files, index.steps, index.version = files, steps, version
+        return changed
+
+    def _ensure_fresh(self):
+        last = self._last_refresh
+        if last is None or time.perf_counter() - last >= self.refresh_interval:
+            self.refresh()
+
+    def _get(self, scenario_name: str) -> ScenarioIndex:
+        self._ensure_fresh()
+        with self._lock:
+            index = self._index.get(scenario_name)
+        if index is None or not index.version:
+            raise FileNotFoundError(f"场景 {scenario_name} 在 {self.base_path / scenario_name} 未找到")
+        return index
+
+    def scenarios(self) -> List[str]:
+        """索引中所有场景名（按名称排序）"""
+        self._ensure_fresh()
+        with self._lock:
+            return sorted(name for name, index in self._index.items() if index.steps)
 
     def load_scenario(self, scenario_name: str) -> List[EnvironmentStep]:
         """
         加载环境场景
-        逻辑：读取指定场景文件夹中的所有txt文件，按文件名排序
-        目的：构建有序的环境步骤序列
+        逻辑：直接返回索引中的步骤；距上次扫描超过 refresh_interval 时先增量刷新
+        目的：避免每次模拟都重新读取和解析所有txt文件
         """
-        scenario_path = self.base_path / scenario_name
-        if not scenario_path.exists():
-            raise FileNotFoundError(f"场景 {scenario_name} 在 {scenario_path} 未找到")
+        return list(self._get(scenario_name).steps)
 
-        steps = []
-        # 列出所有txt文件并按文件名排序
-        files = sorted(scenario_path.glob("*.txt"), key=lambda p: p.name)
-        
-        for i, file_path in enumerate(files):
-            with open(file_path, "r", encoding="utf-8") as f:
-                raw_content = f.read()
-            
-            # 解析内容和裁判标准（使用 '---' 分隔）
-            parts = raw_content.split("\n---\n", 1)
-            content = parts[0].strip()
-            rubric = parts[1].strip() if len(parts) > 1 else "未提供具体评分标准，请根据目标常识判断。"
-
-            steps.append(EnvironmentStep(
-                step_id=file_path.stem,
-                content=content,
-                rubric=rubric,
-                order=i,
-                file_path=str(file_path)
-            ))
-        
-        return steps
+    def scenario_version(self, scenario_name: str) -> str:
+        """
+        场景内容版本
+        逻辑：按顺序组合各步骤的内容哈希，只随内容变化（与mtime无关）
+        目的：作为适应度缓存键的一部分，场景改动后旧分数自动失效
+        """
+        return self._get(scenario_name).version
+
+    def _parse_step(self, file_path: Path) -> EnvironmentStep:
+        """
+        解析单个场景文件
+        逻辑：'---' 之前为环境内容，之后为裁判标准；对 step_id / 内容 / 裁判标准 计算内容哈希
+        目的：构建有序的环境步骤序列（order 由刷新时按文件名排序确定）
+        """
+        with open(file_path, "r", encoding="utf-8") as f:
+            raw_content = f.read()
+
+        # 解析内容和裁判标准（使用 '---' 分隔）
+        parts = raw_content.split("\n---\n", 1)
+        content = parts[0].strip()
+        rubric = parts[1].strip() if len(parts) > 1 else "未提供具体评分标准，请根据目标常识判断。"
+        content_hash = step_content_hash(file_path.stem, content, rubric)
+
+        return EnvironmentStep(
+            step_id=file_path.stem,
+            content=content,
+            rubric=rubric,
+            order=0,
+            file_path=str(file_path),
+            content_hash=content_hash
+        )
 
     @staticmethod
     def get_initial_prompt(step_content: str, gene_prompt: str, energy: int) -> str:
         """
         生成初始提示词
-        逻辑：组合基因提示、当前状态和环境信息
+        逻辑：组合基因提示、环境信息和当前状态；稳定的基因与环境在前，每步变化的能量在后（便于服务端前缀缓存）
         目的：为Agent提供完整的上下文信息
         """
         return f"""
 {gene_prompt}
 
-[当前状态]
-能量等级: {energy} (警告: 每个行动都会根据长度消耗能量。零能量 = 死亡。)
-
 [环境]
 {step_content}
 
+[当前状态]
+能量等级: {energy} (警告: 每个行动都会根据长度消耗能量。零能量 = 死亡。)
+
 [指令]
 分析环境并决定你的下一步行动。
 清晰地输出你的行动。
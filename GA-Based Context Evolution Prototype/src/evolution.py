@@ -1,25 +1,58 @@
 import os
 import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import List, Dict
 from rich.console import Console
 from rich.table import Table
-from rich.progress import track
+from rich.progress import track, Progress, TextColumn
 
 from src.models import AgentConfig, Gene
 from src.environment import EnvironmentManager
-from src.simulation import run_simulation
+from src.simulation import run_scenarios, arun_scenarios, SimulationRuntime
+from src.curriculum import ScenarioSchedule
 from src.mutator import Mutator
+from src.judge_cache import get_judge_cache
+from src.fitness_cache import FitnessCache
+from src.judge_batcher import enable_judge_batching, disable_judge_batching
+from src.nodes import score_judge_batch, JUDGE_BATCH_MODE
+from src.checkpoint import CheckpointStore, compact_result
+from src.lineage import LineageStore, LINEAGE_DB_FILENAME
+from src.log_sink import JsonlLogSink
+from src.metrics import usage_tracker, usage_delta, generation_perf
+from src.scheduler import get_scheduler, format_queue
+from src.speculation import speculation_stats
+from src.population import PopulationStats, ELITE_COUNT
+from src.gene_index import GeneIndex
 
 console = Console()
 
+GENERATION_TABLE_ROWS = int(os.getenv("GENERATION_TABLE_ROWS", "50"))  # 每代结果表最多展示的个体数（按适应度取前N）
+# 并发评估的驱动方式: async = 所有模拟共享一个事件循环（节点走 ainvoke）; thread = 每个模拟占一个线程
+SIMULATION_DRIVER = os.getenv("SIMULATION_DRIVER", "async")
+
 class EvolutionEngine:
-    def __init__(self, population_size: int = 4, generations: int = 3, log_dir: str = None):
+    def __init__(self, population_size: int = 4, generations: int = 3, log_dir: str = None, concurrency: int = 1,
+                 migration=None, prototype_offset: int = 0):
         self.population_size = population_size
         self.generations = generations
+        self.concurrency = max(1, concurrency)  # 同时在跑的模拟数上限（1 = 串行）
         self.env_manager = EnvironmentManager()
+        self.runtime = SimulationRuntime(self.env_manager)  # 整个运行共享编译图与场景缓存
+        self.schedule = ScenarioSchedule(self.env_manager)  # 每代评估哪些场景（全部/抽样/课程）
+        self.scenarios: List[str] = []  # 当前代的评估场景
         self.mutator = Mutator()
         self.population: List[AgentConfig] = []
         self.history: List[Dict] = [] # 记录每代的统计数据
+        self.last_judge_batch_stats: Dict = None # 最近一次并发评估的裁判合批统计
+        self.lineage: List[Dict] = [] # 待登记的谱系条目（子代的父代ID），写入谱系库后清空
+        self.fitness_cache = FitnessCache() # 未改变的基因（如精英）按策略复用适应度
+        self.migration = migration # 岛屿模式下的迁移通道（见 src/islands.py），单种群时为None
+        self.prototype_offset = prototype_offset # 初始原型的起始下标，让各岛屿从不同原型组合出发
+        self.elite_count = max(1, min(ELITE_COUNT, population_size)) # 每代原样保留的精英数
+        self.gene_index = GeneIndex() # 基因的哈希n-gram向量：出生去重与适应度共享
+        self.last_dedup_stats: Dict = None # 繁殖本代种群时的出生去重统计
+        self._loop: asyncio.AbstractEventLoop = None # 异步评估复用的事件循环（异步LLM客户端的连接池绑定在循环上，不能每代新建）
         
         # 初始化日志目录
         if log_dir is None:
@@ -30,6 +63,8 @@ class EvolutionEngine:
         
         os.makedirs(self.log_dir, exist_ok=True)
         console.print(f"[blue]详细日志将保存在: {self.log_dir}[/blue]")
+        self.checkpoint = CheckpointStore(self.log_dir)
+        self.lineage_store = LineageStore(os.path.join(self.log_dir, LINEAGE_DB_FILENAME))  # 去重基因文本与父子边
 
     def initialize_population(self):
         """初始化种群，创建多样化的初始Agent"""
@@ -44,7 +79,7 @@ class EvolutionEngine:
         ]
         
         for i in range(self.population_size):
-            proto_idx = i % len(prototypes)
+            proto_idx = (i + self.prototype_offset) % len(prototypes)
             identity, strategy = prototypes[proto_idx]
             
             gene = Gene(
@@ -57,123 +92,299 @@ class EvolutionEngine:
             
         console.print(f"种群初始化完成，共 {len(self.population)} 个个体。")
 
-    def run(self):
-        """运行进化循环"""
-        self.initialize_population()
+    def run(self, resume: bool = False):
+        """
+        运行进化循环
+        resume=True 时从日志目录中的检查点继续：跳过已完成的代，当前代中已评估的个体直接复用结果
+        """
+        start_gen, done = 1, {}
+        resume_state = self.checkpoint.load(self.lineage_store) if resume else None
+        
+        if resume_state is not None:
+            start_gen, done = resume_state.generation, resume_state.results
+            self.population = resume_state.population
+            self.population_size = len(self.population)
+            self.history = resume_state.history
+            self.fitness_cache.restore(resume_state.fitness_samples)
+            CheckpointStore.restore_rng(resume_state.rng_state)
+            console.print(f"[bold blue]从检查点恢复: 第 {start_gen} 代，已完成 {len(done)}/{self.population_size} 个个体[/bold blue]")
+        else:
+            if resume:
+                console.print("[yellow]未找到检查点，重新开始。[/yellow]")
+            self.initialize_population()
+            self._save_population(1)
         
-        for gen in range(1, self.generations + 1):
+        for gen in range(start_gen, self.generations + 1):
             console.rule(f"[bold green]第 {gen} 代 / {self.generations}[/bold green]")
             
             # 1. 评估当前种群
-            results = self.evaluate_population(gen)
+            judge_cache = get_judge_cache()
+            if judge_cache:
+                judge_cache.reset_stats()
+            self.last_judge_batch_stats = None
+            self.fitness_cache.reset_stats()
+            scheduler = get_scheduler()
+            if scheduler:
+                scheduler.reset_stats()
+            speculation_stats.reset_stats()
+            usage_before, eval_start = usage_tracker.snapshot(), time.perf_counter()
+            results = self.evaluate_population(gen, done if gen == start_gen else None)
+            perf = generation_perf(results, time.perf_counter() - eval_start, usage_delta(usage_before, usage_tracker.snapshot()),
+                                   speculation_stats.stats())
+            cache_stats = judge_cache.stats() if judge_cache else None
+            fitness_stats = self.fitness_cache.stats() if self.fitness_cache.enabled else None
+            if scheduler:
+                perf["scheduler"] = scheduler.snapshot()
             
-            # 2. 统计与展示
-            self.display_generation_stats(results, gen)
+            # 2. 统计与展示（各列一次性提取为数组，后续的精英、选择与报告都在数组上完成）
+            stats = PopulationStats(results)
+            if self.gene_index.niching_enabled:
+                stats.apply_fitness_sharing(self.gene_index.niche_counts(self.gene_index.matrix([r["gene"] for r in results])))
+            summary = stats.summary()
+            dedup_stats, self.last_dedup_stats = self.last_dedup_stats, None
+            self.display_generation_stats(results, gen, cache_stats, self.last_judge_batch_stats, perf, fitness_stats, stats, dedup_stats)
             
             # 3. 记录历史
-            best_fitness = max(r["fitness"] for r in results)
-            avg_fitness = sum(r["fitness"] for r in results) / len(results)
             self.history.append({
                 "generation": gen,
-                "best_fitness": best_fitness,
-                "avg_fitness": avg_fitness,
-                "best_agent": next(r for r in results if r["fitness"] == best_fitness)
+                "best_fitness": summary["best_fitness"],
+                "avg_fitness": summary["avg_fitness"],
+                "best_agent": stats.best,
+                "population_stats": summary,
+                "birth_dedup": dedup_stats,
+                "judge_cache": cache_stats,
+                "judge_batch": self.last_judge_batch_stats,
+                "fitness_cache": fitness_stats,
+                "scenarios": self.scenarios,
+                "perf": perf
             })
+            self.checkpoint.save_generation(gen, self.history[-1])
             
             # 如果是最后一代，不需要繁衍
             if gen < self.generations:
-                self.population = self.breed_next_generation(results, gen)
+                self.population = self.breed_next_generation(results, gen, stats)
+                if self.migration is not None:
+                    immigrants = self.migration.exchange(gen, results)
+                    if immigrants:
+                        self.accept_migrants(immigrants, gen + 1)
+                self._save_population(gen + 1)
                 
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
         self.display_final_report()
 
-    def evaluate_population(self, generation: int) -> List[Dict]:
-        """评估种群中每个个体的适应度"""
-        results = []
-        
-        # 创建本代日志目录
+    def _save_population(self, generation: int):
+        """新一代种群登记到谱系数据库，再写入只引用基因哈希的检查点"""
+        self.lineage_store.add_population(generation, self.population, self.lineage)
+        self.checkpoint.save_population(generation, self.population)
+        self.lineage = []
+
+    def evaluate_population(self, generation: int, done: Dict[int, Dict] = None) -> List[Dict]:
+        """
+        评估种群中每个个体的适应度
+        done: 已有结果的个体（按种群下标），来自检查点，不再重新模拟
+        """
+        # 创建本代日志目录，事件流式写入 gen_N/events.jsonl（Markdown用 python -m src.report 生成）
         gen_dir = os.path.join(self.log_dir, f"gen_{generation}")
         os.makedirs(gen_dir, exist_ok=True)
         
-        # 串行运行（未来可以用并行优化）
-        for i, agent_config in enumerate(track(self.population, description=f"评估第 {generation} 代...")):
-            # 更新代数
-            agent_config.generation = generation
+        results: List[Dict] = [None] * len(self.population)
+        for i, result in (done or {}).items():
+            results[i] = result
+        
+        # 增量刷新场景索引（只重新解析改动过的文件），再确定本代评估场景
+        self.env_manager.refresh()
+        self.scenarios = self.schedule.select(generation)
+        if len(self.scenarios) > 1:
+            console.print(f"[blue]评估场景:[/blue] {', '.join(self.scenarios)}")
+        scenario_version = self._scenario_version()
+        with JsonlLogSink.for_generation(gen_dir) as log_sink:
+            # 基因与场景都未变化的个体（如精英）按缓存策略直接复用适应度，不再模拟
+            for i, agent_config in enumerate(self.population):
+                if results[i] is not None or not scenario_version:
+                    continue
+                cached = self.fitness_cache.lookup(agent_config.gene, scenario_version, generation, agent_config.id)
+                if cached is not None:
+                    agent_config.generation = generation
+                    results[i] = cached
+                    self.checkpoint.save_result(generation, i, cached)
+                    self.lineage_store.record_result(agent_config.id, cached["fitness"], cached["solved_steps_count"])
+                    log_sink.emit({"step": 0, "type": "summary", "content": "适应度复用自缓存", "agent_id": agent_config.id,
+                                   "generation": generation, "metadata": compact_result(cached)})
             
-            # 运行模拟
-            sim_result = run_simulation(agent_config, self.env_manager)
-            results.append(sim_result)
+            if self.concurrency > 1:
+                return self._evaluate_population_concurrent(generation, log_sink, results, scenario_version)
             
-            # 保存详细日志
-            self.save_agent_log(gen_dir, sim_result)
+            # 串行运行
+            for i, agent_config in enumerate(track(self.population, description=f"评估第 {generation} 代...")):
+                if results[i] is not None:
+                    continue
+                # 更新代数
+                agent_config.generation = generation
+                
+                # 运行模拟
+                sim_result = run_scenarios(agent_config, self.env_manager, self.scenarios, runtime=self.runtime, log_sink=log_sink)
+                self._record_result(generation, i, sim_result, results, scenario_version)
             
         return results
 
-    def save_agent_log(self, gen_dir: str, result: Dict):
-        """将Agent的运行日志保存为Markdown文件"""
-        agent_id = result["agent_id"]
-        filename = os.path.join(gen_dir, f"{agent_id}.md")
-        
-        gene = result["gene"]
-        logs = result.get("logs", [])
-        
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(f"# Agent {agent_id} 模拟报告\n\n")
-            f.write(f"- **适应度**: {result['fitness']}\n")
-            f.write(f"- **解决步数**: {result['solved_steps_count']}\n")
-            f.write(f"- **剩余能量**: {result['final_energy']}\n")
-            f.write(f"- **死因**: {result.get('cause_of_death', '无')}\n\n")
-            
-            f.write("## 基因图谱\n")
-            f.write(f"### 身份\n{gene.identity}\n")
-            f.write(f"### 策略\n{gene.strategy}\n")
-            f.write(f"### 记忆\n{gene.memory}\n\n")
-            
-            f.write("## 交互日志\n")
-            for entry in logs:
-                step = entry.get("step")
-                log_type = entry.get("type")
-                content = entry.get("content")
-                meta = entry.get("metadata", {})
+    def _scenario_version(self) -> str:
+        """当前代评估场景的组合内容版本；场景无法加载时返回空串（此时不使用适应度缓存）"""
+        if not self.fitness_cache.enabled:
+            return ""
+        try:
+            return self.schedule.version(self.scenarios)
+        except FileNotFoundError:
+            return ""
+
+    def _record_result(self, generation: int, i: int, sim_result: Dict, results: List[Dict], scenario_version: str):
+        """登记一次真实模拟：写入适应度缓存（average 策略下适应度换成采样均值）、回填结果并写检查点"""
+        fitness_sample = None
+        if scenario_version:
+            fitness_sample = {"scenario_version": scenario_version, "fitness": sim_result.get("fitness")}
+            sim_result = self.fitness_cache.record(self.population[i].gene, scenario_version, generation, sim_result)
+        results[i] = sim_result
+        self.checkpoint.save_result(generation, i, sim_result, fitness_sample if "agent_id" in sim_result else None)
+        self.lineage_store.record_result(self.population[i].id, sim_result["fitness"], sim_result["solved_steps_count"])
+
+    def _evaluate_population_concurrent(self, generation: int, log_sink: JsonlLogSink, results: List[Dict], scenario_version: str = "") -> List[Dict]:
+        """
+        并发评估种群
+        逻辑：最多 concurrency 个模拟同时运行，结果按种群顺序回填；事件经带缓冲的日志写入器落盘
+        目的：让一代的耗时由LLM往返延迟的并发度决定，而不是随种群大小线性增长
+        """
+        # 并发评估期间，各Agent的裁判请求在短时间窗口内合批为一次多项调用；
+        # batch 模式下逐项请求已由调度器并发执行，收集窗口只会增加等待，不启用批处理器
+        batcher = enable_judge_batching(score_judge_batch) if JUDGE_BATCH_MODE == "multi" else None
+        if batcher:
+            batcher.reset_stats()
+        
+        try:
+            if SIMULATION_DRIVER == "async":
+                self._run_async(generation, log_sink, results, scenario_version)
+            else:
+                self._run_concurrent(generation, log_sink, results, scenario_version)
+        finally:
+            if batcher:
+                self.last_judge_batch_stats = batcher.stats()
+            disable_judge_batching()
+        
+        return results
+
+    def _run_concurrent(self, generation: int, log_sink: JsonlLogSink, results: List[Dict], scenario_version: str = ""):
+        """在线程池中运行本代所有模拟，按种群下标回填结果；进度条下方实时显示调度器的队列深度"""
+        scheduler = get_scheduler()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sim") as sim_pool, \
+             Progress(*Progress.get_default_columns(), TextColumn("[dim]{task.fields[queue]}"), console=console) as progress:
+            task = progress.add_task(f"评估第 {generation} 代 (并发 {self.concurrency})...", total=len(self.population), queue="")
+            progress.advance(task, sum(r is not None for r in results))
+            
+            futures = {}
+            for i, agent_config in enumerate(self.population):
+                if results[i] is not None:
+                    continue
+                agent_config.generation = generation
+                futures[sim_pool.submit(run_scenarios, agent_config, self.env_manager, self.scenarios, runtime=self.runtime, log_sink=log_sink)] = i
+            
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._record_result(generation, futures[future], future.result(), results, scenario_version)
+                    progress.advance(task)
+                if scheduler:
+                    progress.update(task, queue=format_queue(scheduler.snapshot()))
+
+    def _run_async(self, generation: int, log_sink: JsonlLogSink, results: List[Dict], scenario_version: str = ""):
+        """
+        在同一个事件循环中运行本代所有模拟
+        逻辑：每个个体一个协程（arun_scenarios -> app.astream），信号量限制同时运行的模拟数为 concurrency；
+              结果按完成顺序回填到对应的种群下标
+        目的：等待LLM的模拟不占用线程，并发度可以远高于线程池
+        """
+        scheduler = get_scheduler()
+        
+        async def evaluate_all():
+            semaphore = asyncio.Semaphore(self.concurrency)
+            
+            async def evaluate(i: int, agent_config: AgentConfig):
+                async with semaphore:
+                    return i, await arun_scenarios(agent_config, self.env_manager, self.scenarios, runtime=self.runtime, log_sink=log_sink)
+            
+            with Progress(*Progress.get_default_columns(), TextColumn("[dim]{task.fields[queue]}"), console=console) as progress:
+                task = progress.add_task(f"评估第 {generation} 代 (异步并发 {self.concurrency})...", total=len(self.population), queue="")
+                progress.advance(task, sum(r is not None for r in results))
+                
+                pending = []
+                for i, agent_config in enumerate(self.population):
+                    if results[i] is not None:
+                        continue
+                    agent_config.generation = generation
+                    pending.append(asyncio.ensure_future(evaluate(i, agent_config)))
                 
-                if log_type == "perception":
-                    f.write(f"### Step {step}: 环境感知\n")
-                    f.write(f"> **当前区域**: {meta.get('step_index')}\n\n")
-                    f.write(f"```text\n{content}\n```\n\n")
-                    
-                elif log_type == "agent":
-                    f.write(f"### Step {step}: Agent行动\n")
-                    f.write(f"**能量**: {meta.get('energy')}\n\n")
-                    f.write(f"{content}\n\n")
-                    
-                elif log_type == "judge":
-                    f.write(f"### Step {step}: 裁判反馈\n")
-                    f.write(f"**解决**: {meta.get('is_solved')} | **奖励**: {meta.get('energy_reward')}\n\n")
-                    f.write(f"> {content}\n\n")
-                    f.write("---\n\n")
-
-    def breed_next_generation(self, results: List[Dict], current_gen: int) -> List[AgentConfig]:
+                for next_done in asyncio.as_completed(pending):
+                    i, sim_result = await next_done
+                    self._record_result(generation, i, sim_result, results, scenario_version)
+                    progress.advance(task)
+                    if scheduler:
+                        progress.update(task, queue=format_queue(scheduler.snapshot()))
+        
+        self._run_on_loop(evaluate_all())
+
+    def _run_on_loop(self, coro):
+        """在复用的事件循环上运行协程（异步LLM客户端的连接池绑定在循环上，评估与繁殖必须共用同一个循环）"""
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+
+    def breed_next_generation(self, results: List[Dict], current_gen: int, stats: PopulationStats = None) -> List[AgentConfig]:
         """繁衍下一代：精英保留 + 变异交叉"""
-        # 按适应度排序
-        sorted_results = sorted(results, key=lambda x: x["fitness"], reverse=True)
+        stats = stats or PopulationStats(results)
         
         next_gen_configs = []
         
-        # 1. 精英保留 (Elitism): 保留最好的1个
-        elite = sorted_results[0]
-        console.print(f"[yellow]精英保留:[/yellow] {elite['agent_id']} (Fitness: {elite['fitness']})")
-        next_gen_configs.append(AgentConfig(
-            gene=elite["gene"],
-            generation=current_gen + 1
-        ))
+        # 1. 精英保留 (Elitism): 保留最好的 elite_count 个（只对前k个排序）
+        for elite in stats.elites(self.elite_count):
+            console.print(f"[yellow]精英保留:[/yellow] {elite['agent_id']} (Fitness: {elite['fitness']})")
+            elite_config = AgentConfig(
+                gene=elite["gene"],
+                generation=current_gen + 1
+            )
+            next_gen_configs.append(elite_config)
+            self.lineage.append({"child": elite_config.id, "parents": [elite["agent_id"]], "generation": current_gen + 1, "op": "elite"})
         
         # 2. 繁殖填补剩余空位
-        while len(next_gen_configs) < self.population_size:
-            # 简单的锦标赛选择
-            parent_a_res = self.tournament_select(sorted_results)
-            parent_b_res = self.tournament_select(sorted_results)
+        # 先一次性向量化选出所有父代组合（锦标赛/秩/轮盘赌，见 src/population.py；启用适应度共享时按共享适应度选择），再生成子代
+        parent_indices = stats.select_parents(max(0, self.population_size - len(next_gen_configs)))
+        pairs = [(results[a], results[b]) for a, b in parent_indices.tolist()]
+        child_genes = self._breed(pairs)
+        
+        # 3. 出生去重：与本代已评估的基因或兄弟近重复的子代换一组父代重新繁殖
+        if self.gene_index.dedup_enabled and pairs:
+            self.last_dedup_stats = self._reject_near_duplicates(stats, results, pairs, child_genes)
+        
+        for (parent_a_res, parent_b_res), child_gene in zip(pairs, child_genes):
+            child_config = AgentConfig(
+                gene=child_gene,
+                generation=current_gen + 1
+            )
+            next_gen_configs.append(child_config)
+            self.lineage.append({
+                "child": child_config.id,
+                "parents": [parent_a_res["agent_id"], parent_b_res["agent_id"]],
+                "generation": current_gen + 1,
+                "op": "crossover"
+            })
             
-            # 交叉变异
-            child_gene = self.mutator.evolve(
+        return next_gen_configs
+
+    def _breed(self, pairs: List[tuple]) -> List[Gene]:
+        """按父代组合生成子代基因（并发度大于1时并发调用变异器）"""
+        if self.concurrency > 1 and len(pairs) > 1:
+            return self._run_on_loop(self._breed_concurrent(pairs))
+        return [
+            self.mutator.evolve(
                 parent_a_res["gene"], 
                 parent_b_res["gene"],
                 parent_a_res["fitness"],
@@ -181,39 +392,158 @@ class EvolutionEngine:
                 parent_a_id=parent_a_res["agent_id"],
                 parent_b_id=parent_b_res["agent_id"]
             )
-            
-            next_gen_configs.append(AgentConfig(
-                gene=child_gene,
-                generation=current_gen + 1
-            ))
-            
-        return next_gen_configs
+            for parent_a_res, parent_b_res in pairs
+        ]
 
-    def tournament_select(self, sorted_results: List[Dict], k=2) -> Dict:
-        """锦标赛选择"""
-        import random
-        candidates = random.sample(sorted_results, k=min(k, len(sorted_results)))
-        return max(candidates, key=lambda x: x["fitness"])
+    def _reject_near_duplicates(self, stats: PopulationStats, results: List[Dict], pairs: List[tuple], child_genes: List[Gene]) -> Dict:
+        """
+        出生去重
+        逻辑：子代依次与本代全部已评估基因及已通过的兄弟比较（哈希n-gram余弦相似度），达到阈值即拒绝；
+              被拒绝的位置重新选择父代并繁殖，最多 retries 轮；仍重复的子代保留（保持种群大小）
+        目的：近重复子代的模拟几乎只会重复上一代的结果，把这次评估让给真正不同的基因
+        返回：本次去重统计（原地替换 pairs 与 child_genes）
+        """
+        reference = [r["gene"] for r in results]
+        duplicates, similarities = self.gene_index.find_near_duplicates(child_genes, reference)
+        rejected = len(duplicates)
+        rebreeds = 0
+        for _ in range(self.gene_index.retries):
+            if not duplicates:
+                break
+            rebreeds += len(duplicates)
+            parent_indices = stats.select_parents(len(duplicates))
+            new_pairs = [(results[a], results[b]) for a, b in parent_indices.tolist()]
+            for k, pair, gene in zip(duplicates, new_pairs, self._breed(new_pairs)):
+                pairs[k], child_genes[k] = pair, gene
+            # 只复查被替换的子代：比较集合为本代基因 + 已通过的兄弟
+            dup_set = set(duplicates)
+            accepted = [gene for k, gene in enumerate(child_genes) if k not in dup_set]
+            retry_dups, _ = self.gene_index.find_near_duplicates([child_genes[k] for k in duplicates], reference + accepted)
+            duplicates = [duplicates[j] for j in retry_dups]
+        
+        dedup_stats = {
+            "children": len(child_genes),
+            "rejected": rejected,
+            "avoided": rejected - len(duplicates),  # 被真正不同的子代替换的近重复个体 = 省去的冗余评估
+            "kept": len(duplicates),
+            "rebreeds": rebreeds,
+            "max_similarity": max(similarities) if similarities else 0.0,
+        }
+        if rejected:
+            console.print(
+                f"[magenta]出生去重:[/magenta] 拒绝 {rejected}/{len(child_genes)} 个近重复子代，"
+                f"重新繁殖 {rebreeds} 次，省去 {dedup_stats['avoided']} 次冗余评估"
+                + (f"，{len(duplicates)} 个重试后仍重复（保留）" if duplicates else "")
+            )
+        return dedup_stats
 
-    def display_generation_stats(self, results: List[Dict], generation: int):
-        """展示每代的统计信息"""
+    def accept_migrants(self, immigrants: List[Dict], next_gen: int):
+        """
+        接收其他岛屿迁入的基因
+        逻辑：迁入个体从种群末尾开始替换新生子代（排在前面的精英始终保留），谱系记为 migration
+        目的：在保持各岛独立演化的同时，让优秀基因在岛屿间扩散
+        """
+        count = max(0, min(len(immigrants), self.population_size - self.elite_count))
+        for offset, migrant in enumerate(immigrants[:count]):
+            config = AgentConfig(gene=Gene(**migrant["gene"]), generation=next_gen)
+            self.population[len(self.population) - 1 - offset] = config
+            self.lineage.append({
+                "child": config.id,
+                "parents": [migrant["agent_id"]],
+                "generation": next_gen,
+                "op": "migration",
+                "from_island": migrant["island"]
+            })
+        if count:
+            console.print(f"[magenta]迁入 {count} 个个体[/magenta] (来自岛屿 {immigrants[0]['island']})")
+
+    async def _breed_concurrent(self, pairs: List[tuple]) -> List[Gene]:
+        """
+        并发交叉变异
+        逻辑：所有父代组合同时调用 Mutator.aevolve，最多 concurrency 个请求在途，结果与 pairs 顺序一致
+        目的：繁殖耗时约等于一次LLM延迟，而不是随种群大小线性增长
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def breed(parent_a_res: Dict, parent_b_res: Dict) -> Gene:
+            async with semaphore:
+                return await self.mutator.aevolve(
+                    parent_a_res["gene"],
+                    parent_b_res["gene"],
+                    parent_a_res["fitness"],
+                    parent_b_res["fitness"],
+                    parent_a_id=parent_a_res["agent_id"],
+                    parent_b_id=parent_b_res["agent_id"]
+                )
+        
+        return await asyncio.gather(*(breed(a, b) for a, b in pairs))
+
+    def display_generation_stats(self, results: List[Dict], generation: int, cache_stats: Dict = None, batch_stats: Dict = None, perf: Dict = None,
+                                 fitness_stats: Dict = None, stats: PopulationStats = None, dedup_stats: Dict = None):
+        """展示每代的统计信息（结果表只列适应度前 GENERATION_TABLE_ROWS 个体）"""
+        stats = stats or PopulationStats(results)
         table = Table(title=f"第 {generation} 代 评估结果")
+        captions = []
+        diversity = stats.diversity()
+        captions.append(
+            f"多样性: 独特基因 {diversity['unique_genes']:.0%} | 适应度变异系数 {diversity['fitness_cv']:.2f} | "
+            f"解决步数熵 {diversity['solved_entropy']:.2f} bit | 存活率 {float(stats.alive.mean()):.0%}"
+            + (f" | 平均小生境 {float(stats.niche_counts.mean()):.2f}" if stats.niche_counts is not None else "")
+        )
+        if dedup_stats and dedup_stats["rejected"]:
+            captions.append(
+                f"出生去重: 拒绝 {dedup_stats['rejected']} 个近重复子代，省去 {dedup_stats['avoided']} 次冗余评估"
+                + (f"（{dedup_stats['kept']} 个重试后仍重复）" if dedup_stats["kept"] else "")
+            )
+        if perf and perf["agents"]:
+            captions.append(
+                f"吞吐: {perf['agents_per_s']:.2f} 个体/秒 | LLM调用/个体: {perf['llm_calls_per_agent']:.1f} | "
+                f"Tokens: {perf['tokens']} | 步延迟 p50/p95: {perf['step_latency_p50_s']:.2f}s/{perf['step_latency_p95_s']:.2f}s | "
+                f"可缓存前缀: {perf.get('prefix_token_share', 0.0):.0%}"
+            )
+        if perf and perf.get("cached_input_tokens"):
+            captions.append(f"服务端前缀缓存命中: {perf['cached_input_tokens']} 输入tokens")
+        if perf and perf.get("speculative_started"):
+            captions.append(
+                f"投机执行: 发出 {perf['speculative_started']} 次，命中率 {perf['speculative_hit_rate']:.0%}，"
+                f"浪费 {perf['speculative_wasted_tokens']} tokens"
+            )
+        if perf and perf.get("early_stops"):
+            captions.append(f"提前终止: {perf['early_stops']} 个体，约省去 {perf['llm_calls_saved']} 次LLM调用")
+        if perf and perf.get("scheduler") and perf["scheduler"]["retries"]:
+            sched = perf["scheduler"]
+            captions.append(f"调度器: 重试 {sched['retries']} 次 (429 {sched['throttled']}), 最终失败 {sched['failed']}, 最大排队 {sched['max_queue_depth']}")
+        if cache_stats and cache_stats["hits"] + cache_stats["misses"]:
+            captions.append(
+                f"裁判缓存: 命中 {cache_stats['hits']} / 查询 {cache_stats['hits'] + cache_stats['misses']} "
+                f"({cache_stats['hit_rate']:.0%}), 条目 {cache_stats['entries']}"
+            )
+        if batch_stats and batch_stats["batches"]:
+            captions.append(f"裁判合批: {batch_stats['items']} 项 / {batch_stats['batches']} 批 (平均 {batch_stats['avg_batch_size']:.1f})")
+        if fitness_stats and fitness_stats["reused"]:
+            captions.append(f"适应度缓存({fitness_stats['policy']}): 复用 {fitness_stats['reused']} 个体，省去 {fitness_stats['reused']} 次模拟")
         table.add_column("ID", style="cyan", no_wrap=True)
         table.add_column("适应度", style="magenta")
         table.add_column("解决步数", style="green")
         table.add_column("剩余能量", style="yellow")
+        table.add_column("Tokens/步", style="blue")
         table.add_column("策略摘要", style="white")
         
-        # 按适应度排序
-        sorted_results = sorted(results, key=lambda x: x["fitness"], reverse=True)
+        # 按适应度取前N（argpartition，不对整个种群排序）
+        shown = stats.top_indices(GENERATION_TABLE_ROWS)
+        if len(shown) < len(results):
+            captions.append(f"仅展示适应度前 {len(shown)} / {len(results)} 个体")
+        table.caption = "\n".join(captions)
         
-        for res in sorted_results:
+        for res in (results[i] for i in shown):
             strategy_summary = res["gene"].strategy[:30] + "..." if len(res["gene"].strategy) > 30 else res["gene"].strategy
+            step_tokens = res.get("prompt_tokens_per_step") or []
             table.add_row(
-                res["agent_id"],
+                res["agent_id"] + (" *" if res.get("cached") else ""),
                 str(res["fitness"]),
                 str(res["solved_steps_count"]),
                 str(res["final_energy"]),
+                f"{sum(step_tokens) / len(step_tokens):.0f}" if step_tokens else "-",
                 strategy_summary
             )
             
@@ -240,5 +570,11 @@ class EvolutionEngine:
             title=f"🏆 史上最强个体 (Gen {best_ever['generation']}, Fitness {best_ever['best_fitness']})",
             border_style="gold1"
         ))
+        
+        lineage_stats = self.lineage_store.stats()
+        console.print(
+            f"谱系库: {lineage_stats['agents']} 个体 / {lineage_stats['genes']} 种基因 / {lineage_stats['texts']} 段去重文本 "
+            f"({lineage_stats['bytes'] / 1024:.0f} KB)，查询: python -m src.lineage {self.log_dir} ancestors <ID>"
+        )
 
 from rich.panel import Panel
@@ -0,0 +1,193 @@
+"""
+离线模拟LLM后端
+逻辑：实现 LangChain 的 BaseChatModel 接口，按 (种子, prompt内容) 确定性地生成脚本化回复、
+      模拟延迟分布并报告token用量；结构化输出（裁判的 JudgeOutput / JudgeBatchOutput、基因 Gene）同样可用
+目的：整个进化循环无需网络即可在单机上运行和压测，替代散落在各节点中的演示模式分支
+
+通过 LLM_BACKEND=fake 选择（未配置有效API Key时默认使用）
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Any, List, Optional, Type
+
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel
+
+from src.tokens import count_message_tokens, count_tokens
+
+load_dotenv()
+
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "42"))
+# 延迟分布: const:秒 | uniform:最小,最大 | lognormal:mu,sigma（单位秒）
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "const:0")
+# Agent回复的目标token数（0表示使用脚本原文）
+FAKE_LLM_RESPONSE_TOKENS = int(os.getenv("FAKE_LLM_RESPONSE_TOKENS", "0"))
+# 裁判判定"已解决"的概率
+FAKE_JUDGE_SOLVE_RATE = float(os.getenv("FAKE_JUDGE_SOLVE_RATE", "0.3"))
+# 每次调用返回429限流错误的概率（用于验证调度器的退避重试）
+FAKE_LLM_RATE_LIMIT_RATE = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))
+
+AGENT_SCRIPT = [
+    "我检查地板上的生锈铁钥匙。",
+    "我捡起生锈的钥匙，放进口袋。",
+    "我仔细观察四周，寻找可以使用的物品。",
+    "我用钥匙尝试打开面前的门。",
+    "我大声呼喊，看看是否有人回应。",
+    "我沿着墙壁摸索，寻找隐藏的出口。",
+]
+
+MUTATION_SCRIPT = [
+    ("谨慎的探险家", "先观察再行动，优先拾取可能有用的物品。"),
+    ("务实的工匠", "把每个物品都当作工具，尝试直接使用它们解决眼前的问题。"),
+    ("冷静的推理者", "列出所有可能的行动，逐一排除不合理的选项。"),
+    ("大胆的开拓者", "果断尝试最直接的解决方案，失败后立即换一种方法。"),
+]
+
+
+class FakeRateLimitError(Exception):
+    """模拟服务端的 429 Too Many Requests"""
+    status_code = 429
+
+
+def parse_latency(spec: str):
+    """把延迟配置解析为 rng -> 秒 的采样函数"""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "const":
+        return lambda rng: values[0] if values else 0.0
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"未知的延迟分布: {spec}")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    确定性的模拟聊天模型
+    逻辑：同样的种子和prompt总是得到同样的回复与延迟，与线程调度顺序无关；
+          回复根据prompt类型选择：变异器prompt返回基因JSON，其余返回Agent行动
+    目的：可复现的离线运行与基准测试
+    """
+    model_name: str = "fake"
+    temperature: float = 0.0
+    seed: int = FAKE_LLM_SEED
+    latency: str = FAKE_LLM_LATENCY
+    response_tokens: int = FAKE_LLM_RESPONSE_TOKENS
+    solve_rate: float = FAKE_JUDGE_SOLVE_RATE
+    rate_limit_rate: float = FAKE_LLM_RATE_LIMIT_RATE
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _rng(self, messages: List[BaseMessage]) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}|{self.model_name}|{self.temperature}".encode())
+        for m in messages:
+            digest.update(str(m.content).encode("utf-8"))
+        return random.Random(int.from_bytes(digest.digest()[:8], "big"))
+
+    def _delay(self, rng: random.Random) -> float:
+        return max(0.0, parse_latency(self.latency)(rng))
+
+    def _respond(self, messages: List[BaseMessage], rng: random.Random) -> str:
+        system = str(messages[0].content) if messages else ""
+        if "JSON" in system:
+            return json.dumps(self._fake_mutation(rng), ensure_ascii=False)
+
+        text = rng.choice(AGENT_SCRIPT)
+        if self.response_tokens > 0:
+            filler = "我会继续仔细观察环境中的每一个细节。"
+            while count_tokens(text) < self.response_tokens:
+                text += filler
+        return text
+
+    @staticmethod
+    def _fake_mutation(rng: random.Random) -> dict:
+        """变异器输出（reasoning + 基因三要素），文本回复与结构化输出共用"""
+        identity, strategy = rng.choice(MUTATION_SCRIPT)
+        return {
+            "reasoning": "（离线模拟）混合父代特征并引入随机变异。",
+            "identity": identity,
+            "strategy": f"{strategy}（变异 {rng.randint(1, 99)}）",
+            "memory": "钥匙通常能打开附近的门。",
+        }
+
+    def _result(self, messages: List[BaseMessage], text: str) -> ChatResult:
+        input_tokens = count_message_tokens(messages)
+        output_tokens = count_tokens(text)
+        message = AIMessage(
+            content=text,
+            usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _maybe_rate_limit(self):
+        # 限流与prompt内容无关，使用全局随机数，否则重试永远得到同样的错误
+        if self.rate_limit_rate and random.random() < self.rate_limit_rate:
+            raise FakeRateLimitError("429 Too Many Requests（离线模拟）")
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        self._maybe_rate_limit()
+        rng = self._rng(messages)
+        time.sleep(self._delay(rng))
+        return self._result(messages, self._respond(messages, rng))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        self._maybe_rate_limit()
+        rng = self._rng(messages)
+        await asyncio.sleep(self._delay(rng))
+        return self._result(messages, self._respond(messages, rng))
+
+    # --- 结构化输出 ---
+
+    def _fake_structured(self, schema: Type[BaseModel], rng: random.Random) -> BaseModel:
+        """
+        按Schema生成确定性的结构化结果
+        逻辑：裁判输出（含 is_solved）与基因/变异器输出（含 identity、strategy）按字段识别；
+              包含列表字段的批量Schema按prompt中的评估项数量填充；其余Schema抛出 ValueError
+        """
+        fields = schema.model_fields
+        if "is_solved" in fields:
+            solved = rng.random() < self.solve_rate
+            return schema(
+                is_solved=solved,
+                energy_reward=rng.randint(3, 5) if solved else rng.randint(0, 2),
+                reasoning="（离线模拟）行动解决了当前问题。" if solved else "（离线模拟）行动没有解决当前问题。",
+                next_environment_hint="继续前进。" if solved else "换一种方法试试。",
+            )
+        if {"identity", "strategy"} <= fields.keys():
+            mutation = self._fake_mutation(rng)
+            return schema(**{k: v for k, v in mutation.items() if k in fields})
+        raise ValueError(f"模拟后端不支持结构化输出 Schema {schema.__name__}（支持裁判输出与基因/变异器输出），字段: {sorted(fields)}")
+
+    def _structured_output(self, schema: Type[BaseModel], messages: List[BaseMessage]) -> BaseModel:
+        rng = self._rng(messages)
+        list_field = next((name for name, f in schema.model_fields.items() if getattr(f.annotation, "__origin__", None) in (list, List)), None)
+        if list_field is not None:
+            item_schema = schema.model_fields[list_field].annotation.__args__[0]
+            count = max(1, str(messages[-1].content).count("### 评估项"))
+            return schema(**{list_field: [self._fake_structured(item_schema, rng) for _ in range(count)]})
+        return self._fake_structured(schema, rng)
+
+    def with_structured_output(self, schema: Type[BaseModel], **kwargs: Any) -> Runnable:
+        # 先走一次普通调用：产生模拟延迟，并像真实模型一样触发回调（调用次数、token统计）
+        def invoke(prompt_value):
+            messages = self._convert_input(prompt_value).to_messages()  # 兼容 str / PromptValue / 消息列表
+            self.invoke(messages)
+            return self._structured_output(schema, messages)
+
+        async def ainvoke(prompt_value):
+            messages = self._convert_input(prompt_value).to_messages()
+            await self.ainvoke(messages)
+            return self._structured_output(schema, messages)
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"Fake{schema.__name__}")
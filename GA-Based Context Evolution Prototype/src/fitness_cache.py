@@ -0,0 +1,138 @@
+"""
+适应度记忆化
+逻辑：以 (基因指纹, 场景版本) 为键记录已评估基因的模拟结果；精英等未改变的基因在下一代可按策略直接复用分数
+目的：精英保留的基因原样进入下一代，每代重复跑一遍完整模拟（十几次LLM调用）几乎不带来新信息
+"""
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from src.models import Gene
+
+load_dotenv()
+
+# off: 不缓存 | reuse: 直接复用上次分数 | every_k: 每k代重新评估一次 | average: 累积多次采样取平均
+# 默认关闭：复用分数会把精英第一次（带噪声的）得分固定下来，改变选择结果，需显式开启
+FITNESS_CACHE_POLICY = os.getenv("FITNESS_CACHE_POLICY", "off")
+FITNESS_CACHE_K = int(os.getenv("FITNESS_CACHE_K", "3"))
+FITNESS_CACHE_SAMPLES = int(os.getenv("FITNESS_CACHE_SAMPLES", "3"))
+
+POLICIES = ("off", "reuse", "every_k", "average")
+
+
+def gene_fingerprint(gene: Gene) -> str:
+    """基因指纹：身份/策略/记忆三段内容的哈希（字段间用分隔符，避免拼接歧义）"""
+    payload = "\0".join([gene.identity, gene.strategy, gene.memory])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class FitnessEntry:
+    """同一基因在同一场景版本下的评估记录"""
+    result: Dict                       # 最近一次完整模拟的结果（已去掉日志）
+    samples: List[float] = field(default_factory=list)  # 每次真实模拟得到的适应度
+    last_evaluated: int = 0            # 最近一次真实模拟所在的代数
+
+    @property
+    def fitness(self) -> float:
+        return sum(self.samples) / len(self.samples)
+
+
+class FitnessCache:
+    """
+    基因适应度缓存
+    逻辑：lookup 判断本代能否跳过模拟并返回复用的结果；record 在真实模拟后登记采样，
+          average 策略下返回的适应度会替换为历次采样均值
+    目的：把模拟预算留给新个体，同时允许按需重新采样以抵消LLM输出的随机性
+    """
+    def __init__(self, policy: str = FITNESS_CACHE_POLICY, k: int = FITNESS_CACHE_K, samples: int = FITNESS_CACHE_SAMPLES):
+        if policy not in POLICIES:
+            raise ValueError(f"未知的适应度缓存策略: {policy}（可选: {', '.join(POLICIES)}）")
+        self.policy = policy
+        self.k = max(1, k)
+        self.samples = max(1, samples)
+        self._entries: Dict[tuple, FitnessEntry] = {}
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.evaluated = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.policy != "off"
+
+    def lookup(self, gene: Gene, scenario_version: str, generation: int, agent_id: str) -> Optional[Dict]:
+        """
+        查询可复用的结果
+        返回以当前个体ID重新标记的结果副本；不满足复用条件时返回None（需要真实模拟）
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get((gene_fingerprint(gene), scenario_version))
+            if entry is None:
+                return None
+            if self.policy == "every_k" and generation - entry.last_evaluated >= self.k:
+                return None
+            if self.policy == "average" and len(entry.samples) < self.samples:
+                return None
+            self.reused += 1
+            fitness = round(entry.fitness, 2) if self.policy == "average" else entry.result["fitness"]
+
+        result = dict(entry.result)
+        result.update(
+            agent_id=agent_id,
+            generation=generation,
+            fitness=fitness,
+            step_latencies=None,  # 未实际运行，不计入吞吐与延迟统计
+            logs=[],
+            cached=True,
+        )
+        return result
+
+    def record(self, gene: Gene, scenario_version: str, generation: int, result: Dict) -> Dict:
+        """
+        登记一次真实模拟的结果
+        average 策略下返回适应度替换为历次采样均值的结果，其余策略原样返回
+        """
+        if not self.enabled or "agent_id" not in result:
+            return result
+        key = (gene_fingerprint(gene), scenario_version)
+        with self._lock:
+            self.evaluated += 1
+            entry = self._entries.get(key)
+            stored = {k: v for k, v in result.items() if k != "logs"}
+            if entry is None or self.policy != "average":
+                entry = FitnessEntry(result=stored)
+                self._entries[key] = entry
+            else:
+                entry.result = stored
+            entry.samples.append(result["fitness"])
+            entry.last_evaluated = generation
+            if self.policy != "average" or len(entry.samples) == 1:
+                return result
+            fitness = round(entry.fitness, 2)
+
+        return {**result, "fitness": fitness}
+
+    def restore(self, samples: List[tuple]):
+        """
+        从检查点重建缓存
+        逻辑：按原顺序重放每次真实模拟的登记（结果中的适应度换回原始采样），average 策略的采样与 every_k 的评估代数都得以延续
+        """
+        for generation, result, scenario_version, fitness in samples:
+            if isinstance(result.get("gene"), Gene):
+                self.record(result["gene"], scenario_version, generation, {**result, "fitness": fitness})
+        self.reset_stats()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"policy": self.policy, "reused": self.reused, "evaluated": self.evaluated, "entries": len(self._entries)}
+
+    def reset_stats(self):
+        with self._lock:
+            self.reused = 0
+            self.evaluated = 0
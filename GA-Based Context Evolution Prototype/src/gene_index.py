@@ -0,0 +1,149 @@
+"""
+基因嵌入索引
+逻辑：把 Gene.to_prompt_string() 切成字符 n-gram，哈希到固定维度（带符号哈希）后做L2归一化，
+      基因之间的相似度即向量内积（余弦相似度）；完全本地计算，不依赖模型或网络
+用途：
+  - 出生去重：子代与当前种群/已接受的兄弟过于相似时拒绝，换一组父代重新繁殖
+  - 适应度共享（niching）：选择时按小生境内的相似个体数折减适应度，避免同一谱系的克隆垄断父代
+目的：高温变异常常产出只改了几个字的策略，这些近重复个体每个都要花一次完整模拟去评估
+
+两者都会改变选择结果，默认关闭，分别由 GENE_DEDUP_ENABLED / GENE_NICHING_ENABLED 开启
+"""
+import os
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.fitness_cache import gene_fingerprint
+from src.models import Gene
+
+load_dotenv()
+
+GENE_EMBED_DIM = int(os.getenv("GENE_EMBED_DIM", "1024"))  # 哈希向量维度
+GENE_NGRAM = int(os.getenv("GENE_NGRAM", "3"))  # 字符 n-gram 的最大长度（同时包含 2..n）
+GENE_DEDUP_ENABLED = os.getenv("GENE_DEDUP_ENABLED", "0") == "1"  # 是否开启出生去重
+GENE_NICHING_ENABLED = os.getenv("GENE_NICHING_ENABLED", "0") == "1"  # 是否开启适应度共享
+GENE_DEDUP_THRESHOLD = float(os.getenv("GENE_DEDUP_THRESHOLD", "0.85"))  # 余弦相似度不低于该值视为近重复，0 关闭出生去重
+GENE_DEDUP_RETRIES = int(os.getenv("GENE_DEDUP_RETRIES", "2"))  # 近重复子代最多重新繁殖的轮数
+GENE_NICHE_RADIUS = float(os.getenv("GENE_NICHE_RADIUS", "0.2"))  # 适应度共享的小生境半径（余弦距离），0 关闭
+GENE_NICHE_ALPHA = float(os.getenv("GENE_NICHE_ALPHA", "1"))  # 共享函数形状: sh(d) = 1 - (d/半径)^alpha
+
+# 小生境计数分块计算的行数，内存占用为 块大小 x 种群大小
+NICHE_BLOCK_ROWS = 1024
+# 向量缓存的条目上限（按基因指纹）
+VECTOR_CACHE_SIZE = 65536
+
+
+def embed_text(text: str, dim: int = GENE_EMBED_DIM, ngram: int = GENE_NGRAM) -> np.ndarray:
+    """
+    文本 -> 哈希 n-gram 向量（L2归一化）
+    逻辑：去掉空白后取所有长度为 2..ngram 的字符片段，crc32 决定桶位与符号，计数累加
+    """
+    chars = "".join(text.split())
+    vector = np.zeros(dim, dtype=np.float32)
+    if not chars:
+        return vector
+    buckets, signs = [], []
+    for n in range(2, max(2, ngram) + 1):
+        for i in range(len(chars) - n + 1):
+            h = zlib.crc32(chars[i:i + n].encode("utf-8"))
+            buckets.append(h % dim)
+            signs.append(1.0 if (h >> 31) & 1 else -1.0)
+    if not buckets:
+        buckets, signs = [zlib.crc32(chars.encode("utf-8")) % dim], [1.0]
+    np.add.at(vector, np.asarray(buckets), np.asarray(signs, dtype=np.float32))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class GeneIndex:
+    """
+    基因向量索引
+    逻辑：按基因指纹缓存向量；提供批量向量、出生去重与小生境计数
+    """
+    def __init__(self, dim: int = GENE_EMBED_DIM, ngram: int = GENE_NGRAM, threshold: float = GENE_DEDUP_THRESHOLD,
+                 retries: int = GENE_DEDUP_RETRIES, niche_radius: float = GENE_NICHE_RADIUS, niche_alpha: float = GENE_NICHE_ALPHA,
+                 dedup: bool = GENE_DEDUP_ENABLED, niching: bool = GENE_NICHING_ENABLED):
+        self.dim = dim
+        self.dedup = dedup
+        self.niching = niching
+        self.ngram = ngram
+        self.threshold = threshold
+        self.retries = max(0, retries)
+        self.niche_radius = niche_radius
+        self.niche_alpha = niche_alpha
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    @property
+    def dedup_enabled(self) -> bool:
+        return self.dedup and self.threshold > 0
+
+    @property
+    def niching_enabled(self) -> bool:
+        return self.niching and self.niche_radius > 0
+
+    def vector(self, gene: Gene) -> np.ndarray:
+        key = gene_fingerprint(gene)
+        vector = self._vectors.get(key)
+        if vector is None:
+            vector = embed_text(gene.to_prompt_string(), self.dim, self.ngram)
+            self._vectors[key] = vector
+            if len(self._vectors) > VECTOR_CACHE_SIZE:
+                self._vectors.popitem(last=False)
+        else:
+            self._vectors.move_to_end(key)
+        return vector
+
+    def matrix(self, genes: List[Gene]) -> np.ndarray:
+        if not genes:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self.vector(gene) for gene in genes])
+
+    def similarity(self, a: Gene, b: Gene) -> float:
+        return float(self.vector(a) @ self.vector(b))
+
+    def niche_counts(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        小生境计数 m_i = Σ_j sh(d_ij)，d = 1 - 余弦相似度；自身贡献1，因此 m_i >= 1
+        逻辑：按 NICHE_BLOCK_ROWS 行分块做矩阵乘，内存不随种群平方增长（计算量仍为 O(n²·dim)）
+        """
+        n = len(vectors)
+        counts = np.ones(n, dtype=np.float64)
+        if n == 0 or not self.niching_enabled:
+            return counts
+        for start in range(0, n, NICHE_BLOCK_ROWS):
+            distance = 1.0 - vectors[start:start + NICHE_BLOCK_ROWS] @ vectors.T
+            np.clip(distance, 0.0, None, out=distance)
+            share = np.where(distance < self.niche_radius, 1.0 - (distance / self.niche_radius) ** self.niche_alpha, 0.0)
+            counts[start:start + NICHE_BLOCK_ROWS] = np.maximum(share.sum(axis=1), 1.0)
+        return counts
+
+    def find_near_duplicates(self, candidates: List[Gene], reference: List[Gene]) -> Tuple[List[int], List[float]]:
+        """
+        出生去重检查
+        逻辑：依次检查每个候选，与 reference 及已通过的候选比较最大相似度；通过的候选加入比较集合
+        返回：(近重复候选的下标, 每个候选的最大相似度)
+        """
+        if not self.dedup_enabled:
+            return [], [0.0] * len(candidates)
+        accepted = np.empty((len(reference) + len(candidates), self.dim), dtype=np.float32)
+        count = len(reference)
+        if count:
+            accepted[:count] = self.matrix(reference)
+        duplicates, similarities = [], []
+        for k, gene in enumerate(candidates):
+            vector = self.vector(gene)
+            best = float((accepted[:count] @ vector).max()) if count else 0.0
+            similarities.append(best)
+            if best >= self.threshold:
+                duplicates.append(k)
+            else:
+                accepted[count] = vector
+                count += 1
+        return duplicates, similarities
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached_vectors": len(self._vectors)}
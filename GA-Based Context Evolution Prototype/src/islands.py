@@ -0,0 +1,180 @@
+"""
+岛屿模型进化
+逻辑：多个 EvolutionEngine 种群分别运行在独立进程中（岛屿），每隔 k 代把各岛最优的基因沿环形拓扑
+      迁移到下一个岛屿；全部结束后把各岛的历史合并为一份报告
+目的：用多核并行扩大搜索规模，同时各岛独立演化，比一个大种群保持更高的多样性
+"""
+import json
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from rich.console import Console
+from rich.panel import Panel
+from rich.table import Table
+
+from src.checkpoint import compact_result, restore_result
+from src.lineage import LineageStore, LINEAGE_DB_FILENAME
+from src.population import PopulationStats
+
+load_dotenv()
+
+ISLAND_MIGRATION_INTERVAL = int(os.getenv("ISLAND_MIGRATION_INTERVAL", "2"))
+ISLAND_MIGRANTS = int(os.getenv("ISLAND_MIGRANTS", "1"))
+ISLAND_MIGRATION_TIMEOUT = float(os.getenv("ISLAND_MIGRATION_TIMEOUT", "600"))
+
+ISLANDS_FILENAME = "islands.json"
+
+console = Console()
+
+
+class RingMigration:
+    """
+    环形迁移通道
+    逻辑：岛屿 i 把本代最优的 migrants 个基因放入岛屿 i+1 的收件队列，再从自己的队列取出上游岛屿的迁入者；
+          所有岛屿代数相同，因此每次迁移每个岛恰好收到一条消息
+    目的：作为 EvolutionEngine.migration 钩子，在繁衍后用迁入者替换部分子代
+    """
+    def __init__(self, island_id: int, inbox, outbox, interval: int = ISLAND_MIGRATION_INTERVAL,
+                 migrants: int = ISLAND_MIGRANTS, timeout: float = ISLAND_MIGRATION_TIMEOUT):
+        self.island_id = island_id
+        self.inbox = inbox
+        self.outbox = outbox
+        self.interval = max(1, interval)
+        self.migrants = migrants
+        self.timeout = timeout
+
+    def exchange(self, generation: int, results: List[Dict]) -> List[Dict]:
+        """发送本岛最优基因并接收上游迁入者；非迁移代或超时（上游岛屿异常退出）时返回空列表"""
+        if self.migrants <= 0 or generation % self.interval != 0 or self.inbox is self.outbox:
+            return []
+        best = PopulationStats([r for r in results if "agent_id" in r]).elites(self.migrants)
+        self.outbox.put([
+            {"agent_id": r["agent_id"], "fitness": r["fitness"], "gene": r["gene"].model_dump(), "island": self.island_id}
+            for r in best
+        ])
+        try:
+            return self.inbox.get(timeout=self.timeout)
+        except queue.Empty:
+            return []
+
+
+def _run_island(island_id: int, inboxes: List, population_size: int, generations: int, log_dir: str,
+                concurrency: int, interval: int, migrants: int) -> Dict:
+    """
+    子进程入口：运行一个岛屿的完整进化
+    逻辑：子进程中关闭控制台输出（多个岛屿同时刷新进度条会交错），详细过程仍写入各岛日志目录
+    """
+    import rich
+    from src import evolution, mutator
+    from src.evolution import EvolutionEngine
+
+    for quiet_console in (rich.get_console(), evolution.console, mutator.console):
+        quiet_console.quiet = True
+
+    migration = RingMigration(island_id, inboxes[island_id], inboxes[(island_id + 1) % len(inboxes)], interval, migrants)
+    engine = EvolutionEngine(
+        population_size=population_size,
+        generations=generations,
+        log_dir=os.path.join(log_dir, f"island_{island_id}"),
+        concurrency=concurrency,
+        migration=migration,
+        prototype_offset=island_id
+    )
+    engine.run()
+    return {
+        "island": island_id,
+        "log_dir": engine.log_dir,
+        "history": [{**entry, "best_agent": compact_result(entry["best_agent"])} for entry in engine.history]
+    }
+
+
+def merge_histories(island_runs: List[Dict]) -> List[Dict]:
+    """
+    合并各岛历史
+    逻辑：按代对齐，全局最优取各岛最优的最大值，全局平均按各岛种群平均（各岛种群大小相同）
+    """
+    merged = []
+    generations = sorted({entry["generation"] for run in island_runs for entry in run["history"]})
+    for gen in generations:
+        entries = [(run["island"], entry) for run in island_runs for entry in run["history"] if entry["generation"] == gen]
+        best_island, best_entry = max(entries, key=lambda item: item[1]["best_fitness"])
+        merged.append({
+            "generation": gen,
+            "best_fitness": best_entry["best_fitness"],
+            "avg_fitness": sum(entry["avg_fitness"] for _, entry in entries) / len(entries),
+            "best_island": best_island,
+            "best_agent": best_entry["best_agent"],
+            "islands": {island: {"best_fitness": entry["best_fitness"], "avg_fitness": entry["avg_fitness"]} for island, entry in entries}
+        })
+    return merged
+
+
+def run_islands(islands: int, population_size: int, generations: int, log_dir: str = None, concurrency: int = 1,
+                interval: int = ISLAND_MIGRATION_INTERVAL, migrants: int = ISLAND_MIGRANTS) -> List[Dict]:
+    """
+    运行岛屿模型
+    逻辑：每个岛屿一个进程（spawn 启动，避免 fork 继承HTTP连接池与SQLite连接），迁移队列由 Manager 托管
+    目的：返回合并后的历史，同时写入 <log_dir>/islands.json
+    """
+    if log_dir is None:
+        log_dir = os.path.join("logs", f"islands_{time.strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(log_dir, exist_ok=True)
+    console.print(f"[blue]{islands} 个岛屿，每岛 {population_size} 个体，每 {interval} 代迁移 {migrants} 个体；日志: {log_dir}[/blue]")
+
+    ctx = multiprocessing.get_context("spawn")
+    island_runs = []
+    with ctx.Manager() as manager, ProcessPoolExecutor(max_workers=islands, mp_context=ctx) as pool:
+        inboxes = [manager.Queue() for _ in range(islands)]
+        futures = {
+            pool.submit(_run_island, i, inboxes, population_size, generations, log_dir, concurrency, interval, migrants): i
+            for i in range(islands)
+        }
+        for future in as_completed(futures):
+            run = future.result()
+            island_runs.append(run)
+            best = max(run["history"], key=lambda x: x["best_fitness"])
+            console.print(f"[green]岛屿 {run['island']} 完成[/green] 最佳适应度 {best['best_fitness']} (Gen {best['generation']})")
+
+    island_runs.sort(key=lambda run: run["island"])
+    merged = merge_histories(island_runs)
+    with open(os.path.join(log_dir, ISLANDS_FILENAME), "w", encoding="utf-8") as f:
+        json.dump({"islands": island_runs, "merged": merged}, f, ensure_ascii=False, indent=2)
+
+    display_island_report(merged, islands, {run["island"]: run["log_dir"] for run in island_runs})
+    return merged
+
+
+def display_island_report(merged: List[Dict], islands: int, log_dirs: Dict[int, str]):
+    """展示合并后的进化趋势与全局最优个体（最优个体的基因从所在岛屿的谱系库还原）"""
+    console.rule("[bold red]岛屿模型进化报告[/bold red]")
+    table = Table(title="各岛最佳适应度")
+    table.add_column("代数", style="cyan")
+    for i in range(islands):
+        table.add_column(f"岛屿 {i}", style="magenta")
+    table.add_column("全局最佳", style="green")
+    table.add_column("全局平均", style="yellow")
+
+    for entry in merged:
+        per_island = [entry["islands"].get(i) for i in range(islands)]
+        table.add_row(
+            str(entry["generation"]),
+            *[str(stats["best_fitness"]) if stats else "-" for stats in per_island],
+            f"{entry['best_fitness']} (岛屿 {entry['best_island']})",
+            f"{entry['avg_fitness']:.1f}"
+        )
+    console.print(table)
+
+    best_ever = max(merged, key=lambda x: x["best_fitness"])
+    store = LineageStore(os.path.join(log_dirs[best_ever["best_island"]], LINEAGE_DB_FILENAME))
+    best_agent = restore_result(best_ever["best_agent"], store)
+    store.close()
+    console.print(Panel(
+        best_agent["gene"].to_prompt_string(),
+        title=f"🏆 史上最强个体 (岛屿 {best_ever['best_island']}, Gen {best_ever['generation']}, Fitness {best_ever['best_fitness']})",
+        border_style="gold1"
+    ))
@@ -0,0 +1,142 @@
+"""
+裁判批处理
+逻辑：在一个很短的时间窗口内收集来自多个并发模拟的待评估项，攒成一批统一打分，再把判决逐个送回调用方
+目的：大种群并发评估时，用一次批量调用代替N次独立请求，提高裁判吞吐、摊薄单次请求开销
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JUDGE_BATCH_ENABLED = os.getenv("JUDGE_BATCH_ENABLED", "1") == "1"
+JUDGE_BATCH_WINDOW_MS = int(os.getenv("JUDGE_BATCH_WINDOW_MS", "50"))
+JUDGE_BATCH_MAX_SIZE = int(os.getenv("JUDGE_BATCH_MAX_SIZE", "16"))
+
+# 批量打分函数：输入一批待评估项，按相同顺序返回结果（单项失败时返回 Exception）
+ScoreFn = Callable[[List[Any]], List[Any]]
+
+
+class JudgeBatcher:
+    """
+    微批处理器
+    逻辑：后台线程从队列取出第一个请求后再等待 window_ms 或攒满 max_batch_size，
+          把这一批交给打分线程池执行，收集线程立即开始攒下一批
+    目的：对调用方保持同步阻塞语义（submit 返回判决；异步调用方用 asubmit），对LLM端则是批量请求
+    """
+    def __init__(self, score_fn: ScoreFn, window_ms: int = JUDGE_BATCH_WINDOW_MS,
+                 max_batch_size: int = JUDGE_BATCH_MAX_SIZE, max_inflight_batches: int = 4):
+        self.score_fn = score_fn
+        self.window = window_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight_batches, thread_name_prefix="judge-batch")
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self._closed = False
+        self._collector = threading.Thread(target=self._collect_loop, name="judge-batcher", daemon=True)
+        self._collector.start()
+
+    def _enqueue(self, item: Any) -> Future:
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def submit(self, item: Any) -> Any:
+        """提交一个待评估项并阻塞等待其判决"""
+        return self._enqueue(item).result()
+
+    async def asubmit(self, item: Any) -> Any:
+        """提交一个待评估项并 await 其判决（不阻塞事件循环）"""
+        return await asyncio.wrap_future(self._enqueue(item))
+
+    def _collect_loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    self._queue.put(None)  # 处理完当前批次后再退出
+                    break
+                batch.append(entry)
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[tuple]):
+        items = [item for item, _ in batch]
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(items)
+        try:
+            results = self.score_fn(items)
+        except Exception as e:
+            results = [e] * len(items)
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.batches = 0
+            self.items = 0
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._collector.join()
+            self._executor.shutdown(wait=True)
+
+
+_batcher: Optional[JudgeBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def enable_judge_batching(score_fn: ScoreFn) -> Optional[JudgeBatcher]:
+    """开启进程内的裁判批处理（由并发评估模式调用），配置关闭时返回 None"""
+    global _batcher
+    if not JUDGE_BATCH_ENABLED:
+        return None
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = JudgeBatcher(score_fn)
+        return _batcher
+
+
+def disable_judge_batching():
+    """关闭裁判批处理，之后的裁判调用回到逐个请求"""
+    global _batcher
+    with _batcher_lock:
+        batcher, _batcher = _batcher, None
+    if batcher is not None:
+        batcher.close()
+
+
+def get_judge_batcher() -> Optional[JudgeBatcher]:
+    return _batcher
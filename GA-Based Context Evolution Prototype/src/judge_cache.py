@@ -0,0 +1,157 @@
+"""
+裁判结果缓存
+逻辑：以 (步骤内容哈希, 归一化行动文本) 为键，把 JudgeOutput 持久化到 SQLite，超过容量按LRU淘汰；
+      内容哈希覆盖 step_id、环境内容与裁判标准，场景文件改动后旧判决自动失效，不同场景中同名步骤也不会共用判决
+目的：裁判温度为0，同一步骤下几乎相同的行动无需再次调用LLM，重复判决零token、零延迟
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+from src.environment import step_content_hash
+from src.models import EnvironmentStep
+
+load_dotenv()
+
+JUDGE_CACHE_ENABLED = os.getenv("JUDGE_CACHE_ENABLED", "1") == "1"
+JUDGE_CACHE_PATH = os.getenv("JUDGE_CACHE_PATH", "cache/judge_cache.sqlite")
+JUDGE_CACHE_MAX_ENTRIES = int(os.getenv("JUDGE_CACHE_MAX_ENTRIES", "10000"))
+
+# 标点（含中文全角标点）与空白在归一化时一律去掉
+_PUNCT_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def normalize_action(action: str) -> str:
+    """
+    归一化行动文本
+    逻辑：NFKC（全角转半角）-> 小写 -> 去掉标点与空白
+    目的：让 "Pick up the rusty key." 与 "pick up the rusty key" 命中同一条缓存
+    """
+    text = unicodedata.normalize("NFKC", action).lower()
+    return _PUNCT_RE.sub("", text)
+
+
+def step_hash(step: EnvironmentStep) -> str:
+    """步骤的内容哈希；不经场景索引构造的步骤（content_hash 为空）现场计算"""
+    return step.content_hash or step_content_hash(step.step_id, step.content, step.rubric)
+
+
+class JudgeCache:
+    """
+    基于SQLite的LRU裁判缓存
+    逻辑：命中时刷新 last_used；写入后若超过 max_entries，删除最久未使用的条目
+    目的：跨代、跨运行复用裁判判决
+    """
+    def __init__(self, path: str = JUDGE_CACHE_PATH, max_entries: int = JUDGE_CACHE_MAX_ENTRIES, namespace: str = ""):
+        self.path = path
+        self.namespace = namespace  # 区分不同后端/裁判模型的判决，避免离线模拟的结果污染真实缓存
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                key TEXT PRIMARY KEY,
+                step_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_verdicts_last_used ON verdicts(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def make_key(self, step: EnvironmentStep, action: str) -> str:
+        raw = f"{self.namespace}\x1f{step_hash(step)}\x1f{normalize_action(action)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, step: EnvironmentStep, action: str) -> Optional[dict]:
+        """查询缓存，命中返回 JudgeOutput 的字典形式"""
+        key = self.make_key(step, action)
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM verdicts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE verdicts SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, step: EnvironmentStep, action: str, verdict: dict):
+        """写入一条判决，必要时按LRU淘汰（step_id 列仅用于排查）"""
+        key = self.make_key(step, action)
+        payload = json.dumps(verdict, ensure_ascii=False)
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM verdicts WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, step_id, payload, last_used) VALUES (?, ?, ?, ?)",
+                (key, step.step_id, payload, time.time()),
+            )
+            if exists is None:
+                self._size += 1
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self._size -= overflow
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": self._size,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_judge_cache: Optional[JudgeCache] = None
+_judge_cache_ready = False
+_judge_cache_lock = threading.Lock()
+
+
+def get_judge_cache() -> Optional[JudgeCache]:
+    """获取进程内共享的裁判缓存，未启用时返回 None"""
+    global _judge_cache, _judge_cache_ready
+    with _judge_cache_lock:
+        if not _judge_cache_ready:
+            if JUDGE_CACHE_ENABLED:
+                from src.llm import llm_backend
+                _judge_cache = JudgeCache(namespace=f"{llm_backend()}:{os.getenv('JUDGE_MODEL_NAME', '')}")
+            _judge_cache_ready = True
+        return _judge_cache
+
+
+def set_judge_cache(cache: Optional[JudgeCache]):
+    """替换进程内共享的裁判缓存（传 None 关闭缓存），用于基准测试等需要隔离缓存的场景"""
+    global _judge_cache, _judge_cache_ready
+    with _judge_cache_lock:
+        _judge_cache = cache
+        _judge_cache_ready = True
@@ -0,0 +1,252 @@
+"""
+谱系数据库
+逻辑：每次运行在日志目录下维护一个SQLite库 —— 基因文本按内容哈希去重存储（身份/策略/记忆各自一条），
+      个体只引用基因哈希，父子关系存为边；祖先、后代与按始祖汇总的适应度都用SQL查询
+目的：上千个体的运行中，相同的基因文本只存一份；谱系查询不需要加载任何日志或检查点
+
+用法: python -m src.lineage <log_dir> stats | ancestors <agent_id> | founders
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+from src.models import AgentConfig, Gene
+
+LINEAGE_DB_FILENAME = "lineage.sqlite"
+
+console = Console()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def gene_hash(gene: Gene) -> str:
+    """基因哈希：身份/策略/记忆三段文本哈希的组合（检查点与结果记录用它引用库中的基因）"""
+    return text_hash("\0".join(text_hash(text) for text in (gene.identity, gene.strategy, gene.memory)))
+
+
+class LineageStore:
+    """
+    内容寻址的基因与谱系存储
+    逻辑：
+      - texts: 文本哈希 -> 文本（身份/策略/记忆共用）
+      - genes: 基因哈希 -> 三段文本的哈希
+      - agents: 个体ID -> 代数、基因哈希、适应度、产生方式
+      - edges: 子代 -> 父代
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS texts (
+                hash TEXT PRIMARY KEY,
+                body TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS genes (
+                hash TEXT PRIMARY KEY,
+                identity TEXT NOT NULL REFERENCES texts(hash),
+                strategy TEXT NOT NULL REFERENCES texts(hash),
+                memory TEXT NOT NULL REFERENCES texts(hash)
+            );
+            CREATE TABLE IF NOT EXISTS agents (
+                agent_id TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL,
+                gene_hash TEXT NOT NULL REFERENCES genes(hash),
+                op TEXT,
+                fitness REAL,
+                solved_steps INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS edges (
+                child TEXT NOT NULL,
+                parent TEXT NOT NULL,
+                PRIMARY KEY (child, parent)
+            );
+            CREATE INDEX IF NOT EXISTS idx_edges_parent ON edges(parent);
+            CREATE INDEX IF NOT EXISTS idx_agents_gene ON agents(gene_hash);
+        """)
+        self._conn.commit()
+
+    def _put_gene(self, gene: Gene) -> str:
+        """写入基因（调用方持有锁），返回基因哈希"""
+        parts = [gene.identity, gene.strategy, gene.memory]
+        part_hashes = [text_hash(text) for text in parts]
+        key = gene_hash(gene)  # 与检查点/结果记录中引用的哈希同源
+        self._conn.executemany("INSERT OR IGNORE INTO texts (hash, body) VALUES (?, ?)", zip(part_hashes, parts))
+        self._conn.execute(
+            "INSERT OR IGNORE INTO genes (hash, identity, strategy, memory) VALUES (?, ?, ?, ?)",
+            (key, *part_hashes),
+        )
+        return key
+
+    def add_population(self, generation: int, population: List[AgentConfig], lineage: List[Dict]):
+        """登记一代的个体；lineage 中属于该代的条目写入父子边与产生方式"""
+        ops = {entry["child"]: entry for entry in lineage if entry["generation"] == generation}
+        with self._lock:
+            for config in population:
+                key = self._put_gene(config.gene)
+                entry = ops.get(config.id)
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO agents (agent_id, generation, gene_hash, op) VALUES (?, ?, ?, ?)",
+                    (config.id, generation, key, entry["op"] if entry else "init"),
+                )
+                if entry:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO edges (child, parent) VALUES (?, ?)",
+                        [(config.id, parent) for parent in entry["parents"]],
+                    )
+            self._conn.commit()
+
+    def record_result(self, agent_id: str, fitness: float, solved_steps: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE agents SET fitness = ?, solved_steps = ? WHERE agent_id = ?",
+                (fitness, solved_steps, agent_id),
+            )
+            self._conn.commit()
+
+    def gene_by_hash(self, hash_: str) -> Optional[Gene]:
+        """按基因哈希还原基因"""
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT ti.body, ts.body, tm.body FROM genes g
+                JOIN texts ti ON ti.hash = g.identity
+                JOIN texts ts ON ts.hash = g.strategy
+                JOIN texts tm ON tm.hash = g.memory
+                WHERE g.hash = ?
+            """, (hash_,)).fetchone()
+        return Gene(identity=row[0], strategy=row[1], memory=row[2]) if row else None
+
+    def gene(self, agent_id: str) -> Optional[Gene]:
+        """按个体ID还原基因"""
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT ti.body, ts.body, tm.body FROM agents a
+                JOIN genes g ON g.hash = a.gene_hash
+                JOIN texts ti ON ti.hash = g.identity
+                JOIN texts ts ON ts.hash = g.strategy
+                JOIN texts tm ON tm.hash = g.memory
+                WHERE a.agent_id = ?
+            """, (agent_id,)).fetchone()
+        return Gene(identity=row[0], strategy=row[1], memory=row[2]) if row else None
+
+    def ancestors(self, agent_id: str, max_depth: int = None) -> List[Dict]:
+        """
+        查询祖先
+        逻辑：沿 edges 递归向上（递归CTE），同一祖先经多条路径到达时取最近的距离
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                WITH RECURSIVE up(agent_id, depth) AS (
+                    SELECT parent, 1 FROM edges WHERE child = ?
+                    UNION
+                    SELECT e.parent, up.depth + 1 FROM edges e JOIN up ON e.child = up.agent_id
+                    WHERE ? IS NULL OR up.depth < ?
+                )
+                SELECT a.agent_id, MIN(up.depth), a.generation, a.op, a.fitness, a.gene_hash
+                FROM up JOIN agents a ON a.agent_id = up.agent_id
+                GROUP BY a.agent_id
+                ORDER BY MIN(up.depth), a.generation DESC
+            """, (agent_id, max_depth, max_depth)).fetchall()
+        return [
+            {"agent_id": r[0], "depth": r[1], "generation": r[2], "op": r[3], "fitness": r[4], "gene_hash": r[5]}
+            for r in rows
+        ]
+
+    def fitness_by_founder(self) -> List[Dict]:
+        """
+        按始祖汇总适应度
+        逻辑：始祖为第1代的个体（op=init）；每个个体计入其所有始祖（交叉的子代同时属于多个谱系）
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                WITH RECURSIVE down(founder, agent_id) AS (
+                    SELECT agent_id, agent_id FROM agents WHERE op = 'init'
+                    UNION
+                    SELECT down.founder, e.child FROM edges e JOIN down ON e.parent = down.agent_id
+                )
+                SELECT down.founder, COUNT(*), MAX(a.fitness), AVG(a.fitness), MAX(a.generation)
+                FROM down JOIN agents a ON a.agent_id = down.agent_id
+                GROUP BY down.founder
+                ORDER BY MAX(a.fitness) DESC
+            """).fetchall()
+        return [
+            {"founder": r[0], "descendants": r[1] - 1, "best_fitness": r[2], "avg_fitness": r[3], "last_generation": r[4]}
+            for r in rows
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("agents", "genes", "texts", "edges")
+            }
+        counts["bytes"] = os.path.getsize(self.path) if self.path != ":memory:" else 0
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _print_ancestors(store: LineageStore, agent_id: str):
+    table = Table(title=f"{agent_id} 的祖先")
+    table.add_column("距离", style="cyan")
+    table.add_column("ID", style="cyan", no_wrap=True)
+    table.add_column("代数", style="green")
+    table.add_column("方式", style="yellow")
+    table.add_column("适应度", style="magenta")
+    table.add_column("策略摘要", style="white")
+    for row in store.ancestors(agent_id):
+        strategy = store.gene(row["agent_id"]).strategy
+        table.add_row(str(row["depth"]), row["agent_id"], str(row["generation"]), row["op"] or "-",
+                      str(row["fitness"]), strategy[:30] + "..." if len(strategy) > 30 else strategy)
+    console.print(table)
+
+
+def _print_founders(store: LineageStore):
+    table = Table(title="按始祖汇总的适应度")
+    table.add_column("始祖", style="cyan", no_wrap=True)
+    table.add_column("后代数", style="green")
+    table.add_column("最佳", style="magenta")
+    table.add_column("平均", style="yellow")
+    table.add_column("延续到", style="blue")
+    for row in store.fitness_by_founder():
+        avg = f"{row['avg_fitness']:.1f}" if row["avg_fitness"] is not None else "-"
+        table.add_row(row["founder"], str(row["descendants"]), str(row["best_fitness"]), avg, f"Gen {row['last_generation']}")
+    console.print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查询一次进化运行的谱系数据库")
+    parser.add_argument("log_dir", help="运行日志目录 (例如 logs/run_20240101_120000)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="库中个体、基因、去重文本与边的数量")
+    ancestors_parser = sub.add_parser("ancestors", help="列出某个体的全部祖先")
+    ancestors_parser.add_argument("agent_id")
+    sub.add_parser("founders", help="按第1代始祖汇总后代的适应度")
+    args = parser.parse_args()
+
+    db_path = os.path.join(args.log_dir, LINEAGE_DB_FILENAME)
+    if not os.path.exists(db_path):
+        console.print(f"[red]未找到谱系数据库: {db_path}[/red]")
+        raise SystemExit(1)
+
+    store = LineageStore(db_path)
+    if args.command == "stats":
+        console.print(store.stats())
+    elif args.command == "ancestors":
+        _print_ancestors(store, args.agent_id)
+    elif args.command == "founders":
+        _print_founders(store)
+    store.close()
@@ -0,0 +1,125 @@
+"""
+模型客户端注册表
+逻辑：按 (模型名, 温度) 只创建一次 ChatOpenAI，所有客户端共享同一个保持长连接的 httpx 连接池
+目的：避免每个节点每一步都重复构造客户端、建立HTTP连接和转换结构化输出Schema
+
+后端由 LLM_BACKEND 选择：openai（OpenAI兼容接口）或 fake（离线模拟，见 src/fake_llm.py）；
+未设置时，若没有有效的API Key则使用 fake
+"""
+import os
+import threading
+from typing import Dict, Tuple, Type
+
+import httpx
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+
+from src.metrics import usage_tracker
+from src.scheduler import LLM_SCHEDULER_ENABLED
+
+load_dotenv()
+
+# 连接池上限，需覆盖评估并发度
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+
+_lock = threading.Lock()
+_http_client: httpx.Client = None
+_http_async_client: httpx.AsyncClient = None
+_chat_models: Dict[Tuple[str, float], BaseChatModel] = {}
+_structured_models: Dict[Tuple[str, float, Type[BaseModel]], Runnable] = {}
+
+
+def llm_backend() -> str:
+    """当前使用的LLM后端"""
+    backend = os.getenv("LLM_BACKEND", "")
+    if backend:
+        return backend
+    api_key = os.getenv("OPENAI_API_KEY", "")
+    return "fake" if api_key.startswith("sk-proj-xxxx") or not api_key else "openai"
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=60,
+    )
+
+
+def get_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """获取进程内共享的同步/异步HTTP客户端（惰性创建）"""
+    global _http_client, _http_async_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=_limits(), timeout=httpx.Timeout(120.0, connect=10.0))
+            _http_async_client = httpx.AsyncClient(limits=_limits(), timeout=httpx.Timeout(120.0, connect=10.0))
+        return _http_client, _http_async_client
+
+
+def get_chat_model(model: str, temperature: float) -> BaseChatModel:
+    """
+    获取聊天模型客户端
+    逻辑：同一 (模型名, 温度) 只构造一次，之后直接复用
+    目的：让所有Agent和裁判共享客户端与长连接
+    """
+    key = (model, temperature)
+    llm = _chat_models.get(key)
+    if llm is not None:
+        return llm
+
+    if llm_backend() == "fake":
+        from src.fake_llm import FakeChatModel
+        with _lock:
+            return _chat_models.setdefault(key, FakeChatModel(model_name=model or "fake", temperature=temperature, callbacks=[usage_tracker]))
+
+    http_client, http_async_client = get_http_clients()
+    with _lock:
+        llm = _chat_models.get(key)
+        if llm is None:
+            llm = ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_API_BASE"),
+                http_client=http_client,
+                http_async_client=http_async_client,
+                max_retries=0 if LLM_SCHEDULER_ENABLED else 2,  # 启用调度器时由调度器统一退避重试（见 src/scheduler.py）
+                callbacks=[usage_tracker],  # 统计调用次数、token与耗时（见 src/metrics.py）
+            )
+            _chat_models[key] = llm
+    return llm
+
+
+def get_structured_model(model: str, temperature: float, schema: Type[BaseModel]) -> Runnable:
+    """
+    获取结构化输出的Runnable
+    逻辑：缓存 with_structured_output 的结果，Schema只转换一次
+    目的：裁判每一步无需再做Schema到工具定义的转换
+    """
+    key = (model, temperature, schema)
+    runnable = _structured_models.get(key)
+    if runnable is not None:
+        return runnable
+
+    llm = get_chat_model(model, temperature)
+    with _lock:
+        runnable = _structured_models.get(key)
+        if runnable is None:
+            runnable = llm.with_structured_output(schema)
+            _structured_models[key] = runnable
+    return runnable
+
+
+def reset_registry():
+    """清空注册表并关闭连接池（主要用于切换配置后重建客户端）"""
+    global _http_client, _http_async_client
+    with _lock:
+        _chat_models.clear()
+        _structured_models.clear()
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = None
+        _http_async_client = None
@@ -0,0 +1,58 @@
+"""
+流式日志
+逻辑：模拟过程中每产生一个事件（perception/agent/judge/summary）就追加到本代的 events.jsonl，写入带缓冲
+目的：日志内存占用与模拟长度无关，运行期间可以 tail -f 实时查看；Markdown报告由 src/report.py 按需生成
+"""
+import json
+import os
+import threading
+from typing import Dict, List
+
+EVENTS_FILENAME = "events.jsonl"
+
+
+class JsonlLogSink:
+    """
+    线程安全的JSONL事件写入器
+    逻辑：事件先序列化进内存缓冲，缓冲满 buffer_size 条或某个Agent结束（summary事件）时一次性写盘
+    目的：并发模拟共享同一个文件，单次写入很短，不阻塞模拟线程
+    """
+    def __init__(self, path: str, buffer_size: int = 64):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def for_generation(cls, gen_dir: str, buffer_size: int = 64) -> "JsonlLogSink":
+        return cls(os.path.join(gen_dir, EVENTS_FILENAME), buffer_size)
+
+    def emit(self, event: Dict):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.buffer_size or event.get("type") == "summary":
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._file.flush()
+            self._buffer.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -12,8 +12,9 @@ from langgraph.graph import END
 from src.models import Gene, AgentConfig
 from src.state import AgentState
 from src.environment import EnvironmentManager
-from src.simulation import create_simulation_graph
+from src.simulation import create_simulation_graph, SimulationTally
 from src.evolution import EvolutionEngine
+from src.islands import run_islands, ISLAND_MIGRATION_INTERVAL, ISLAND_MIGRANTS
 
 # 加载环境变量
 load_dotenv()
@@ -59,9 +60,17 @@ def run_single_agent_demo():
         environment_steps=scenario_steps,
         current_environment_content="",
         messages=[],
+        context_summary="",
+        summarized_upto=0,
+        step_prompt_tokens=[],
+        step_prefix_tokens=[],
+        last_prompt_fingerprints=[],
         last_action_valid=False,
         feedback="",
-        solved_steps=[]
+        solved_steps=[],
+        speculation=None,
+        speculative_turn=False,
+        discarded_speculation=None
     )
     
     # 4. 运行模拟
@@ -71,27 +80,31 @@ def run_single_agent_demo():
     
     step_count = 0
     max_steps = 20
-    current_state = initial_state
+    tally = SimulationTally(energy=agent_config.initial_energy)
     
-    for event in app.stream(initial_state):
+    for event in app.stream(initial_state, stream_mode="updates"):
         step_count += 1
         
         for node_name, node_state in event.items():
-            current_state.update(node_state)
+            node_state = node_state or {}
             
             if node_name == "agent":
+                cost = tally.apply_agent(node_state)
+                if not node_state.get("messages"):
+                    continue
                 last_msg = node_state["messages"][-1]
                 console.print(Panel(
                     Markdown(last_msg.content), 
-                    title=f"Agent (能量: {node_state.get('energy', '?')})", 
+                    title=f"Agent (能量: {tally.energy}, 消耗 {cost})" + (" [投机命中]" if node_state.get("speculative_turn") else ""), 
                     border_style="green"
                 ))
             
             elif node_name == "judge":
+                reward = tally.apply_judge(node_state)
                 feedback = node_state.get("feedback", "")
-                is_solved = node_state.get("last_action_valid", False)
+                is_solved = tally.last_solved
                 color = "blue" if is_solved else "red"
-                title = "裁判: 成功" if is_solved else "裁判: 失败"
+                title = f"裁判: 成功 (奖励 {reward:+d})" if is_solved else "裁判: 失败"
                 
                 console.print(Panel(
                     Text(feedback, style="white"),
@@ -100,30 +113,42 @@ def run_single_agent_demo():
                 ))
 
             elif node_name == "perception":
+                tally.begin_cycle()
                 content = node_state.get("current_environment_content", "")
                 console.print(Panel(
                     Markdown(content),
-                    title=f"环境 (步骤 {current_state.get('current_step_index', 0)})",
+                    title=f"环境 (步骤 {tally.step_index})",
                     border_style="yellow"
                 ))
                 
-        if not current_state.get("is_alive", True):
-            console.print(f"[bold red]Agent死亡: {current_state.get('cause_of_death', '未知')}[/bold red]")
+        if not tally.is_alive:
+            console.print(f"[bold red]Agent死亡: {tally.cause_of_death or '未知'}[/bold red]")
             break
             
         if step_count > max_steps:
             console.print("[bold red]模拟停止（达到最大步数）[/bold red]")
             break
 
+    tally.discard_pending()
     console.print("[bold green]演示结束.[/bold green]")
 
-def run_evolution_mode(generations: int, population: int, log_dir: str = None):
+def run_evolution_mode(generations: int, population: int, log_dir: str = None, concurrency: int = 1, resume: bool = False):
     """
     运行进化模式
+    resume=True 时 log_dir 必须指向已有的运行目录，从其中的检查点继续
     """
-    console.print(Panel.fit("[bold magenta]启动进化引擎[/bold magenta]", subtitle=f"Gen: {generations}, Pop: {population}"))
-    engine = EvolutionEngine(population_size=population, generations=generations, log_dir=log_dir)
-    engine.run()
+    console.print(Panel.fit("[bold magenta]启动进化引擎[/bold magenta]", subtitle=f"Gen: {generations}, Pop: {population}, 并发: {concurrency}"))
+    engine = EvolutionEngine(population_size=population, generations=generations, log_dir=log_dir, concurrency=concurrency)
+    engine.run(resume=resume)
+
+def run_island_mode(islands: int, generations: int, population: int, log_dir: str = None, concurrency: int = 1,
+                    interval: int = ISLAND_MIGRATION_INTERVAL, migrants: int = ISLAND_MIGRANTS):
+    """
+    运行岛屿模型进化模式
+    每个岛屿是一个独立进程中的完整种群，按间隔互相迁移最优基因
+    """
+    console.print(Panel.fit("[bold magenta]启动岛屿模型进化[/bold magenta]", subtitle=f"岛屿: {islands}, Gen: {generations}, Pop/岛: {population}"))
+    run_islands(islands, population, generations, log_dir, concurrency, interval, migrants)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="GA-Based Context Evolution Prototype")
@@ -131,10 +156,24 @@ if __name__ == "__main__":
     parser.add_argument("--generations", "-g", type=int, default=3, help="进化代数 (仅evo模式)")
     parser.add_argument("--population", "-p", type=int, default=4, help="种群大小 (仅evo模式)")
     parser.add_argument("--log-dir", "-l", type=str, default=None, help="日志保存目录 (仅evo模式)")
+    parser.add_argument("--resume", "-r", type=str, default=None, metavar="LOG_DIR", help="从指定运行目录的检查点继续 (仅evo模式)")
+    parser.add_argument("--concurrency", "-c", type=int, default=int(os.getenv("EVAL_CONCURRENCY", "1")), help="同时评估的Agent数上限，1为串行 (仅evo模式)")
+    parser.add_argument("--islands", "-i", type=int, default=1, help="岛屿数，大于1时每个岛屿在独立进程中运行一个种群 (仅evo模式)")
+    parser.add_argument("--migration-interval", type=int, default=ISLAND_MIGRATION_INTERVAL, help="每隔多少代在岛屿间迁移一次 (仅岛屿模式)")
+    parser.add_argument("--migrants", type=int, default=ISLAND_MIGRANTS, help="每次迁移的个体数 (仅岛屿模式)")
     
     args = parser.parse_args()
     
-    if args.mode == "demo":
+    if args.resume and args.islands > 1:
+        parser.error("岛屿模式暂不支持 --resume")
+    
+    if args.resume:
+        # 恢复运行总是进化模式
+        run_evolution_mode(args.generations, args.population, args.resume, args.concurrency, resume=True)
+    elif args.mode == "demo":
         run_single_agent_demo()
+    elif args.mode == "evo" and args.islands > 1:
+        run_island_mode(args.islands, args.generations, args.population, args.log_dir, args.concurrency,
+                        args.migration_interval, args.migrants)
     elif args.mode == "evo":
-        run_evolution_mode(args.generations, args.population, args.log_dir)
+        run_evolution_mode(args.generations, args.population, args.log_dir, args.concurrency)
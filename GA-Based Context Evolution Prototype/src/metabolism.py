@@ -0,0 +1,21 @@
+"""
+新陈代谢
+逻辑：每次行动消耗的能量 = 基础消耗 + 本次实际发送的prompt token数 / TOKENS_PER_ENERGY（向上取整）
+目的：让适应度与真实推理成本挂钩——上下文越长（基因、历史、观察），生存压力越大
+"""
+import math
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 每消耗1点能量对应的prompt token数
+TOKENS_PER_ENERGY = int(os.getenv("TOKENS_PER_ENERGY", "200"))
+
+
+def metabolic_cost(prompt_tokens: int, base_cost: int = None) -> int:
+    """根据prompt的token数计算本次行动的能量消耗"""
+    if base_cost is None:
+        base_cost = int(os.getenv("BASE_COST", "5"))
+    return base_cost + math.ceil(prompt_tokens / max(1, TOKENS_PER_ENERGY))
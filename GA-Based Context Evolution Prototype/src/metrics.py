@@ -0,0 +1,128 @@
+"""
+运行指标
+逻辑：以 LangChain 回调的形式统计所有经由模型注册表发出的LLM调用（次数、token、耗时），
+      并提供把一代的模拟结果汇总成性能指标的工具函数
+目的：让每一代都能报告吞吐、调用次数、token消耗和步骤延迟，便于发现 simulation/nodes 中的性能回退
+"""
+import math
+import resource
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+
+class LLMUsageTracker(BaseCallbackHandler):
+    """
+    LLM用量统计回调
+    逻辑：on_chat_model_start 记录开始时间，on_llm_end/on_llm_error 累计次数、token与耗时
+    目的：线程安全的进程内计数器，可随时取快照做差得到某一阶段的用量
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started: Dict[UUID, float] = {}
+        self.calls = 0
+        self.errors = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0  # 服务端前缀缓存命中的输入token（提供商返回时才有）
+        self.output_tokens = 0
+        self.latency_s = 0.0
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        input_tokens = cached_input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                cached_input_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+                output_tokens += usage.get("output_tokens", 0)
+        with self._lock:
+            start = self._started.pop(run_id, None)
+            self.calls += 1
+            self.input_tokens += input_tokens
+            self.cached_input_tokens += cached_input_tokens
+            self.output_tokens += output_tokens
+            if start is not None:
+                self.latency_s += time.perf_counter() - start
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            self._started.pop(run_id, None)
+            self.calls += 1
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "input_tokens": self.input_tokens,
+                "cached_input_tokens": self.cached_input_tokens,
+                "output_tokens": self.output_tokens,
+                "latency_s": self.latency_s,
+            }
+
+
+# 进程内共享的统计器，由模型注册表挂到每个客户端上
+usage_tracker = LLMUsageTracker()
+
+
+def usage_delta(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+    return {k: after[k] - before[k] for k in after}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法百分位数（values 无需预先排序）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered), max(1, math.ceil(q / 100 * len(ordered)))) - 1
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """进程峰值常驻内存（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def generation_perf(results: List[Dict], duration_s: float, usage: Dict[str, float], speculation: Dict[str, Any] = None) -> Dict[str, float]:
+    """
+    汇总一代的性能指标
+    逻辑：吞吐按本代实际模拟的个体数计算；步骤延迟取所有个体每步耗时的 p50/p95；
+          可缓存前缀占比 = Agent prompt中末尾易变消息之前的token数 / prompt总token数；
+          speculation 为本代的投机执行统计（见 src/speculation.py），投机请求的token已包含在 tokens 中
+    """
+    simulated = [r for r in results if r.get("step_latencies") is not None]
+    step_latencies = [lat for r in simulated for lat in r["step_latencies"]]
+    prompt_tokens = sum(r.get("total_prompt_tokens", 0) for r in simulated)
+    prefix_tokens = sum(sum(r.get("prefix_tokens_per_step", [])) for r in simulated)
+    agents = len(simulated)
+    return {
+        "agents": agents,
+        "duration_s": duration_s,
+        "agents_per_s": agents / duration_s if duration_s > 0 else 0.0,
+        "llm_calls": usage["calls"],
+        "llm_calls_per_agent": usage["calls"] / agents if agents else 0.0,
+        "llm_errors": usage["errors"],
+        "tokens": usage["input_tokens"] + usage["output_tokens"],
+        "prefix_token_share": prefix_tokens / prompt_tokens if prompt_tokens else 0.0,
+        "cached_input_tokens": usage.get("cached_input_tokens", 0),
+        "step_latency_p50_s": percentile(step_latencies, 50),
+        "step_latency_p95_s": percentile(step_latencies, 95),
+        "early_stops": sum(1 for r in simulated if r.get("early_stop_reason")),
+        "llm_calls_saved": sum(r.get("llm_calls_saved", 0) for r in simulated),
+        "speculative_started": speculation["started"] if speculation else 0,
+        "speculative_hit_rate": speculation["hit_rate"] if speculation else 0.0,
+        "speculative_wasted_tokens": speculation["wasted_tokens"] if speculation else 0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
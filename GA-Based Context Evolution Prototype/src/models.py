@@ -51,3 +51,4 @@ class EnvironmentStep(BaseModel):
     rubric: str = ""    # 裁判评分标准（Agent不可见，仅裁判可见）
     order: int          # 执行顺序
     file_path: str      # 文件路径
+    content_hash: str = ""  # step_id/内容/裁判标准的哈希，由场景目录索引时计算
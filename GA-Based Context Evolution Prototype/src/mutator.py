@@ -4,10 +4,11 @@ import random
 from rich.console import Console
 from rich.panel import Panel
 from rich.tree import Tree
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from src.models import Gene
+from src.llm import get_chat_model
+from src.scheduler import schedule, acall
 
 # 加载环境变量
 from dotenv import load_dotenv
@@ -22,23 +23,8 @@ class Mutator:
     逻辑：利用LLM作为变异算子，结合两个父代基因生成新的子代
     """
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model=AGENT_MODEL_NAME, 
-            temperature=0.9, # 高温以增加多样性
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_API_BASE")
-        )
-        
-    def evolve(self, parent_a: Gene, parent_b: Gene, fitness_a: float, fitness_b: float, parent_a_id: str = "A", parent_b_id: str = "B") -> Gene:
-        """
-        进化操作：结合两个父代生成子代
-        """
-        # 简单模拟模式（如果没有API Key）
-        api_key = os.getenv("OPENAI_API_KEY", "")
-        if api_key.startswith("sk-proj-xxxx") or not api_key:
-            return self._mock_evolve(parent_a, parent_b)
-
-        prompt = ChatPromptTemplate.from_messages([
+        self.llm = get_chat_model(AGENT_MODEL_NAME, 0.9) # 高温以增加多样性
+        self.prompt = ChatPromptTemplate.from_messages([
             ("system", """你是一位精通进化算法的AI遗传工程师。
 你的任务是根据两个父代Agent的基因，创造一个新的子代Agent基因。
 父代基因由[身份]、[策略]和[记忆]组成。
@@ -67,33 +53,57 @@ Parent B (ID: {id_b}, Fitness: {fitness_b}):
 请生成 Child Gene (JSON):
 """)
         ])
+        self.chain = self.prompt | self.llm | JsonOutputParser()
+
+    @staticmethod
+    def _chain_inputs(parent_a: Gene, parent_b: Gene, fitness_a: float, fitness_b: float, parent_a_id: str, parent_b_id: str) -> dict:
+        return {
+            "id_a": parent_a_id,
+            "fitness_a": fitness_a,
+            "gene_a": parent_a.to_prompt_string(),
+            "id_b": parent_b_id,
+            "fitness_b": fitness_b,
+            "gene_b": parent_b.to_prompt_string()
+        }
+
+    def _to_child(self, result: dict, parent_a: Gene, parent_a_id: str, fitness_a: float, parent_b_id: str, fitness_b: float) -> Gene:
+        # 可视化进化过程
+        self._visualize_mutation(parent_a_id, fitness_a, parent_b_id, fitness_b, result)
         
-        chain = prompt | self.llm | JsonOutputParser()
+        return Gene(
+            identity=result.get("identity", parent_a.identity),
+            strategy=result.get("strategy", parent_a.strategy),
+            memory=result.get("memory", "")
+        )
         
+    def evolve(self, parent_a: Gene, parent_b: Gene, fitness_a: float, fitness_b: float, parent_a_id: str = "A", parent_b_id: str = "B") -> Gene:
+        """
+        进化操作：结合两个父代生成子代
+        """
         try:
-            result = chain.invoke({
-                "id_a": parent_a_id,
-                "fitness_a": fitness_a,
-                "gene_a": parent_a.to_prompt_string(),
-                "id_b": parent_b_id,
-                "fitness_b": fitness_b,
-                "gene_b": parent_b.to_prompt_string()
-            })
-            
-            # 可视化进化过程
-            self._visualize_mutation(parent_a_id, fitness_a, parent_b_id, fitness_b, result)
-            
-            return Gene(
-                identity=result.get("identity", parent_a.identity),
-                strategy=result.get("strategy", parent_a.strategy),
-                memory=result.get("memory", "")
-            )
+            inputs = self._chain_inputs(parent_a, parent_b, fitness_a, fitness_b, parent_a_id, parent_b_id)
+            result = schedule("mutator", AGENT_MODEL_NAME, lambda: self.chain.invoke(inputs))
+            return self._to_child(result, parent_a, parent_a_id, fitness_a, parent_b_id, fitness_b)
             
         except Exception as e:
             console.print(f"[red]Mutator Error:[/red] {e}")
             # Fallback: return a random parent with slight noise
             return self._mock_evolve(parent_a, parent_b)
 
+    async def aevolve(self, parent_a: Gene, parent_b: Gene, fitness_a: float, fitness_b: float, parent_a_id: str = "A", parent_b_id: str = "B") -> Gene:
+        """
+        异步进化操作：与 evolve 相同，chain.ainvoke 经调度器的异步许可通道在调用方的事件循环中执行，
+        便于同时生成多个子代且不占用工作线程
+        """
+        try:
+            inputs = self._chain_inputs(parent_a, parent_b, fitness_a, fitness_b, parent_a_id, parent_b_id)
+            result = await acall("mutator", AGENT_MODEL_NAME, lambda: self.chain.ainvoke(inputs))
+            return self._to_child(result, parent_a, parent_a_id, fitness_a, parent_b_id, fitness_b)
+            
+        except Exception as e:
+            console.print(f"[red]Mutator Error:[/red] {e}")
+            return self._mock_evolve(parent_a, parent_b)
+
     def _visualize_mutation(self, id_a, fit_a, id_b, fit_b, result):
         """在控制台打印进化详情"""
         tree = Tree(f"🧬 [bold magenta]基因进化发生[/bold magenta]")
@@ -113,7 +123,7 @@ Parent B (ID: {id_b}, Fitness: {fitness_b}):
         console.print(Panel(tree, border_style="magenta", expand=False))
 
     def _mock_evolve(self, parent_a: Gene, parent_b: Gene) -> Gene:
-        """无LLM时的模拟进化"""
+        """LLM调用失败时的回退进化"""
         import random
         base = parent_a if random.random() > 0.5 else parent_b
         return Gene(
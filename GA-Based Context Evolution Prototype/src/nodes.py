@@ -1,19 +1,35 @@
-from typing import Dict, Any, Literal
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Literal, Optional
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from rich.console import Console
 import os
-import time
 from src.state import AgentState
 from src.environment import EnvironmentManager
+from src.llm import get_chat_model, get_structured_model
+from src.judge_cache import get_judge_cache
+from src.judge_batcher import get_judge_batcher
+from src.context import get_context_policy, extractive_summary
+from src.prompts import agent_gene_prompt, build_agent_system_message, build_agent_turn_message, assemble_agent_prompt, shared_prefix
+from src.metabolism import metabolic_cost
+from src.scheduler import schedule, acall, get_scheduler
+from src.speculation import Speculation, predict_branch, hypothetical_state, speculation_stats
 load_dotenv()
 
+console = Console()
+
 # --- 配置 ---
 # 你可能希望从环境变量或配置文件中加载这些
 JUDGE_MODEL_NAME = os.getenv("JUDGE_MODEL_NAME")  # 或使用更经济的模型
 AGENT_MODEL_NAME = os.getenv("AGENT_MODEL_NAME")
+# 批量裁判方式: batch = 逐项经调度器并发请求（不启用合批窗口）; multi = 合批后单次请求返回多个判决
+JUDGE_BATCH_MODE = os.getenv("JUDGE_BATCH_MODE", "batch")
+# Agent调用最终失败时写入历史的行动前缀，裁判见到它不再评判
+AGENT_ERROR_PREFIX = "[错误:"
 
 # --- 结构化输出模型 ---
 class JudgeOutput(BaseModel):
@@ -27,6 +43,132 @@ class JudgeOutput(BaseModel):
     reasoning: str = Field(description="判断的解释说明")
     next_environment_hint: str = Field(description="如果解决则提供下一步提示，否则提供失败原因反馈")
 
+class JudgeBatchOutput(BaseModel):
+    """
+    批量裁判输出模型
+    逻辑：一次调用按编号顺序返回多个判决
+    目的：multi 模式下把多个评估项合并为单个请求
+    """
+    verdicts: List[JudgeOutput] = Field(description="按评估项编号顺序排列的判决列表，数量必须与评估项一致")
+
+# --- 裁判提示词（模块级构建一次） ---
+JUDGE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "你是生存模拟游戏的主持人兼裁判。你的职责是评估玩家的行动是否成功解决了当前目标。"),
+    ("human", """
+【场景】
+{scenario}
+【场景成功判断标准（仅裁判可见）】
+{situation_scoring_rubric}
+【玩家行动】
+{action}
+
+【任务】
+1. 判断该行动是否有效解决了场景中呈现的问题。
+2. 授予能量值：无效则0分，最高分5分（注意：玩家每回合消耗约5-10点能量，请慷慨给予奖励以维持其生存）。
+   - 尝试了相关动作但未完全成功：1-2分
+   - 成功解决核心问题：3-5分
+3. 提供评估理由。
+""")
+])
+
+JUDGE_MULTI_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "你是生存模拟游戏的主持人兼裁判。你的职责是评估玩家的行动是否成功解决了当前目标。下面的每个评估项彼此独立，请逐项判断。"),
+    ("human", """
+{items}
+
+【任务】
+对以上 {count} 个评估项逐一：
+1. 判断该行动是否有效解决了场景中呈现的问题。
+2. 授予能量值：无效则0分，最高分5分（注意：玩家每回合消耗约5-10点能量，请慷慨给予奖励以维持其生存）。
+   - 尝试了相关动作但未完全成功：1-2分
+   - 成功解决核心问题：3-5分
+3. 提供评估理由。
+按编号顺序返回 {count} 个判决。
+""")
+])
+
+def score_judge_batch(items: List[Dict[str, str]]) -> List[Any]:
+    """
+    批量打分
+    逻辑：items 为 {scenario, rubric, action} 列表；multi 模式先尝试单次多项调用，
+          调用失败或数量对不上时记录原因并回退到逐项并发调用
+    目的：作为裁判批处理器的打分函数，单项失败以 Exception 形式返回而不影响整批
+    """
+    if JUDGE_BATCH_MODE == "multi" and len(items) > 1:
+        blocks = []
+        for i, item in enumerate(items, 1):
+            blocks.append(f"### 评估项 {i}\n【场景】\n{item['scenario']}\n【场景成功判断标准（仅裁判可见）】\n{item['rubric']}\n【玩家行动】\n{item['action']}")
+        try:
+            multi_llm = get_structured_model(JUDGE_MODEL_NAME, 0, JudgeBatchOutput)
+            prompt = JUDGE_MULTI_PROMPT.format(items="\n\n".join(blocks), count=len(items))
+            output: JudgeBatchOutput = schedule("judge", JUDGE_MODEL_NAME, lambda: multi_llm.invoke(prompt))
+            if len(output.verdicts) == len(items):
+                return output.verdicts
+            console.print(f"[yellow]裁判多项调用返回 {len(output.verdicts)} 个判决（应为 {len(items)} 个），回退到逐项请求[/yellow]")
+        except Exception as e:
+            console.print(f"[yellow]裁判多项调用失败，回退到逐项请求:[/yellow] {e}")
+
+    structured_llm = get_structured_model(JUDGE_MODEL_NAME, 0, JudgeOutput)
+    prompts = [JUDGE_PROMPT.format(scenario=item["scenario"], action=item["action"], situation_scoring_rubric=item["rubric"]) for item in items]
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return structured_llm.batch(prompts, return_exceptions=True)
+    # 逐项提交给调度器：并发度、限速与重试由调度器统一控制
+    futures = [scheduler.submit("judge", JUDGE_MODEL_NAME, lambda p=p: structured_llm.invoke(p)) for p in prompts]
+    return [future.exception() or future.result() for future in futures]
+
+# --- 上下文窗口 ---
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "你负责为生存模拟中的Agent压缩经历。保留关键的尝试、失败原因和有效做法，去掉重复内容，不超过150字。"),
+    ("human", """
+【已有摘要】
+{previous}
+
+【新的经历】
+{transcript}
+
+请输出合并后的新摘要：
+""")
+])
+
+def summarize_history(previous: str, messages: List[BaseMessage]) -> str:
+    """
+    LLM摘要
+    逻辑：把旧摘要和待压缩的轮次交给Agent模型合并成新摘要；调用失败时使用抽取式摘要
+    目的：作为 summary 上下文策略的摘要函数
+    """
+    transcript = "\n".join(f"{'行动' if m.type == 'ai' else '反馈'}: {m.content}" for m in messages)
+    try:
+        llm = get_chat_model(AGENT_MODEL_NAME, 0)
+        prompt = SUMMARY_PROMPT.format(previous=previous or "无", transcript=transcript)
+        return schedule("agent", AGENT_MODEL_NAME, lambda: llm.invoke(prompt)).content
+    except Exception:
+        return extractive_summary(previous, messages)
+
+async def asummarize_history(previous: str, messages: List[BaseMessage]) -> str:
+    """LLM摘要（异步），逻辑同 summarize_history"""
+    transcript = "\n".join(f"{'行动' if m.type == 'ai' else '反馈'}: {m.content}" for m in messages)
+    try:
+        llm = get_chat_model(AGENT_MODEL_NAME, 0)
+        prompt = SUMMARY_PROMPT.format(previous=previous or "无", transcript=transcript)
+        return (await acall("agent", AGENT_MODEL_NAME, lambda: llm.ainvoke(prompt))).content
+    except Exception:
+        return extractive_summary(previous, messages)
+
+# 进程内共享的上下文策略（由 CONTEXT_POLICY 选择）
+context_policy = get_context_policy(summarizer=summarize_history, asummarizer=asummarize_history)
+
+# 未启用调度器时，同步图的投机请求在这里执行（首次投机时创建）
+_speculation_executor: Optional[ThreadPoolExecutor] = None
+_speculation_executor_lock = threading.Lock()
+
+def _get_speculation_executor() -> ThreadPoolExecutor:
+    global _speculation_executor
+    with _speculation_executor_lock:
+        if _speculation_executor is None:
+            _speculation_executor = ThreadPoolExecutor(thread_name_prefix="speculation")
+        return _speculation_executor
+
 # --- Nodes ---
 
 def perception_node(state: AgentState) -> Dict[str, Any]:
@@ -44,29 +186,40 @@ def perception_node(state: AgentState) -> Dict[str, Any]:
     else:
         return {"current_environment_content": "所有目标已完成。任务达成。"}
 
-def agent_node(state: AgentState) -> Dict[str, Any]:
+async def aperception_node(state: AgentState) -> Dict[str, Any]:
+    """感知节点（异步）：不涉及I/O，直接复用同步实现"""
+    return perception_node(state)
+
+def _agent_window_inputs(state: AgentState) -> tuple:
+    """上下文策略的输入：(历史, 系统消息, 本轮消息, 摘要, 已摘要下标)"""
+    summary = state.get("context_summary", "")
+    return (
+        state["messages"],
+        build_agent_system_message(agent_gene_prompt(state["gene"], summary), state["current_environment_content"]),
+        build_agent_turn_message(state["energy"]),
+        summary,
+        state.get("summarized_upto", 0)
+    )
+
+def _agent_request(state: AgentState, window) -> tuple:
     """
-    Agent（生物体）节点
-    逻辑：Agent根据当前状态生成行动
-    目的：模拟Agent的决策和行动过程
+    按上下文窗口组装本次请求并扣除新陈代谢成本
+    返回：(状态更新, 要发送的消息)；能量耗尽时消息为None，状态更新即死亡结果
     """
-    if not state["is_alive"]:
-        return {} # 死亡的Agent不行动
-
-    # 1. 计算新陈代谢成本
-    # 简单模型：成本 = 5 + (上下文长度 / 100)
-    # MVP阶段，我们通过消息计数或原始字符串长度估算上下文长度
-    # 目前使用简单的每行动成本 + 基因复杂性
-    
-    # 从环境变量加载消耗配置
-    import os
-    BASE_COST = int(os.getenv("BASE_COST", "5")) # 降低基础消耗
-    
-    base_cost = BASE_COST
-    gene_complexity_cost = len(state["gene"].to_prompt_string()) // 500# 降低基因复杂性消耗 (每500字符1点)
-    total_cost = base_cost + gene_complexity_cost
+    env_content = state["current_environment_content"]
+    summary = state.get("context_summary", "")
+    updates = {}
+    if window.summary is not None:
+        summary = window.summary
+        updates["context_summary"] = window.summary
+        updates["summarized_upto"] = window.summarized_upto
     
-    new_energy = state["energy"] - total_cost
+    # 按本次实际发送的prompt（基因与摘要 + 环境 + 历史 + 状态）的token数收费
+    # 计数时能量取扣费前的值，与最终发送的内容至多相差1个token
+    prompt = assemble_agent_prompt(build_agent_system_message(agent_gene_prompt(state["gene"], summary), env_content), window.history,
+                                   build_agent_turn_message(state["energy"]))
+    prompt_tokens = prompt.prompt_tokens
+    new_energy = state["energy"] - metabolic_cost(prompt_tokens)
     
     if new_energy <= 0:
         return {
@@ -74,158 +227,303 @@ def agent_node(state: AgentState) -> Dict[str, Any]:
             "is_alive": False, 
             "cause_of_death": "饥饿（能量耗尽）",
             "messages": [AIMessage(content="[系统: AGENT因能量耗尽死亡]")]
-        }
+        }, None
 
-    # 2. 构建提示词
-    # 我们动态构建提示词
-    # 在LangGraph中使用add_messages时，'messages'处理历史记录
-    # 我们只需要注入系统提示词（基因）和当前观察
-    
-    gene_prompt = state["gene"].to_prompt_string()
-    env_content = state["current_environment_content"]
-    
-    system_msg = SystemMessage(content=f"""
-{gene_prompt}
+    # 只有最后一条消息中的能量值需要更新，前面的消息原样复用
+    messages_to_send = prompt.messages[:-1] + [build_agent_turn_message(new_energy)]
+    updates["energy"] = new_energy
+    updates["step_prompt_tokens"] = state.get("step_prompt_tokens", []) + [prompt_tokens]
+    # 可缓存前缀 = 与上一次请求的最长公共消息前缀（见 src/prompts.py）
+    prefix_tokens, fingerprints = shared_prefix(messages_to_send, state.get("last_prompt_fingerprints", []))
+    updates["step_prefix_tokens"] = state.get("step_prefix_tokens", []) + [prefix_tokens]
+    updates["last_prompt_fingerprints"] = fingerprints
+    return updates, messages_to_send
 
-[状态]
-能量: {new_energy}
-""")
-    
-    human_msg = HumanMessage(content=f"""
-[环境观察]
-{env_content}
+def _take_speculation(state: AgentState, window, updates: Dict[str, Any], messages_to_send) -> Optional[Speculation]:
+    """
+    取出状态中的投机结果（同时在状态更新中清空）
+    逻辑：只有分支猜对、本轮没有发生摘要压缩且Agent仍存活时才可使用，
+          其余情况放入 discarded_speculation，由 SimulationTally 统一丢弃并计入浪费
+    返回：可直接使用的投机请求；没有或不可用时返回None（messages_to_send 为None时必然返回None）
+    """
+    speculation = state.get("speculation")
+    if speculation is None:
+        return None
+    updates["speculation"] = None
+    if speculation.hit and window.summary is None and messages_to_send is not None:
+        return speculation
+    if speculation.hit:
+        updates["discarded_speculation"] = speculation
+    return None
 
-[指令]
-你的行动是什么？
-""")
+def _speculative_turn(updates: Dict[str, Any], response: AIMessage) -> Dict[str, Any]:
+    """使用投机回复作为本轮行动；能量与prompt token仍按真实状态计算"""
+    updates["messages"] = [response]
+    updates["speculative_turn"] = True
+    return updates
+
+def _speculation_request(state: AgentState) -> Optional[tuple]:
+    """
+    构造投机请求（见 src/speculation.py）
+    逻辑：按预测分支构造下一轮的假设状态，复用行动节点的上下文策略与prompt组装；
+          假设状态下需要摘要压缩（额外的LLM调用）或会因能量耗尽死亡时不投机
+    返回：(分支, 预测的步骤下标, prompt token数, 要发送的消息)；不投机时返回None
+    """
+    branch = predict_branch(state)
+    if branch is None:
+        return None
+    predicted = hypothetical_state(state, branch)
+    inputs = _agent_window_inputs(predicted)
+    if context_policy.will_summarize(inputs[0], inputs[4]):
+        return None
+    updates, messages = _agent_request(predicted, context_policy.select(*inputs))
+    if messages is None:
+        return None
+    return branch, predicted["current_step_index"], updates["step_prompt_tokens"][-1], messages
+
+def _start_speculation(state: AgentState) -> Optional[Speculation]:
+    """发出投机请求（同步图）：经调度器以低于常规Agent调用的优先级排队，不阻塞裁判"""
+    request = _speculation_request(state)
+    if request is None:
+        return None
+    branch, step_index, prompt_tokens, messages = request
+    llm = get_chat_model(AGENT_MODEL_NAME, 0.7)
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        future = scheduler.submit("speculative", AGENT_MODEL_NAME, lambda: llm.invoke(messages))
+    else:
+        future = _get_speculation_executor().submit(llm.invoke, messages)
+    speculation_stats.record_start()
+    return Speculation(branch, step_index, prompt_tokens, future)
 
-    # 我们不希望在历史记录中堆积系统消息
-    # 但为了这个原型的简单性，我们只用（系统 + 历史 + 新观察）调用LLM
-    # 理想情况下，历史记录应该仔细管理
+def _astart_speculation(state: AgentState) -> Optional[Speculation]:
+    """发出投机请求（异步图）：作为任务在当前事件循环中与裁判请求并发"""
+    request = _speculation_request(state)
+    if request is None:
+        return None
+    branch, step_index, prompt_tokens, messages = request
+    llm = get_chat_model(AGENT_MODEL_NAME, 0.7)
+    task = asyncio.ensure_future(acall("speculative", AGENT_MODEL_NAME, lambda: llm.ainvoke(messages)))
+    speculation_stats.record_start()
+    return Speculation(branch, step_index, prompt_tokens, task)
+
+def _settle_speculation(state: AgentState, speculation: Optional[Speculation], updates: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    判决返回后结算投机
+    逻辑：判决成功给出且下一轮的步骤下标与预测一致时标记命中，留给行动节点使用；
+          否则放入 discarded_speculation 丢弃
+    """
+    if speculation is None:
+        return updates
+    next_index = updates.get("current_step_index", state["current_step_index"])
+    speculation.hit = "energy" in updates and next_index == speculation.step_index
+    if speculation.hit:
+        updates["speculation"] = speculation
+    else:
+        updates["discarded_speculation"] = speculation
+    return updates
+
+def _agent_failure(error: Exception, updates: Dict[str, Any]) -> Dict[str, Any]:
+    """API错误的回退（重试已耗尽）；不扣能量，裁判会跳过这一轮。本轮已丢弃的投机请求仍需上报"""
+    import traceback
+    traceback.print_exception(error)
+    return {
+         "messages": [AIMessage(content=f"{AGENT_ERROR_PREFIX} {str(error)}]")],
+         "speculation": None,
+         "discarded_speculation": updates.get("discarded_speculation")
+    }
+
+def agent_node(state: AgentState) -> Dict[str, Any]:
+    """
+    Agent（生物体）节点
+    逻辑：Agent根据当前状态生成行动
+    目的：模拟Agent的决策和行动过程
+    """
+    if not state["is_alive"]:
+        return {} # 死亡的Agent不行动
+
+    # 1. 构建提示词（布局见 src/prompts.py：基因/环境/摘要在前，能量与指令在最后）
+    # 由上下文策略决定带上哪些历史，避免prompt随步数无限增长
+    window = context_policy.select(*_agent_window_inputs(state))
     
-    import os
-    api_key = os.getenv("OPENAI_API_KEY", "")
+    # 2. 计算新陈代谢成本
+    updates, messages_to_send = _agent_request(state, window)
     
-    # --- 演示用的模拟模式 ---
-    if api_key.startswith("sk-proj-xxxx") or not api_key:
-        # 返回模拟响应以测试流程
-        time.sleep(1) # 模拟思考
-        mock_response = "我检查地板上的生锈铁钥匙。"
-        return {
-            "energy": new_energy,
-            "messages": [AIMessage(content=mock_response)]
-        }
-    # --------------------------
-
-    llm = ChatOpenAI(model=AGENT_MODEL_NAME, temperature=0.7)
+    # 3. 裁判期间已按正确分支预生成了本轮行动时直接使用
+    speculation = _take_speculation(state, window, updates, messages_to_send)
+    if messages_to_send is None:
+        return updates
+    if speculation is not None:
+        try:
+            return _speculative_turn(updates, speculation.future.result())
+        except Exception:
+            updates["discarded_speculation"] = speculation # 投机请求失败时按常规路径重新请求
     
-    # 为本回合构建完整的消息列表
-    # 如果需要节省tokens，可以过滤掉以前的系统消息
-    # 但LangChain处理列表的能力很好
-    messages_to_send = [system_msg] + state["messages"] + [human_msg]
+    llm = get_chat_model(AGENT_MODEL_NAME, 0.7)
     
     try:
-        response = llm.invoke(messages_to_send)
-        return {
-            "energy": new_energy,
-            "messages": [response] # 这将AIMessage添加到历史记录中
-        }
+        # 经调度器发出：按优先级排队、限速，限流/超时自动退避重试
+        response = schedule("agent", AGENT_MODEL_NAME, lambda: llm.invoke(messages_to_send))
+        updates["messages"] = [response] # 这将AIMessage添加到历史记录中
+        updates["speculative_turn"] = False
+        return updates
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        # API错误的回退
-        return {
-             "messages": [AIMessage(content=f"[错误: {str(e)}]")]
-        }
+        return _agent_failure(e, updates)
 
-def judge_node(state: AgentState) -> Dict[str, Any]:
+async def aagent_node(state: AgentState) -> Dict[str, Any]:
     """
-    裁判节点
-    逻辑：评估智能体的上次行动
-    目的：提供反馈并决定是否进入下一步
+    Agent节点（异步）
+    逻辑：与 agent_node 相同，LLM调用改为 ainvoke，经调度器的异步原生通道发出
+    目的：模拟在事件循环中运行时，等待LLM不占用线程
     """
     if not state["is_alive"]:
         return {}
 
+    window = await context_policy.aselect(*_agent_window_inputs(state))
+    updates, messages_to_send = _agent_request(state, window)
+    
+    speculation = _take_speculation(state, window, updates, messages_to_send)
+    if messages_to_send is None:
+        return updates
+    if speculation is not None:
+        try:
+            return _speculative_turn(updates, await speculation.future)
+        except Exception:
+            updates["discarded_speculation"] = speculation
+    
+    llm = get_chat_model(AGENT_MODEL_NAME, 0.7)
+    
+    try:
+        response = await acall("agent", AGENT_MODEL_NAME, lambda: llm.ainvoke(messages_to_send))
+        updates["messages"] = [response]
+        updates["speculative_turn"] = False
+        return updates
+    except Exception as e:
+        return _agent_failure(e, updates)
+
+def _judge_target(state: AgentState) -> tuple:
+    """
+    确定本轮要评判的内容
+    返回：(提前返回的状态更新, 当前环境步骤, Agent行动)；无需评判时后两项为None
+    """
+    if not state["is_alive"]:
+        return {}, None, None
+
     # 获取最后一条消息（智能体的行动）
     last_message = state["messages"][-1]
     if not isinstance(last_message, AIMessage):
-        return {} # 如果流程正确，这不应该发生
+        return {}, None, None # 如果流程正确，这不应该发生
 
     agent_action = last_message.content
+    if agent_action.startswith(AGENT_ERROR_PREFIX):
+        # Agent调用失败时没有可评判的行动，不浪费一次裁判调用
+        return {"last_action_valid": False, "feedback": "Agent调用失败，本轮不评判"}, None, None
     
     # 获取当前环境步骤对象以访问 Rubric
-    steps = state["environment_steps"]
-    idx = state["current_step_index"]
-    current_step = steps[idx]
+    return None, state["environment_steps"][state["current_step_index"]], agent_action
+
+def _apply_judgement(state: AgentState, judgement: JudgeOutput) -> Dict[str, Any]:
+    """把判决折算成状态更新"""
+    updates = {
+        "energy": state["energy"] + judgement.energy_reward,
+        "last_action_valid": judgement.is_solved,
+        "feedback": judgement.reasoning
+    }
+    
+    if judgement.is_solved:
+        # 进入下一步
+        updates["current_step_index"] = state["current_step_index"] + 1
+        updates["solved_steps"] = state.get("solved_steps", []) + [str(state["current_step_index"])]
+        
+        # 检查是否游戏结束（胜利）
+        if updates["current_step_index"] >= len(state["environment_steps"]):
+            updates["messages"] = [HumanMessage(content="【系统】恭喜！你已在模拟中生存下来。")]
+        else:
+             updates["messages"] = [HumanMessage(content=f"【系统】目标完成。进入下一区域。能量奖励：+{judgement.energy_reward}")]
+    else:
+         updates["messages"] = [HumanMessage(content=f"【系统】行动无效。{judgement.reasoning}")]
+
+    return updates
+
+def _judge_failure(error: Exception) -> Dict[str, Any]:
+    import traceback
+    traceback.print_exception(error)
+    return {"feedback": f"裁判错误：{str(error)}"}
+
+def judge_node(state: AgentState) -> Dict[str, Any]:
+    """
+    裁判节点
+    逻辑：评估智能体的上次行动
+    目的：提供反馈并决定是否进入下一步
+    """
+    skip, current_step, agent_action = _judge_target(state)
+    if skip is not None:
+        return skip
     
     current_env = current_step.content
     rubric = current_step.rubric
     
-    import os
-    api_key = os.getenv("OPENAI_API_KEY", "")
-
-    # --- 演示模式 ---
-    if api_key.startswith("sk-proj-xxxx") or not api_key:
-        return {
-            "energy": state["energy"] - 5, # 模拟惩罚
-            "last_action_valid": False,
-            "feedback": "模拟裁判：行动有效但尚未解决谜题（演示模式）。",
-            "messages": [HumanMessage(content="【系统】行动无效。模拟裁判：尝试拾取它。")]
-        }
-    # --------------------------
-    
     # 裁判逻辑
-    llm = ChatOpenAI(model=JUDGE_MODEL_NAME, temperature=0)
-    structured_llm = llm.with_structured_output(JudgeOutput)
+    structured_llm = get_structured_model(JUDGE_MODEL_NAME, 0, JudgeOutput)
     
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "你是生存模拟游戏的主持人兼裁判。你的职责是评估玩家的行动是否成功解决了当前目标。"),
-        ("human", """
-【场景】
-{scenario}
-【场景成功判断标准（仅裁判可见）】
-{situation_scoring_rubric}
-【玩家行动】
-{action}
-
-【任务】
-1. 判断该行动是否有效解决了场景中呈现的问题。
-2. 授予能量值：无效则0分，最高分5分（注意：玩家每回合消耗约5-10点能量，请慷慨给予奖励以维持其生存）。
-   - 尝试了相关动作但未完全成功：1-2分
-   - 成功解决核心问题：3-5分
-3. 提供评估理由。
-""")
-    ])
+    # 相同步骤（按内容哈希）下等价的行动直接复用历史判决
+    judge_cache = get_judge_cache()
+    speculation = None
     
     try:
-        judgement :JudgeOutput= structured_llm.invoke(prompt.format(scenario=current_env, action=agent_action, situation_scoring_rubric=rubric))
-        
-        updates = {
-            "energy": state["energy"] + judgement.energy_reward,
-            "last_action_valid": judgement.is_solved,
-            "feedback": judgement.reasoning
-        }
-        
-        if judgement.is_solved:
-            # 进入下一步
-            updates["current_step_index"] = state["current_step_index"] + 1
-            updates["solved_steps"] = state.get("solved_steps", []) + [str(state["current_step_index"])]
-            
-            # 检查是否游戏结束（胜利）
-            if updates["current_step_index"] >= len(state["environment_steps"]):
-                updates["messages"] = [HumanMessage(content="【系统】恭喜！你已在模拟中生存下来。")]
-            else:
-                 updates["messages"] = [HumanMessage(content=f"【系统】目标完成。进入下一区域。能量奖励：+{judgement.energy_reward}")]
+        cached = judge_cache.get(current_step, agent_action) if judge_cache else None
+        if cached is not None:
+            judgement = JudgeOutput(**cached)
         else:
-             updates["messages"] = [HumanMessage(content=f"【系统】行动无效。{judgement.reasoning}")]
+            # 等待判决期间按预测分支预生成下一轮行动（SPECULATIVE_MODE=off 时不投机）
+            speculation = _start_speculation(state)
+            batcher = get_judge_batcher()
+            if batcher is not None:
+                # 并发评估时与其他Agent的裁判请求合批
+                judgement :JudgeOutput= batcher.submit({"scenario": current_env, "rubric": rubric, "action": agent_action})
+            else:
+                prompt = JUDGE_PROMPT.format(scenario=current_env, action=agent_action, situation_scoring_rubric=rubric)
+                judgement :JudgeOutput= schedule("judge", JUDGE_MODEL_NAME, lambda: structured_llm.invoke(prompt))
+            if judge_cache:
+                judge_cache.put(current_step, agent_action, judgement.model_dump())
+        return _settle_speculation(state, speculation, _apply_judgement(state, judgement))
 
-        return updates
+    except Exception as e:
+        return _settle_speculation(state, speculation, _judge_failure(e))
+
+async def ajudge_node(state: AgentState) -> Dict[str, Any]:
+    """
+    裁判节点（异步）
+    逻辑：与 judge_node 相同；合批时 await 批处理器，否则经调度器 ainvoke
+    """
+    skip, current_step, agent_action = _judge_target(state)
+    if skip is not None:
+        return skip
+    
+    current_env = current_step.content
+    rubric = current_step.rubric
+    structured_llm = get_structured_model(JUDGE_MODEL_NAME, 0, JudgeOutput)
+    judge_cache = get_judge_cache()
+    speculation = None
+    
+    try:
+        cached = judge_cache.get(current_step, agent_action) if judge_cache else None
+        if cached is not None:
+            judgement = JudgeOutput(**cached)
+        else:
+            speculation = _astart_speculation(state)
+            batcher = get_judge_batcher()
+            if batcher is not None:
+                judgement: JudgeOutput = await batcher.asubmit({"scenario": current_env, "rubric": rubric, "action": agent_action})
+            else:
+                prompt = JUDGE_PROMPT.format(scenario=current_env, action=agent_action, situation_scoring_rubric=rubric)
+                judgement: JudgeOutput = await acall("judge", JUDGE_MODEL_NAME, lambda: structured_llm.ainvoke(prompt))
+            if judge_cache:
+                judge_cache.put(current_step, agent_action, judgement.model_dump())
+        return _settle_speculation(state, speculation, _apply_judgement(state, judgement))
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return {"feedback": f"裁判错误：{str(e)}"}
+        return _settle_speculation(state, speculation, _judge_failure(e))
 
 def should_continue(state: AgentState) -> Literal["perception", "end"]:
     """
@@ -0,0 +1,157 @@
+"""
+种群统计与选择
+逻辑：每代把评估结果的适应度 / 剩余能量 / 解决步数 / 存活 提取成一次NumPy数组，
+      最优、均值、精英、多样性与父代选择都在数组上向量化完成，结果列表本身不再排序或反复扫描
+目的：种群规模到上万（离线模拟后端）时，选择与报告仍保持 O(n)（排序只在秩选择时做一次）
+"""
+import os
+import random
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.fitness_cache import gene_fingerprint
+
+load_dotenv()
+
+SELECTION_METHODS = ("tournament", "rank", "roulette")
+SELECTION_METHOD = os.getenv("SELECTION_METHOD", "tournament")  # 父代选择方式: tournament | rank | roulette
+TOURNAMENT_SIZE = int(os.getenv("TOURNAMENT_SIZE", "2"))  # 锦标赛每组参赛个体数
+ELITE_COUNT = int(os.getenv("ELITE_COUNT", "1"))  # 每代原样保留的精英个体数
+
+
+def selection_rng() -> np.random.Generator:
+    """
+    从标准库 random 派生 NumPy 随机数生成器
+    目的：检查点只保存 random 的状态，派生后断点续跑的选择结果与不中断时一致
+    """
+    return np.random.default_rng(random.getrandbits(64))
+
+
+class PopulationStats:
+    """
+    一代评估结果的数组视图
+    逻辑：构造时 O(n) 提取各列；下标始终指向原 results 列表
+    """
+    def __init__(self, results: List[Dict]):
+        self.results = results
+        n = len(results)
+        self.fitness = np.fromiter((r["fitness"] for r in results), dtype=np.float64, count=n)
+        self.energy = np.fromiter((r.get("final_energy", 0) for r in results), dtype=np.float64, count=n)
+        self.solved = np.fromiter((r.get("solved_steps_count", 0) for r in results), dtype=np.int64, count=n)
+        self.alive = np.fromiter((bool(r.get("is_alive", True)) for r in results), dtype=bool, count=n)
+        self._diversity: Optional[Dict[str, float]] = None
+        # 父代选择使用的适应度；启用适应度共享后为 原始适应度 / 小生境计数，精英与报告始终用原始适应度
+        self.selection_fitness = self.fitness
+        self.niche_counts: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    @property
+    def best_index(self) -> int:
+        return int(np.argmax(self.fitness))
+
+    @property
+    def best(self) -> Dict:
+        return self.results[self.best_index]
+
+    def top_indices(self, k: int) -> np.ndarray:
+        """
+        适应度最高的 k 个下标（降序）
+        逻辑：argpartition 找出前 k 个（O(n)），只对这 k 个排序；并列时保持原顺序
+        """
+        n = len(self)
+        k = max(0, min(k, n))
+        if k == 0:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.arange(n) if k == n else np.argpartition(-self.fitness, k - 1)[:k]
+        return candidates[np.lexsort((candidates, -self.fitness[candidates]))]
+
+    def elites(self, k: int = ELITE_COUNT) -> List[Dict]:
+        return [self.results[i] for i in self.top_indices(k)]
+
+    def apply_fitness_sharing(self, niche_counts: np.ndarray):
+        """
+        适应度共享
+        逻辑：选择适应度 = (原始适应度 - 最低适应度 + 1) / 小生境计数；平移保证适应度为负或为0时折减仍然有效
+        目的：同一小生境里的近似个体分摊选择压力，避免克隆垄断父代
+        """
+        self.niche_counts = niche_counts
+        self.selection_fitness = (self.fitness - self.fitness.min() + 1.0) / niche_counts if len(self) else self.fitness
+
+    def select_parents(self, n_pairs: int, method: str = SELECTION_METHOD, tournament_size: int = TOURNAMENT_SIZE,
+                       rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+        一次性选出 n_pairs 组父代
+        返回：形状 (n_pairs, 2) 的下标数组
+        """
+        rng = rng or selection_rng()
+        count = n_pairs * 2
+        if method == "tournament":
+            picks = self._tournament(count, tournament_size, rng)
+        elif method == "rank":
+            picks = rng.choice(len(self), size=count, p=self._rank_probabilities())
+        elif method == "roulette":
+            picks = rng.choice(len(self), size=count, p=self._roulette_probabilities())
+        else:
+            raise ValueError(f"未知的选择方式: {method}（可选: {', '.join(SELECTION_METHODS)}）")
+        return picks.reshape(n_pairs, 2)
+
+    def _tournament(self, count: int, size: int, rng: np.random.Generator) -> np.ndarray:
+        """锦标赛：每组有放回地抽 size 个参赛者，取（选择）适应度最高者"""
+        entrants = rng.integers(0, len(self), size=(count, max(1, size)))
+        winners = np.argmax(self.selection_fitness[entrants], axis=1)
+        return entrants[np.arange(count), winners]
+
+    def _rank_probabilities(self) -> np.ndarray:
+        """线性秩选择：最优者权重 n，最差者权重 1，与适应度的绝对差距无关"""
+        n = len(self)
+        weights = np.empty(n, dtype=np.float64)
+        weights[np.argsort(self.selection_fitness, kind="stable")] = np.arange(1, n + 1)
+        return weights / weights.sum()
+
+    def _roulette_probabilities(self) -> np.ndarray:
+        """轮盘赌：按 (适应度 - 最低适应度 + 1) 的比例选择，全员同分时退化为均匀选择"""
+        weights = self.selection_fitness - self.selection_fitness.min() + 1.0
+        return weights / weights.sum()
+
+    def diversity(self) -> Dict[str, float]:
+        """
+        多样性指标
+        逻辑：
+          - unique_genes: 不同基因（指纹）占比
+          - fitness_cv: 适应度变异系数（标准差 / 均值）
+          - solved_entropy: 解决步数分布的香农熵（bit）
+        同一个 Gene 对象（精英、缓存复用）只计算一次指纹；结果按实例缓存
+        """
+        if self._diversity is not None:
+            return self._diversity
+        n = len(self)
+        if n == 0:
+            return {"unique_genes": 0.0, "fitness_cv": 0.0, "solved_entropy": 0.0}
+        genes = {id(r["gene"]): r["gene"] for r in self.results if r.get("gene") is not None}
+        unique = len({gene_fingerprint(gene) for gene in genes.values()})
+        mean = float(self.fitness.mean())
+        counts = np.bincount(np.clip(self.solved, 0, None))
+        p = counts[counts > 0] / n
+        self._diversity = {
+            "unique_genes": unique / n,
+            "fitness_cv": float(self.fitness.std()) / abs(mean) if mean else 0.0,
+            "solved_entropy": float(-(p * np.log2(p)).sum()) + 0.0,
+        }
+        return self._diversity
+
+    def summary(self) -> Dict[str, float]:
+        """一代的汇总统计（写入进化历史）"""
+        n = len(self)
+        return {
+            "best_fitness": self.best["fitness"],
+            "avg_fitness": float(self.fitness.mean()),
+            "std_fitness": float(self.fitness.std()),
+            "avg_energy": float(self.energy.mean()),
+            "avg_solved": float(self.solved.mean()),
+            "alive_rate": float(self.alive.mean()) if n else 0.0,
+            **self.diversity(),
+        }
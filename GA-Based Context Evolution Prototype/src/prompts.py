@@ -0,0 +1,83 @@
+"""
+Agent prompt 组装
+逻辑：按"稳定在前、易变在后"排列每一步发送的消息：
+      系统消息 = 基因（记忆部分含本局经历摘要）+ 当前环境（同一环境步骤内不变）
+      历史消息（只在末尾追加，窗口滑动时才变化）
+      末尾的用户消息 = 状态（能量）+ 指令（每一步都变）
+目的：旧布局把每步变化的能量值放在系统消息里，服务端的前缀缓存在基因之后就失效；
+      新布局下同一环境步骤内、历史只追加时，上一次请求除最后一条消息外的内容都可以命中前缀缓存
+
+可缓存前缀按"与同一Agent上一次请求的最长公共消息前缀"统计（shared_prefix），而不是按布局估计：
+  - 环境内容在系统消息里，进入下一步骤（或摘要更新）时系统消息改变，这一步整个前缀都不能复用
+  - window/budget 策略在窗口装满后每步从头部丢弃历史，公共前缀只剩系统消息
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from src.models import Gene
+from src.tokens import count_message_tokens
+
+
+@dataclass
+class AgentPrompt:
+    """一次Agent调用实际发送的消息"""
+    messages: List[BaseMessage]
+    prompt_tokens: int   # 全部消息的token数（用于新陈代谢扣费）
+
+
+def agent_gene_prompt(gene: Gene, summary: str = "") -> str:
+    """
+    本局使用的基因提示词
+    逻辑：摘要策略压缩出的本局经历追加到基因的记忆部分（[祖先记忆]）之后；
+          只影响发送的prompt，不修改 Gene 本身（基因按内容寻址，适应度缓存与谱系都以它为键，遗传仍经由变异器）
+    """
+    if not summary:
+        return gene.to_prompt_string()
+    memory = f"{gene.memory}\n{summary}" if gene.memory else summary
+    return gene.model_copy(update={"memory": memory}).to_prompt_string()
+
+
+def build_agent_system_message(gene_prompt: str, step_content: str = "") -> SystemMessage:
+    """稳定部分：基因（见 agent_gene_prompt）+ 当前环境"""
+    environment_section = f"\n[环境观察]\n{step_content}\n" if step_content else ""
+    return SystemMessage(content=f"""
+{gene_prompt}
+{environment_section}""")
+
+
+def build_agent_turn_message(energy: int) -> HumanMessage:
+    """易变部分：当前能量与本轮指令，总是放在最后"""
+    return HumanMessage(content=f"""
+[状态]
+能量: {energy}
+
+[指令]
+你的行动是什么？
+""")
+
+
+def assemble_agent_prompt(system_msg: SystemMessage, history: List[BaseMessage], turn_msg: HumanMessage) -> AgentPrompt:
+    """按 系统消息 -> 历史 -> 本轮消息 的顺序组装"""
+    messages = [system_msg] + list(history) + [turn_msg]
+    return AgentPrompt(messages=messages, prompt_tokens=count_message_tokens(messages))
+
+
+def message_fingerprint(message: BaseMessage) -> str:
+    return hashlib.sha1(f"{message.type}\0{message.content}".encode("utf-8")).hexdigest()[:16]
+
+
+def shared_prefix(messages: List[BaseMessage], previous: List[str]) -> Tuple[int, List[str]]:
+    """
+    与同一Agent上一次请求的最长公共消息前缀
+    逻辑：逐条比较消息指纹直到第一处不同（最后一条易变消息不计入）
+    返回：(公共前缀的token数, 本次请求的消息指纹，供下一次比较)
+    """
+    fingerprints = [message_fingerprint(m) for m in messages]
+    limit = min(len(fingerprints) - 1, len(previous))
+    k = 0
+    while k < limit and fingerprints[k] == previous[k]:
+        k += 1
+    return count_message_tokens(messages[:k]), fingerprints
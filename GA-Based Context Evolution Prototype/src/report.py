@@ -0,0 +1,132 @@
+"""
+Markdown报告
+逻辑：读取某代的 events.jsonl，按Agent分组渲染成与以往相同格式的Markdown报告
+目的：报告按需生成，与模拟过程解耦
+
+用法: python -m src.report <log_dir> [--generation N] [--agent ID]
+"""
+import argparse
+import json
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
+
+from src.checkpoint import restore_gene
+from src.lineage import LineageStore, LINEAGE_DB_FILENAME
+from src.log_sink import EVENTS_FILENAME
+
+
+def iter_events(gen_dir: str) -> Iterator[Dict]:
+    """逐行读取事件，忽略运行中断时可能不完整的最后一行"""
+    path = os.path.join(gen_dir, EVENTS_FILENAME)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def render_agent_markdown(agent_id: str, events: List[Dict], store: Optional[LineageStore] = None) -> str:
+    """将单个Agent的事件渲染为Markdown；事件只记录 gene_hash，基因文本从谱系库读取"""
+    # 多场景评估时每个场景各有一条 summary，最后一条是聚合结果
+    summary = next((e for e in reversed(events) if e["type"] == "summary"), None)
+    lines = [f"# Agent {agent_id} 模拟报告\n\n"]
+    
+    if summary:
+        meta = summary["metadata"]
+        gene = restore_gene(meta, store)
+        lines.append(f"- **适应度**: {meta.get('fitness')}\n")
+        lines.append(f"- **解决步数**: {meta.get('solved_steps_count')}\n")
+        lines.append(f"- **剩余能量**: {meta.get('final_energy')}\n")
+        lines.append(f"- **死因**: {meta.get('cause_of_death', '无')}\n\n")
+        for name, stats in (meta.get("scenarios") or {}).items():
+            lines.append(f"- 场景 `{name}`: 适应度 {stats.get('fitness')}，解决 {stats.get('solved_steps_count')} 步\n")
+        if meta.get("scenarios"):
+            lines.append("\n")
+        
+        lines.append(f"## 基因图谱 (`{meta.get('gene_hash', '-')}`)\n")
+        if gene is not None:
+            lines.append(f"### 身份\n{gene.identity}\n")
+            lines.append(f"### 策略\n{gene.strategy}\n")
+            lines.append(f"### 记忆\n{gene.memory}\n\n")
+        else:
+            lines.append("> 未找到谱系数据库，无法还原基因文本\n\n")
+    else:
+        lines.append("> 模拟尚未结束（未找到 summary 事件）\n\n")
+    
+    lines.append("## 交互日志\n")
+    # 多场景评估的事件交错写入，按场景分组（排序稳定，组内保持原顺序）
+    for entry in sorted(events, key=lambda e: e.get("scenario") or ""):
+        step = entry.get("step")
+        log_type = entry.get("type")
+        content = entry.get("content")
+        meta = entry.get("metadata", {})
+        
+        if log_type == "perception":
+            scenario = f" ({entry['scenario']})" if entry.get("scenario") else ""
+            lines.append(f"### Step {step}: 环境感知{scenario}\n")
+            lines.append(f"> **当前区域**: {meta.get('step_index')}\n\n")
+            lines.append(f"```text\n{content}\n```\n\n")
+            
+        elif log_type == "agent":
+            lines.append(f"### Step {step}: Agent行动\n")
+            lines.append(f"**能量**: {meta.get('energy')} (消耗 {meta.get('energy_cost', '?')}{'，投机命中' if meta.get('speculative') else ''}) | **Prompt Tokens**: {meta.get('prompt_tokens')}\n\n")
+            lines.append(f"{content}\n\n")
+            
+        elif log_type == "judge":
+            lines.append(f"### Step {step}: 裁判反馈\n")
+            lines.append(f"**解决**: {meta.get('is_solved')} | **奖励**: {meta.get('energy_reward')} | **本轮净变化**: {meta.get('energy_delta', '?')}\n\n")
+            lines.append(f"> {content}\n\n")
+            lines.append("---\n\n")
+        
+        elif log_type == "early_stop":
+            lines.append(f"### Step {step}: 提前终止\n")
+            lines.append(f"> {content}（约省去 {meta.get('calls_saved')} 次LLM调用）\n\n")
+    
+    return "".join(lines)
+
+
+def render_generation(gen_dir: str, agent_id: str = None, store: Optional[LineageStore] = None) -> List[str]:
+    """渲染一代中所有（或指定）Agent的报告，返回写出的文件路径"""
+    by_agent: Dict[str, List[Dict]] = defaultdict(list)
+    for event in iter_events(gen_dir):
+        if agent_id is None or event.get("agent_id") == agent_id:
+            by_agent[event["agent_id"]].append(event)
+    
+    written = []
+    for aid, events in by_agent.items():
+        filename = os.path.join(gen_dir, f"{aid}.md")
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(render_agent_markdown(aid, events, store))
+        written.append(filename)
+    return written
+
+
+def _generation_dirs(log_dir: str) -> List[str]:
+    dirs = [d for d in os.listdir(log_dir) if re.fullmatch(r"gen_\d+", d)]
+    return [os.path.join(log_dir, d) for d in sorted(dirs, key=lambda d: int(d.split("_")[1]))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="从 events.jsonl 生成Markdown报告")
+    parser.add_argument("log_dir", help="进化运行目录")
+    parser.add_argument("--generation", "-g", type=int, default=None, help="只渲染指定代")
+    parser.add_argument("--agent", "-a", type=str, default=None, help="只渲染指定Agent")
+    args = parser.parse_args()
+    
+    if args.generation is not None:
+        gen_dirs = [os.path.join(args.log_dir, f"gen_{args.generation}")]
+    else:
+        gen_dirs = _generation_dirs(args.log_dir)
+    
+    db_path = os.path.join(args.log_dir, LINEAGE_DB_FILENAME)
+    store = LineageStore(db_path) if os.path.exists(db_path) else None
+    total = 0
+    for gen_dir in gen_dirs:
+        if os.path.exists(os.path.join(gen_dir, EVENTS_FILENAME)):
+            total += len(render_generation(gen_dir, args.agent, store))
+    if store is not None:
+        store.close()
+    print(f"已生成 {total} 份报告")
@@ -0,0 +1,404 @@
+"""
+LLM请求调度器
+逻辑：Agent、裁判、变异器的所有LLM调用都提交到同一个调度器，按优先级（裁判 > Agent > 投机Agent > 变异器）排队，
+      按模型的令牌桶限速后交给工作线程执行；限流(429)、超时、5xx 等可重试错误按带抖动的指数退避重新排队，
+      遇到429时该模型短暂整体暂停，配置了速率上限的模型同时自适应降速（成功后缓慢恢复）
+目的：让进化在不超过服务商配额的前提下尽量用满配额，而不是在大量报错中把个体适应度拖低
+
+同步调用方使用 run()（阻塞等待结果）或 submit()（返回 Future）；
+异步调用方使用 acall()：调度器只发放"许可"，协程（如 llm.ainvoke）在调用方自己的事件循环中执行，不占用工作线程
+"""
+import asyncio
+import bisect
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_SCHEDULER_ENABLED = os.getenv("LLM_SCHEDULER_ENABLED", "1") == "1"
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "32"))
+# 每个模型的每分钟请求数上限，如 "gpt-4o-mini=500,*=300"；留空表示不限速（遇到429后自适应限速）
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+
+# 优先级：数值越小越先执行
+PRIORITIES = {"judge": 0, "agent": 1, "speculative": 2, "mutator": 3}
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = ("RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError", "TimeoutException", "ConnectError")
+# 429后自动降速的最低速率（每分钟请求数）
+ADAPTIVE_MIN_RPM = 10.0
+
+
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    limits = {}
+    for part in spec.split(","):
+        name, _, rpm = part.partition("=")
+        if name.strip() and rpm.strip():
+            limits[name.strip()] = float(rpm)
+    return limits
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    code = getattr(error, "status_code", None)
+    if code is None and getattr(error, "response", None) is not None:
+        code = getattr(error.response, "status_code", None)
+    return code
+
+
+def is_retryable(error: BaseException) -> bool:
+    return status_code(error) in RETRYABLE_STATUS or type(error).__name__ in RETRYABLE_ERRORS
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """读取响应中的 Retry-After（秒），没有则返回None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    令牌桶（每分钟请求数）
+    逻辑：rpm 为 None 时不限速；遇到429时该模型的所有请求暂停一小段时间（有 Retry-After 时按其值），
+          配置了上限的模型同时把速率减半，之后每次成功按当前速率的5%回升到上限（AIMD）；
+          在上次降速之前就已发出的请求返回的429不再重复降速
+    """
+    def __init__(self, rpm: Optional[float]):
+        self.limit = rpm      # 配置的上限（None = 不限）
+        self.rpm = rpm        # 当前生效的速率
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_throttle = 0.0
+
+    @property
+    def capacity(self) -> float:
+        return max(1.0, self.rpm / 60)
+
+    def wait_time(self, now: float) -> float:
+        """可以立即发放时返回0，否则返回还需等待的秒数"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rpm is None:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rpm / 60)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) * 60 / self.rpm
+
+    def take(self):
+        if self.rpm is not None:
+            self.tokens -= 1
+
+    def throttle(self, dispatched_at: float, pause: float):
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + pause)
+        if dispatched_at < self.last_throttle:
+            return
+        self.last_throttle = now
+        if self.rpm is not None:
+            self.rpm = max(ADAPTIVE_MIN_RPM, self.rpm / 2)
+
+    def recover(self):
+        if self.rpm is not None:
+            self.rpm = min(self.limit, self.rpm + max(1.0, self.rpm * 0.05))
+
+
+@dataclass
+class _Request:
+    priority: int
+    seq: int
+    kind: str = field(compare=False)
+    model: str = field(compare=False)
+    fn: Callable[[], Any] = field(compare=False)
+    future: Future = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+    not_before: float = field(default=0.0, compare=False)
+    dispatched_at: float = field(default=0.0, compare=False)
+    on_dispatch: Optional[Callable[[], None]] = field(default=None, compare=False)  # 异步原生请求：派发时通知调用方的事件循环
+
+    def __lt__(self, other: "_Request") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMScheduler:
+    """
+    优先级 + 令牌桶 + 重试的请求调度器
+    逻辑：派发线程按优先级扫描待发请求，选出第一个到期且所属模型有令牌的请求交给工作线程；
+          在途请求数不超过 max_inflight；重试的请求带上最早执行时间重新入队，不占用工作线程睡眠
+    """
+    def __init__(self, max_inflight: int = LLM_MAX_INFLIGHT, rate_limits: Dict[str, float] = None,
+                 max_retries: int = LLM_MAX_RETRIES, backoff_base: float = LLM_BACKOFF_BASE, backoff_max: float = LLM_BACKOFF_MAX):
+        self.max_inflight = max(1, max_inflight)
+        self.rate_limits = parse_rate_limits(LLM_RATE_LIMITS) if rate_limits is None else rate_limits
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._pending: List[_Request] = []  # 按 (优先级, 序号) 有序
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="llm")
+        self.inflight = 0
+        self._closed = False
+        self.reset_stats()
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="llm-scheduler", daemon=True)
+        self._dispatcher.start()
+
+    def _bucket(self, model: str) -> TokenBucket:
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            bucket = TokenBucket(self.rate_limits.get(model, self.rate_limits.get("*")))
+            self._buckets[model] = bucket
+        return bucket
+
+    def _new_request(self, kind: str, model: str, fn: Callable[[], Any]) -> _Request:
+        return _Request(PRIORITIES.get(kind, len(PRIORITIES)), next(self._seq), kind, model or "", fn, Future())
+
+    def _enqueue(self, request: _Request):
+        with self._cond:
+            bisect.insort(self._pending, request)
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+            self._cond.notify()
+
+    def submit(self, kind: str, model: str, fn: Callable[[], Any]) -> Future:
+        """提交一次调用，返回 Future"""
+        request = self._new_request(kind, model, fn)
+        self._enqueue(request)
+        return request.future
+
+    def run(self, kind: str, model: str, fn: Callable[[], Any]) -> Any:
+        """同步调用：阻塞直到成功或重试耗尽（抛出最后一次的异常）"""
+        return self.submit(kind, model, fn).result()
+
+    async def acall(self, kind: str, model: str, coro_fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        异步原生调用
+        逻辑：请求照常按优先级排队、受令牌桶与在途上限约束；派发时派发线程只唤醒调用方（不占用工作线程），
+              由调用方在自己的事件循环中 await coro_fn()；失败时按同样的退避规则重新排队
+        目的：成千上万个异步模拟共享一个事件循环，而不是每个在途LLM请求占一个线程
+        """
+        loop = asyncio.get_running_loop()
+        request = self._new_request(kind, model, coro_fn)
+        first = True
+        while True:
+            permit = loop.create_future()
+            request.on_dispatch = lambda permit=permit: loop.call_soon_threadsafe(_grant, permit)
+            if first:
+                self._enqueue(request)
+                first = False
+            else:
+                with self._cond:
+                    bisect.insort(self._pending, request)
+                    self._cond.notify()
+            try:
+                await permit
+            except asyncio.CancelledError:
+                self._withdraw(request)
+                raise
+            try:
+                result = await coro_fn()
+            except asyncio.CancelledError:
+                self._release(request)
+                raise
+            except Exception as e:
+                self._release(request)
+                delay = self._retry_delay(request, e)
+                if delay is None:
+                    raise
+                request.attempts += 1
+                request.not_before = time.monotonic() + delay
+                continue
+            self._release(request, success=True)
+            return result
+
+    def _release(self, request: _Request, success: bool = False):
+        """异步原生请求结束（成功时令牌桶回升），归还在途名额"""
+        with self._cond:
+            if success:
+                self._bucket(request.model).recover()
+            self.inflight -= 1
+            self._cond.notify()
+
+    def _withdraw(self, request: _Request):
+        """取消等待许可的请求：仍在队列中则移除，已派发则归还在途名额"""
+        with self._cond:
+            if request in self._pending:
+                self._pending.remove(request)
+                return
+        self._release(request)
+
+    def _next_ready(self, now: float):
+        """返回 (可派发的请求, None) 或 (None, 最短等待秒数)；调用方持有锁"""
+        wait = None
+        blocked_models = set()
+        for i, request in enumerate(self._pending):
+            if request.model in blocked_models:
+                continue  # 同一模型的更高优先级请求在等令牌，低优先级请求不能插队
+            delay = request.not_before - now
+            if delay <= 0:
+                delay = self._bucket(request.model).wait_time(now)
+                if delay <= 0:
+                    return self._pending.pop(i), None
+                blocked_models.add(request.model)
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _dispatch_loop(self):
+        with self._cond:
+            while not self._closed:
+                if not self._pending or self.inflight >= self.max_inflight:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                request, wait = self._next_ready(now)
+                if request is None:
+                    self._cond.wait(timeout=wait)
+                    continue
+                self._bucket(request.model).take()
+                request.dispatched_at = now
+                self.inflight += 1
+                if request.on_dispatch is not None:
+                    try:
+                        request.on_dispatch()
+                    except RuntimeError:
+                        self.inflight -= 1  # 调用方的事件循环已关闭，名额直接归还
+                else:
+                    self._executor.submit(self._execute, request)
+
+    def _execute(self, request: _Request):
+        try:
+            result = request.fn()
+        except BaseException as e:
+            self._on_error(request, e)
+        else:
+            with self._cond:
+                self._bucket(request.model).recover()
+            request.future.set_result(result)
+        finally:
+            with self._cond:
+                self.inflight -= 1
+                self._cond.notify()
+
+    def _retry_delay(self, request: _Request, error: BaseException) -> Optional[float]:
+        """
+        决定失败请求是否重试
+        返回：重新排队前的等待秒数；不可重试或重试耗尽时返回None（计入失败）
+        """
+        if request.attempts >= self.max_retries or not is_retryable(error):
+            with self._cond:
+                self.failed += 1
+            return None
+
+        # 全抖动指数退避；服务端给出 Retry-After 时以其为下限
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** request.attempts))
+        delay = max(delay, retry_after(error) or 0.0)
+        with self._cond:
+            self.retries += 1
+            if status_code(error) == 429:
+                self.throttled += 1
+                self._bucket(request.model).throttle(request.dispatched_at, retry_after(error) or self.backoff_base)
+        return delay
+
+    def _on_error(self, request: _Request, error: BaseException):
+        delay = self._retry_delay(request, error)
+        if delay is None:
+            request.future.set_exception(error)
+            return
+        with self._cond:
+            request.attempts += 1
+            request.not_before = time.monotonic() + delay
+            bisect.insort(self._pending, request)
+            self._cond.notify()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """实时状态：各优先级排队数、在途数、重试/限流计数、各模型当前速率"""
+        with self._cond:
+            queued = {kind: 0 for kind in PRIORITIES}
+            for request in self._pending:
+                queued[request.kind] = queued.get(request.kind, 0) + 1
+            return {
+                "queued": queued,
+                "inflight": self.inflight,
+                "submitted": self.submitted,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "failed": self.failed,
+                "max_queue_depth": self.max_queue_depth,
+                "rpm": {model: bucket.rpm for model, bucket in self._buckets.items()},
+            }
+
+    def reset_stats(self):
+        with self._cond:
+            self.submitted = 0
+            self.retries = 0
+            self.throttled = 0
+            self.failed = 0
+            self.max_queue_depth = 0
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+
+def _grant(permit: "asyncio.Future"):
+    if not permit.done():
+        permit.set_result(None)
+
+
+def format_queue(snapshot: Dict[str, Any]) -> str:
+    """把调度器状态格式化为一行（用于进度条）"""
+    queued = snapshot["queued"]
+    text = f"排队 裁判 {queued['judge']} / Agent {queued['agent']} / 变异 {queued['mutator']}"
+    if queued["speculative"]:
+        text += f" / 投机 {queued['speculative']}"
+    text += f" | 在途 {snapshot['inflight']}"
+    if snapshot["throttled"]:
+        text += f" | 429 {snapshot['throttled']}"
+    return text
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Optional[LLMScheduler]:
+    """获取进程内共享的调度器（惰性创建），未启用时返回 None"""
+    global _scheduler
+    if not LLM_SCHEDULER_ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
+
+
+def schedule(kind: str, model: str, fn: Callable[[], Any]) -> Any:
+    """经调度器执行一次同步调用；调度器关闭时直接调用"""
+    scheduler = get_scheduler()
+    return scheduler.run(kind, model, fn) if scheduler else fn()
+
+
+async def acall(kind: str, model: str, coro_fn: Callable[[], Awaitable[Any]]) -> Any:
+    """经调度器执行一次异步原生调用（如 llm.ainvoke）；调度器关闭时直接 await"""
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return await coro_fn()
+    return await scheduler.acall(kind, model, coro_fn)
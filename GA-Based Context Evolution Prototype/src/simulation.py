@@ -1,10 +1,20 @@
+import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from src.state import AgentState
-from src.nodes import perception_node, agent_node, judge_node, should_continue
+from src.nodes import perception_node, agent_node, judge_node, aperception_node, aagent_node, ajudge_node, should_continue
 from src.models import AgentConfig
 from src.environment import EnvironmentManager
+from src.log_sink import JsonlLogSink
+from src.checkpoint import compact_result
+from src.early_stop import EarlyStopper
+from src.speculation import speculation_stats
 
 def create_simulation_graph():
     """
@@ -14,10 +24,10 @@ def create_simulation_graph():
     """
     workflow = StateGraph(AgentState)
     
-    # 添加节点
-    workflow.add_node("perception", perception_node)
-    workflow.add_node("agent", agent_node)
-    workflow.add_node("judge", judge_node)
+    # 添加节点：每个节点同时带同步与异步实现，invoke/stream 走同步版本，ainvoke/astream 走异步版本
+    workflow.add_node("perception", RunnableLambda(perception_node, afunc=aperception_node, name="perception"))
+    workflow.add_node("agent", RunnableLambda(agent_node, afunc=aagent_node, name="agent"))
+    workflow.add_node("judge", RunnableLambda(judge_node, afunc=ajudge_node, name="judge"))
     
     # 设置入口点
     workflow.set_entry_point("perception")
@@ -38,122 +48,417 @@ def create_simulation_graph():
     
     return workflow.compile()
 
-def run_simulation(agent_config: AgentConfig, env_manager: EnvironmentManager, max_steps: int = 20):
+@dataclass(slots=True)
+class SimulationTally:
     """
-    运行单个Agent的模拟（无头模式/Headless）
-    
-    Args:
-        agent_config: Agent配置
-        env_manager: 环境管理器
-        max_steps: 最大步数
-        
-    Returns:
-        dict: 模拟结果，包含 fitness, solved_steps, final_energy 等
+    单次模拟的运行汇总
+    逻辑：只从各节点返回的增量（LangGraph updates 流）中折算能量、步骤与调用计数，不复制完整状态
+    目的：驱动循环的内存不随消息历史增长；每步的能量变化可以精确拆成 行动消耗 与 裁判奖励
     """
-    # 1. 加载场景
-    try:
-        scenario_steps = env_manager.load_scenario("tutorial_island")
-    except Exception as e:
-        return {
-            "error": str(e),
-            "fitness": 0,
-            "solved_steps_count": 0
-        }
+    energy: int
+    step_index: int = 0
+    is_alive: bool = True
+    cause_of_death: Optional[str] = None
+    solved_count: int = 0
+    last_solved: bool = False
+    cycle_energy: int = 0  # 本轮 感知->行动->判断 开始时的能量
+    agent_calls: int = 0
+    judgements: int = 0  # 裁判给出判决的次数（含缓存命中）
+    speculative_hits: int = 0    # 直接使用投机结果的行动次数
+    speculative_misses: int = 0  # 被丢弃的投机次数（分支猜错、发生摘要压缩、请求失败或模拟结束时未用上）
+    pending_speculation: Optional[Any] = None  # 已命中但尚未被行动节点使用的投机请求
+    prompt_tokens: List[int] = field(default_factory=list)
+    prefix_tokens: List[int] = field(default_factory=list)
+    energy_deltas: List[int] = field(default_factory=list)  # 每轮的能量净变化
 
-    # 2. 初始化状态
-    initial_state = AgentState(
-        agent_id=agent_config.id,
-        gene=agent_config.gene,
-        generation=agent_config.generation,
-        energy=agent_config.initial_energy,
-        is_alive=True,
-        cause_of_death=None,
-        current_step_index=0,
-        environment_steps=scenario_steps,
-        current_environment_content="",
-        messages=[],
-        last_action_valid=False,
-        feedback="",
-        solved_steps=[]
-    )
-    
-    # 3. 运行模拟
-    app = create_simulation_graph()
-    
-    current_state = initial_state
-    step_count = 0
-    
-    # 收集日志以便分析
-    # 结构化日志: List[Dict]
-    # {
-    #   "step": int,
-    #   "type": "perception" | "agent" | "judge",
-    #   "content": str,
-    #   "metadata": dict
-    # }
-    logs = []
-    
-    for event in app.stream(initial_state):
-        step_count += 1
+    def begin_cycle(self):
+        self.cycle_energy = self.energy
+
+    def discard_speculation(self, speculation):
+        """丢弃一次投机：本局计数与进程内统计（speculation_stats）走同一条路径"""
+        self.speculative_misses += 1
+        speculation_stats.discard(speculation)
+
+    def discard_pending(self):
+        """模拟在判决后结束（提前终止/超时）时，命中的投机结果也没有用上"""
+        if self.pending_speculation is not None:
+            self.discard_speculation(self.pending_speculation)
+            self.pending_speculation = None
+
+    def apply_agent(self, update: Dict) -> int:
+        """折算行动节点的增量，返回本次行动的能量消耗"""
+        before = self.energy
+        self.energy = update.get("energy", self.energy)
+        self.pending_speculation = None
+        if update.get("discarded_speculation") is not None:
+            self.discard_speculation(update["discarded_speculation"])
+        if update.get("speculative_turn"):
+            self.speculative_hits += 1
+            speculation_stats.record_hit()
+        if "step_prompt_tokens" in update:
+            self.agent_calls += 1
+            self.prompt_tokens.append(update["step_prompt_tokens"][-1])
+            self.prefix_tokens.append(update["step_prefix_tokens"][-1])
+        if update.get("is_alive") is False:
+            self.is_alive = False
+            self.cause_of_death = update.get("cause_of_death")
+        return before - self.energy
+
+    def apply_judge(self, update: Dict) -> int:
+        """折算裁判节点的增量，返回裁判给出的能量奖励"""
+        before = self.energy
+        self.energy = update.get("energy", self.energy)
+        self.last_solved = bool(update.get("last_action_valid", False))
+        if "energy" in update:
+            self.judgements += 1
+        if self.last_solved:
+            self.solved_count += 1
+        if update.get("discarded_speculation") is not None:
+            self.discard_speculation(update["discarded_speculation"])
+        self.pending_speculation = update.get("speculation")
+        self.step_index = update.get("current_step_index", self.step_index)
+        self.energy_deltas.append(self.energy - self.cycle_energy)
+        return self.energy - before
+
+class SimulationRuntime:
+    """
+    模拟运行时
+    逻辑：持有编译好的状态图和带缓存的环境管理器，在一次进化运行内被所有评估共享
+    目的：避免为每个个体重复编译StateGraph和重新解析场景文件
+    """
+    def __init__(self, env_manager: EnvironmentManager, scenario_name: str = "tutorial_island"):
+        self.env_manager = env_manager
+        self.scenario_name = scenario_name
+        self.app = create_simulation_graph()  # 编译后的图是无状态的，可跨线程复用
+
+    def load_scenario(self, scenario_name: str = None):
+        return self.env_manager.load_scenario(scenario_name or self.scenario_name)
+
+    def scenario_version(self, scenario_name: str = None) -> str:
+        return self.env_manager.scenario_version(scenario_name or self.scenario_name)
+
+class SimulationDriver:
+    """
+    单次模拟的事件驱动器
+    逻辑：把 updates 流中的每个事件折算进 SimulationTally、写出日志事件、判断提前终止与超时；
+          同步的 run_simulation 与异步的 arun_simulation 共用同一个驱动器，只是迭代方式不同
+    """
+    def __init__(self, agent_config: AgentConfig, scenario_name: str, max_steps: int, log_sink: JsonlLogSink = None):
+        self.agent_config = agent_config
+        self.scenario_name = scenario_name
+        self.max_steps = max_steps
+        self.tally = SimulationTally(energy=agent_config.initial_energy)
+        self.step_count = 0
+        self.step_latencies = []  # 每个 感知->行动->判断 循环的耗时（秒）
+        self.stopper = EarlyStopper(agent_config.initial_energy)
+        self.early_stop = None  # 提前终止时记录原因与省下的LLM调用数
+        self.cycle_start = time.perf_counter()
         
-        for node_name, node_state in event.items():
-            current_state.update(node_state)
+        # 收集日志以便分析
+        # 结构化日志: List[Dict]
+        # {
+        #   "step": int,
+        #   "type": "perception" | "agent" | "judge",
+        #   "content": str,
+        #   "metadata": dict
+        # }
+        # 有 log_sink 时逐条写出，不在内存中累积
+        self.logs = []
+        self.log_sink = log_sink
+
+    def emit(self, entry: Dict):
+        if self.log_sink is None:
+            self.logs.append(entry)
+            return
+        entry["agent_id"] = self.agent_config.id
+        entry["generation"] = self.agent_config.generation
+        entry["scenario"] = self.scenario_name
+        self.log_sink.emit(entry)
+
+    def initial_state(self, scenario_steps) -> AgentState:
+        agent_config = self.agent_config
+        return AgentState(
+            agent_id=agent_config.id,
+            gene=agent_config.gene,
+            generation=agent_config.generation,
+            energy=agent_config.initial_energy,
+            is_alive=True,
+            cause_of_death=None,
+            current_step_index=0,
+            environment_steps=scenario_steps,
+            current_environment_content="",
+            messages=[],
+            context_summary="",
+            summarized_upto=0,
+            step_prompt_tokens=[],
+            step_prefix_tokens=[],
+            last_prompt_fingerprints=[],
+            last_action_valid=False,
+            feedback="",
+            solved_steps=[],
+            speculation=None,
+            speculative_turn=False,
+            discarded_speculation=None
+        )
+
+    def feed(self, event: Dict) -> bool:
+        """
+        处理 updates 流中的一个事件（只含节点返回的增量）
+        返回：是否应停止迭代
+        """
+        tally = self.tally
+        self.step_count += 1
+        step_count = self.step_count
+        
+        for node_name, update in event.items():
+            update = update or {}
             
             if node_name == "perception":
-                content = node_state.get("current_environment_content", "")
-                logs.append({
+                tally.begin_cycle()
+                self.emit({
                     "step": step_count,
                     "type": "perception",
-                    "content": content,
-                    "metadata": {"step_index": current_state.get("current_step_index")}
+                    "content": update.get("current_environment_content", ""),
+                    "metadata": {"step_index": tally.step_index}
                 })
 
             elif node_name == "agent":
-                last_msg = node_state["messages"][-1]
-                logs.append({
-                    "step": step_count,
-                    "type": "agent",
-                    "content": last_msg.content,
-                    "metadata": {"energy": node_state.get("energy")}
-                })
+                energy_cost = tally.apply_agent(update)
+                if update.get("messages"):
+                    self.emit({
+                        "step": step_count,
+                        "type": "agent",
+                        "content": update["messages"][-1].content,
+                        "metadata": {
+                            "energy": tally.energy,
+                            "energy_cost": energy_cost,
+                            "prompt_tokens": tally.prompt_tokens[-1] if "step_prompt_tokens" in update else None,
+                            "prefix_tokens": tally.prefix_tokens[-1] if "step_prefix_tokens" in update else None,
+                            "speculative": bool(update.get("speculative_turn"))
+                        }
+                    })
                 
             elif node_name == "judge":
-                feedback = node_state.get("feedback", "")
-                is_solved = node_state.get("last_action_valid", False)
-                logs.append({
+                now = time.perf_counter()
+                self.step_latencies.append(now - self.cycle_start)
+                self.cycle_start = now
+                energy_reward = tally.apply_judge(update)
+                self.emit({
                     "step": step_count,
                     "type": "judge",
-                    "content": feedback,
+                    "content": update.get("feedback", ""),
                     "metadata": {
-                        "is_solved": is_solved,
-                        "energy_reward": node_state.get("energy", 0) - (current_state.get("energy", 0) - node_state.get("energy", 0)) # 修正: 這裡計算比較複雜，暫存狀態快照
+                        "is_solved": tally.last_solved,
+                        "energy_reward": energy_reward,
+                        "energy_delta": tally.energy_deltas[-1],
+                        "speculation": "hit" if update.get("speculation") is not None else ("miss" if update.get("discarded_speculation") is not None else None)
                     }
                 })
+                
+                reason = self.stopper.observe(tally.step_index, tally.energy, tally.last_solved) if self.stopper.enabled and tally.is_alive else None
+                if reason:
+                    projected = self.stopper.project(tally.energy, step_count, self.max_steps)
+                    self.early_stop = {"reason": reason, "calls_saved": projected.pop("calls_saved")}
+                    tally.energy, tally.is_alive, tally.cause_of_death = projected["energy"], projected["is_alive"], projected["cause_of_death"]
+                    self.emit({"step": step_count, "type": "early_stop", "content": reason, "metadata": self.early_stop})
 
-        if not current_state.get("is_alive", True):
-            break
+        if self.early_stop or not tally.is_alive:
+            return True
+        if step_count > self.max_steps:
+            tally.cause_of_death = "Timeout"
+            return True
+        return False
+
+    def result(self) -> Dict:
+        """计算适应度并生成模拟结果"""
+        tally = self.tally
+        early_stop = self.early_stop
+        tally.discard_pending()
+        # 适应度公式：解决的步骤数 * 100 + 剩余能量 + (100 - 使用步数)
+        fitness = (tally.solved_count * 100) + tally.energy
+        if tally.is_alive:
+            fitness += 20 # 存活奖励
             
-        if step_count > max_steps:
-            current_state["cause_of_death"] = "Timeout"
+        result = {
+            "agent_id": self.agent_config.id,
+            "generation": self.agent_config.generation,
+            "scenario": self.scenario_name,
+            "fitness": fitness,
+            "solved_steps_count": tally.solved_count,
+            "final_energy": tally.energy,
+            "is_alive": tally.is_alive,
+            "cause_of_death": tally.cause_of_death,
+            "prompt_tokens_per_step": tally.prompt_tokens,
+            "total_prompt_tokens": sum(tally.prompt_tokens),
+            "prefix_tokens_per_step": tally.prefix_tokens,
+            "energy_delta_per_step": tally.energy_deltas,
+            "agent_calls": tally.agent_calls,
+            "judgements": tally.judgements,
+            "speculative_hits": tally.speculative_hits,
+            "speculative_misses": tally.speculative_misses,
+            "step_latencies": self.step_latencies,
+            "early_stop_reason": early_stop["reason"] if early_stop else None,
+            "llm_calls_saved": early_stop["calls_saved"] if early_stop else 0,
+            "gene": self.agent_config.gene,
+            "logs": self.logs
+        }
+        
+        if self.log_sink is not None:
+            self.emit({"step": self.step_count, "type": "summary", "content": "", "metadata": compact_result(result)})
+        
+        return result
+
+def _load_failure(error: Exception) -> Dict:
+    return {
+        "error": str(error),
+        "fitness": 0,
+        "solved_steps_count": 0
+    }
+
+def run_simulation(agent_config: AgentConfig, env_manager: EnvironmentManager, max_steps: int = 20, runtime: SimulationRuntime = None,
+                   log_sink: JsonlLogSink = None, scenario_name: str = None):
+    """
+    运行单个Agent的模拟（无头模式/Headless）
+    
+    Args:
+        agent_config: Agent配置
+        env_manager: 环境管理器
+        max_steps: 最大步数
+        runtime: 共享的模拟运行时，为空时临时创建一个
+        log_sink: 流式日志写入器；提供时事件实时写入，结果中的 logs 为空
+        scenario_name: 评估所用场景，为空时使用运行时的默认场景
+        
+    Returns:
+        dict: 模拟结果，包含 fitness, solved_steps, final_energy 等
+    """
+    if runtime is None:
+        runtime = SimulationRuntime(env_manager)
+    scenario_name = scenario_name or runtime.scenario_name
+
+    # 1. 加载场景
+    try:
+        scenario_steps = runtime.load_scenario(scenario_name)
+    except Exception as e:
+        return _load_failure(e)
+
+    # 2. 运行模拟：updates 流只给出每个节点返回的增量，驱动器只把增量折算进 tally，不持有完整状态
+    driver = SimulationDriver(agent_config, scenario_name, max_steps, log_sink)
+    for event in runtime.app.stream(driver.initial_state(scenario_steps), stream_mode="updates"):
+        if driver.feed(event):
             break
     
-    # 4. 计算适应度
-    # 适应度公式：解决的步骤数 * 100 + 剩余能量 + (100 - 使用步数)
-    solved_count = len(current_state.get("solved_steps", []))
-    final_energy = current_state.get("energy", 0)
+    # 3. 计算适应度
+    return driver.result()
+
+async def arun_simulation(agent_config: AgentConfig, env_manager: EnvironmentManager, max_steps: int = 20, runtime: SimulationRuntime = None,
+                          log_sink: JsonlLogSink = None, scenario_name: str = None):
+    """
+    运行单个Agent的模拟（异步）
+    逻辑：与 run_simulation 相同，但迭代 app.astream，图中各节点走异步实现（ainvoke）
+    目的：大量模拟共享一个事件循环，等待LLM时不占用线程
+    """
+    if runtime is None:
+        runtime = SimulationRuntime(env_manager)
+    scenario_name = scenario_name or runtime.scenario_name
+
+    try:
+        scenario_steps = runtime.load_scenario(scenario_name)
+    except Exception as e:
+        return _load_failure(e)
+
+    driver = SimulationDriver(agent_config, scenario_name, max_steps, log_sink)
+    stream = runtime.app.astream(driver.initial_state(scenario_steps), stream_mode="updates")
+    try:
+        async for event in stream:
+            if driver.feed(event):
+                break
+    finally:
+        await stream.aclose()
     
-    fitness = (solved_count * 100) + final_energy
-    if current_state.get("is_alive", True):
-        fitness += 20 # 存活奖励
-        
+    return driver.result()
+
+
+def run_scenarios(agent_config: AgentConfig, env_manager: EnvironmentManager, scenarios: List[str], max_steps: int = 20,
+                  runtime: SimulationRuntime = None, log_sink: JsonlLogSink = None):
+    """
+    在多个场景上评估同一个Agent
+    逻辑：各场景的模拟并行运行（共享运行时与场景索引），再聚合为一个结果：
+          适应度取各场景平均，解决步数求和，只有在所有场景都存活才算存活
+    目的：让适应度反映基因在一组场景上的泛化能力，而不是单一场景
+    """
+    if runtime is None:
+        runtime = SimulationRuntime(env_manager)
+    if len(scenarios) <= 1:
+        return run_simulation(agent_config, env_manager, max_steps, runtime, log_sink, scenarios[0] if scenarios else None)
+
+    with ThreadPoolExecutor(max_workers=len(scenarios), thread_name_prefix="scenario") as pool:
+        per_scenario = list(pool.map(
+            lambda name: run_simulation(agent_config, env_manager, max_steps, runtime, log_sink, name),
+            scenarios
+        ))
+
+    result = aggregate_scenario_results(agent_config, scenarios, per_scenario)
+    if log_sink is not None:
+        log_sink.emit({
+            "step": 0, "type": "summary", "content": "", "agent_id": agent_config.id,
+            "generation": agent_config.generation, "scenario": None, "metadata": compact_result(result)
+        })
+    return result
+
+
+async def arun_scenarios(agent_config: AgentConfig, env_manager: EnvironmentManager, scenarios: List[str], max_steps: int = 20,
+                         runtime: SimulationRuntime = None, log_sink: JsonlLogSink = None):
+    """在多个场景上评估同一个Agent（异步）：各场景的模拟在同一事件循环中并发，聚合方式同 run_scenarios"""
+    if runtime is None:
+        runtime = SimulationRuntime(env_manager)
+    if len(scenarios) <= 1:
+        return await arun_simulation(agent_config, env_manager, max_steps, runtime, log_sink, scenarios[0] if scenarios else None)
+
+    per_scenario = await asyncio.gather(*(
+        arun_simulation(agent_config, env_manager, max_steps, runtime, log_sink, name) for name in scenarios
+    ))
+
+    result = aggregate_scenario_results(agent_config, scenarios, per_scenario)
+    if log_sink is not None:
+        log_sink.emit({
+            "step": 0, "type": "summary", "content": "", "agent_id": agent_config.id,
+            "generation": agent_config.generation, "scenario": None, "metadata": compact_result(result)
+        })
+    return result
+
+
+def aggregate_scenario_results(agent_config: AgentConfig, scenarios: List[str], results: List[Dict]) -> Dict:
+    """合并多个场景的模拟结果；加载失败的场景（无 agent_id）按适应度0计入"""
+    completed = [r for r in results if "agent_id" in r]
+    step_tokens = [t for r in completed for t in r["prompt_tokens_per_step"]]
+    prefix_tokens = [t for r in completed for t in r.get("prefix_tokens_per_step", [])]
+    energy_deltas = [d for r in completed for d in r.get("energy_delta_per_step", [])]
     return {
         "agent_id": agent_config.id,
         "generation": agent_config.generation,
-        "fitness": fitness,
-        "solved_steps_count": solved_count,
-        "final_energy": final_energy,
-        "is_alive": current_state.get("is_alive", True),
-        "cause_of_death": current_state.get("cause_of_death"),
+        "scenario": None,
+        "fitness": round(sum(r["fitness"] for r in results) / len(results), 2),
+        "solved_steps_count": sum(r["solved_steps_count"] for r in results),
+        "final_energy": round(sum(r["final_energy"] for r in completed) / len(completed)) if completed else 0,
+        "is_alive": len(completed) == len(results) and all(r["is_alive"] for r in completed),
+        "cause_of_death": next((f"{name}: {r.get('cause_of_death') or r.get('error')}" for name, r in zip(scenarios, results)
+                                if not r.get("is_alive", False)), None),
+        "prompt_tokens_per_step": step_tokens,
+        "total_prompt_tokens": sum(step_tokens),
+        "prefix_tokens_per_step": prefix_tokens,
+        "energy_delta_per_step": energy_deltas,
+        "agent_calls": sum(r.get("agent_calls", 0) for r in completed),
+        "judgements": sum(r.get("judgements", 0) for r in completed),
+        "speculative_hits": sum(r.get("speculative_hits", 0) for r in completed),
+        "speculative_misses": sum(r.get("speculative_misses", 0) for r in completed),
+        "step_latencies": [lat for r in completed for lat in r["step_latencies"]],
+        "early_stop_reason": next((f"{name}: {r['early_stop_reason']}" for name, r in zip(scenarios, results)
+                                   if "agent_id" in r and r.get("early_stop_reason")), None),
+        "llm_calls_saved": sum(r.get("llm_calls_saved", 0) for r in completed),
         "gene": agent_config.gene,
-        "logs": logs
+        "logs": [entry for r in completed for entry in r["logs"]],
+        "scenarios": {
+            name: {k: r.get(k) for k in ("fitness", "solved_steps_count", "final_energy", "is_alive", "error") if k in r}
+            for name, r in zip(scenarios, results)
+        }
     }
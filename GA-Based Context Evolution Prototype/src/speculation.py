@@ -0,0 +1,143 @@
+"""
+投机执行（下一轮Agent行动的预生成）
+逻辑：裁判评判期间，下一轮只有两种可能：重试当前步骤（行动无效）或进入 steps[idx+1]（行动成功）。
+      裁判节点在发出裁判请求的同时，按预测的分支构造下一轮的假设状态（追加预测的裁判反馈、预测的能量），
+      提前发出Agent请求；判决返回后分支猜对则行动节点直接使用预生成的回复，猜错则丢弃并计入浪费的token
+目的：以额外的token开销换取单个Agent的步延迟（猜对时 感知->行动 不再等待一次完整的LLM往返）
+
+近似：命中时Agent看到的是预测的裁判反馈（行动无效时不含裁判理由、奖励取 SPECULATIVE_REWARD_GUESS），
+      写入历史的仍是真实的裁判反馈，新陈代谢按真实prompt扣费
+"""
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage
+
+from src.tokens import count_tokens
+
+load_dotenv()
+
+SPECULATIVE_MODES = ("off", "retry", "advance", "auto")
+SPECULATIVE_MODE = os.getenv("SPECULATIVE_MODE", "off")  # 投机执行的分支预测: off | retry | advance | auto（按本局解决率选择）
+SPECULATIVE_REWARD_GUESS = int(os.getenv("SPECULATIVE_REWARD_GUESS", "3"))  # 预测"行动成功"分支时假设的能量奖励
+
+
+@dataclass
+class Speculation:
+    """一次已发出的投机请求"""
+    branch: str        # "retry" | "advance"
+    step_index: int    # 预测的下一轮步骤下标
+    prompt_tokens: int # 投机请求的prompt token数
+    future: Any        # concurrent.futures.Future（同步图）或 asyncio.Task（异步图）
+    hit: bool = False  # 裁判给出判决后确定：预测的分支是否正确
+
+
+def predict_branch(state: Dict, mode: str = SPECULATIVE_MODE) -> Optional[str]:
+    """
+    预测下一轮的分支
+    逻辑：auto 模式下本局已解决步数 / 已行动次数 超过一半时预测进入下一步，否则预测重试；
+          预测进入下一步但已是最后一步时不投机（模拟会直接结束）
+    """
+    if mode == "auto":
+        attempts = len(state.get("step_prompt_tokens", []))
+        solved = len(state.get("solved_steps", []))
+        branch = "advance" if attempts and solved / attempts > 0.5 else "retry"
+    elif mode in ("retry", "advance"):
+        branch = mode
+    else:
+        return None
+    if branch == "advance" and state["current_step_index"] + 1 >= len(state["environment_steps"]):
+        return None
+    return branch
+
+
+def hypothetical_state(state: Dict, branch: str) -> Dict:
+    """按预测分支构造下一轮行动节点看到的状态（追加预测的裁判反馈，不修改原状态）"""
+    idx = state["current_step_index"]
+    if branch == "advance":
+        idx += 1
+        feedback = HumanMessage(content=f"【系统】目标完成。进入下一区域。能量奖励：+{SPECULATIVE_REWARD_GUESS}")
+        energy = state["energy"] + SPECULATIVE_REWARD_GUESS
+    else:
+        feedback = HumanMessage(content="【系统】行动无效。")
+        energy = state["energy"]
+    return {
+        **state,
+        "messages": list(state["messages"]) + [feedback],
+        "energy": energy,
+        "current_step_index": idx,
+        "current_environment_content": state["environment_steps"][idx].content,
+    }
+
+
+def _completion_tokens(response: Any) -> int:
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("output_tokens"):
+        return usage["output_tokens"]
+    return count_tokens(getattr(response, "content", "") or "")
+
+
+class SpeculationStats:
+    """
+    进程内的投机执行统计（线程安全）
+    逻辑：started / hits / misses 计数；被丢弃请求的prompt token立即计入浪费，
+          回复token在请求完成时计入（丢弃时尚未完成的请求通过回调补记）
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.started = 0
+            self.hits = 0
+            self.misses = 0
+            self.wasted_prompt_tokens = 0
+            self.wasted_completion_tokens = 0
+
+    def record_start(self):
+        with self._lock:
+            self.started += 1
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def _add_wasted_completion(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        tokens = _completion_tokens(future.result())
+        with self._lock:
+            self.wasted_completion_tokens += tokens
+
+    def discard(self, speculation: Speculation):
+        """
+        丢弃一次投机
+        逻辑：异步任务直接取消（释放调度许可）；同步请求已进入调度器队列无法撤回，完成后补记回复token
+        """
+        with self._lock:
+            self.misses += 1
+            self.wasted_prompt_tokens += speculation.prompt_tokens
+        future = speculation.future
+        if hasattr(future, "get_loop") and not future.done():
+            future.cancel()
+        future.add_done_callback(self._add_wasted_completion)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            settled = self.hits + self.misses
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / settled if settled else 0.0,
+                "wasted_prompt_tokens": self.wasted_prompt_tokens,
+                "wasted_completion_tokens": self.wasted_completion_tokens,
+                "wasted_tokens": self.wasted_prompt_tokens + self.wasted_completion_tokens,
+            }
+
+
+speculation_stats = SpeculationStats()
@@ -1,4 +1,4 @@
-from typing import TypedDict, List, Optional, Annotated
+from typing import TypedDict, List, Optional, Annotated, Any
 from langgraph.graph.message import add_messages
 from src.models import Gene, EnvironmentStep
 
@@ -26,7 +26,19 @@ class AgentState(TypedDict):
     # 交互历史
     messages: Annotated[List[dict], add_messages]   # LangGraph标准消息历史
     
+    # 上下文窗口（见 src/context.py）
+    context_summary: str           # 较早轮次压缩后的摘要
+    summarized_upto: int           # messages 中已并入摘要的消息数
+    step_prompt_tokens: List[int]  # 每步实际发送的prompt token数
+    step_prefix_tokens: List[int]  # 每步prompt与上一次请求的公共前缀token数，即可被服务端前缀缓存复用的部分（见 src/prompts.py）
+    last_prompt_fingerprints: List[str]  # 上一次Agent请求各消息的指纹
+    
     # 反馈/判断
     last_action_valid: bool      # 上次行动是否有效
     feedback: str                # 裁判反馈信息
     solved_steps: List[str]      # 已解决的步骤ID列表
+    
+    # 投机执行（见 src/speculation.py）
+    speculation: Optional[Any]   # 裁判期间预生成的下一轮行动（Speculation），行动节点消费后清空
+    speculative_turn: bool       # 最近一次行动是否直接使用了投机结果
+    discarded_speculation: Optional[Any]  # 本节点丢弃的投机请求，由 SimulationTally 统一计入浪费
@@ -0,0 +1,81 @@
+"""
+Token计数
+逻辑：本地计算文本与消息列表的token数，绝不访问网络：
+      本地tiktoken缓存中已有编码文件时使用tiktoken精确计数，否则退回到正则估算
+目的：为新陈代谢、上下文窗口策略和每步token统计提供统一的计数口径
+"""
+import hashlib
+import os
+import re
+import tempfile
+from functools import lru_cache
+from typing import Callable, Iterable, Optional
+
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage
+
+load_dotenv()
+
+# 使用的编码名；设置为 "regex" 可强制使用正则估算
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")
+
+# 中日韩字符按1个token计，其余按 单词/数字/单个标点 切分
+_TOKEN_RE = re.compile(r"[㐀-鿿豈-﫿぀-ヿ가-힯]|[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+# 每条消息的角色/分隔符开销（与OpenAI聊天格式的经验值一致）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_TIKTOKEN_BLOBS = {
+    "cl100k_base": "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken",
+    "o200k_base": "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken",
+}
+
+
+def _regex_token_count(text: str) -> int:
+    """正则估算（长英文单词按每4个字符1个token计）"""
+    total = 0
+    for piece in _TOKEN_RE.findall(text):
+        total += (len(piece) + 3) // 4 if piece.isascii() and piece.isalpha() else 1
+    return total
+
+
+def _tiktoken_cache_path(encoding: str) -> Optional[str]:
+    """与 tiktoken 相同的规则定位本地缓存文件"""
+    blob = _TIKTOKEN_BLOBS.get(encoding)
+    if blob is None:
+        return None
+    cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR") or os.environ.get("DATA_GYM_CACHE_DIR") \
+        or os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    return os.path.join(cache_dir, hashlib.sha1(blob.encode()).hexdigest())
+
+
+@lru_cache(maxsize=1)
+def _get_encoder() -> Callable[[str], int]:
+    """
+    加载一次分词器
+    逻辑：只有编码文件已在本地缓存时才加载tiktoken，避免在热路径上触发下载
+    目的：计数与真实计费口径一致，同时保证离线可用
+    """
+    cache_path = _tiktoken_cache_path(TOKENIZER_ENCODING)
+    if cache_path and os.path.exists(cache_path):
+        try:
+            import tiktoken
+            encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return _regex_token_count
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """计算一段文本的token数（按文本内容缓存，历史消息和基因在多步之间重复出现）"""
+    return _get_encoder()(text)
+
+
+def count_message_tokens(messages: Iterable[BaseMessage]) -> int:
+    """
+    计算一组聊天消息作为prompt发送时的token数
+    逻辑：逐条按内容计数（count_tokens 按内容缓存）并加上每条消息的格式开销；
+          易变的能量与指令单独放在末尾消息里（见 src/prompts.py），基因与环境所在的系统消息在同一步骤内不变，每步直接命中缓存
+    """
+    return sum(count_tokens(str(m.content)) + MESSAGE_OVERHEAD_TOKENS for m in messages)
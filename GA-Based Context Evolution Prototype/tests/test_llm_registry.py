@@ -0,0 +1,118 @@
+"""
+模型客户端注册表的连接复用测试
+逻辑：在本地启动一个OpenAI兼容的模拟服务器，统计模拟运行期间建立的TCP连接数与收到的请求；
+      跑一局20步的模拟（Agent行动 + 裁判判决各20次），断言所有请求共用同一条长连接
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src import llm, nodes
+from src.environment import EnvironmentManager
+from src.judge_cache import set_judge_cache
+from src.models import AgentConfig, Gene
+from src.simulation import run_simulation
+
+SIMULATION_STEPS = 20
+EVENTS_PER_STEP = 3  # 感知 -> 行动 -> 判断
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """OpenAI兼容的 /chat/completions 模拟服务器：每个处理器实例对应一条TCP连接"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeOpenAIHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.agent_calls = 0
+        self.judge_calls = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 保持长连接
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if body.get("tools") or body.get("response_format"):
+            # 裁判（结构化输出）：始终判定未解决，让模拟跑满步数
+            verdict = json.dumps({"is_solved": False, "energy_reward": 0, "reasoning": "再试试", "next_environment_hint": "换个方法"})
+            if body.get("tools"):
+                name = body["tools"][0]["function"]["name"]
+                message = {"role": "assistant", "content": None,
+                           "tool_calls": [{"id": "call_0", "type": "function", "function": {"name": name, "arguments": verdict}}]}
+            else:
+                message = {"role": "assistant", "content": verdict}
+            with self.server.lock:
+                self.server.judge_calls += 1
+        else:
+            message = {"role": "assistant", "content": "我捡起生锈的钥匙。"}
+            with self.server.lock:
+                self.server.agent_calls += 1
+
+        payload = json.dumps({
+            "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    server = FakeOpenAIServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setenv("LLM_BACKEND", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENAI_API_BASE", server.base_url)
+    monkeypatch.setattr(nodes, "AGENT_MODEL_NAME", "agent-model")
+    monkeypatch.setattr(nodes, "JUDGE_MODEL_NAME", "judge-model")
+    llm.reset_registry()
+    set_judge_cache(None)  # 不读写持久化的裁判缓存，每次判决都发到服务器
+    try:
+        yield server
+    finally:
+        llm.reset_registry()
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def scenario_manager(tmp_path):
+    scenario = tmp_path / "registry_test"
+    scenario.mkdir()
+    (scenario / "step_01.txt").write_text("你站在一扇锁着的门前，地上有一把生锈的钥匙。\n---\n捡起钥匙或用钥匙开门即为解决。", encoding="utf-8")
+    (scenario / "step_02.txt").write_text("门后是一条黑暗的走廊。\n---\n点亮光源即为解决。", encoding="utf-8")
+    return EnvironmentManager(base_path=str(tmp_path))
+
+
+def test_simulation_reuses_one_connection(fake_server, scenario_manager):
+    agent = AgentConfig(gene=Gene(identity="测试者", strategy="先观察再行动"), initial_energy=100000)
+
+    result = run_simulation(agent, scenario_manager, max_steps=SIMULATION_STEPS * EVENTS_PER_STEP, scenario_name="registry_test")
+
+    assert result["is_alive"]
+    assert fake_server.agent_calls == SIMULATION_STEPS
+    assert fake_server.judge_calls == SIMULATION_STEPS
+    # Agent与裁判的客户端共享同一个连接池，串行的40次请求只需要一条TCP连接
+    assert fake_server.connections == 1
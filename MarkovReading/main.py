@@ -2,12 +2,12 @@
 from pydantic import BaseModel
 from langchain.chat_models import init_chat_model
 from langchain_core.messages import AnyMessage,SystemMessage,HumanMessage,AIMessage
-from langgraph.graph.message import add_messages
 from langgraph.graph import START, StateGraph ,END
-from typing import List,Annotated
+from typing import Iterable,Iterator,Tuple,Union
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
 import os
+import sys
 
 
 load_dotenv()
@@ -55,30 +55,59 @@ llm=init_chat_model(
         model="openai:"+os.getenv("OPENAI_MODEL_NAME"),
     ) 
 class State(BaseModel):
-    """状态类,用于存储状态"""
-    messages: Annotated[List[AnyMessage], add_messages]
+    """状态类,只保存当前块和上一轮的`印象`,不保存历史消息"""
     chunk_index: int = 0
-    chunk: List[str] = []
-    chunk_max_size: int=0
+    chunk: str = ""
     impression: str = ""
 
 
-def chunk_cut(state: State):
-    """将输入文本切分成多个块"""
-    # splitter = RecursiveCharacterTextSplitter(
-    #     chunk_size=200,
-    #     chunk_overlap=50,
-    #     separators=["\n\n", "\n", " ", ""]
-    # )
-    # state.chunk=splitter.split_text( state.messages[-1].content)
-    state.chunk=[m.type+":"+m.content for m in state.messages ]
-    state.chunk_max_size=len(state.chunk)
-    return state
+# 切块参数;READ_BLOCK_SIZE 为每次从文件读入的字符数,缓冲区不超过 READ_BLOCK_SIZE + CHUNK_SIZE
+CHUNK_SIZE = 200
+CHUNK_OVERLAP = 50
+READ_BLOCK_SIZE = 64 * 1024
+
+splitter = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    separators=["\n\n", "\n", " ", ""],
+    strip_whitespace=False  # 保留块末尾的分隔符,缓冲区残块与下一段拼接时不会粘连
+)
+
+
+def read_file(path: str, block_size: int = READ_BLOCK_SIZE) -> Iterator[str]:
+    """按块惰性读取文件,不把整个文件读进内存"""
+    with open(path, "r", encoding="utf-8") as f:
+        while block := f.read(block_size):
+            yield block
+
+
+def read_messages(messages: Iterable[AnyMessage]) -> Iterator[str]:
+    """把聊天记录逐条转成文本,消息之间用空行分隔,切块时优先在消息边界断开"""
+    for m in messages:
+        yield m.type + ":" + m.content + "\n\n"
+
+
+def chunk_cut(texts: Iterable[str]) -> Iterator[str]:
+    """
+    将输入文本流切分成多个块
+    每读入一段就切分缓冲区,除最后一块外全部产出;最后一块可能被截断,留在缓冲区与下一段拼接
+    """
+    buffer = ""
+    for text in texts:
+        buffer += text
+        pieces = splitter.split_text(buffer)
+        if not pieces:
+            continue
+        yield from pieces[:-1]
+        buffer = pieces[-1]
+    if buffer:
+        yield from splitter.split_text(buffer)
+
 
 def llm_call(state: State):
     """LLM 调用节点"""
     # 1,获取当前阅读的文本
-    current_text=f"chunk_index:{state.chunk_index},text:往下读,你看到`{state.chunk[state.chunk_index]}`"
+    current_text=f"chunk_index:{state.chunk_index},text:往下读,你看到`{state.chunk}`"
     # 2,获取上一轮的`印象`
     impression_text=state.impression
     # 2,调用LLM
@@ -92,36 +121,39 @@ def llm_call(state: State):
     print( f"{Fore.BLUE}response.content:{response.content}")
     print(f"{Fore.GREEN}current_text:{current_text}")
     print("=====================")
-    return {"messages": [response],
-            "impression":response.content,
-            "chunk_index":state.chunk_index+1
-            }
+    return {"impression":response.content}
 
 
-def goto_next_or_end(state: State):
-    if state.chunk_index<state.chunk_max_size-1:
-        return "llm_call"
-    return END
-
+# 图只负责读一块: START -> llm_call -> END
+# 循环放在图外,每块单独 invoke 一次,递归深度不随文档长度增长
 graph_build = StateGraph(State)
-graph_build.add_node("chunk_cut",chunk_cut)
 graph_build.add_node("llm_call",llm_call)
-graph_build.add_edge(START,"chunk_cut")
-graph_build.add_edge("chunk_cut","llm_call")
-graph_build.add_conditional_edges(
-    "llm_call",
-    goto_next_or_end,
-    {   
-        "llm_call":"llm_call",
-        END:END
-    }
-)
+graph_build.add_edge(START,"llm_call")
+graph_build.add_edge("llm_call",END)
 
+graph = graph_build.compile(name="agent")
 
 
-graph = graph_build.compile(name="agent")
+def read_stream(chunks: Iterable[str], impression: str = "") -> Iterator[Tuple[int, str]]:
+    """
+    马尔可夫式阅读
+    逐块调用图,下一块只带上一块产生的`印象`;每读完一块产出 (块索引, 当前印象)
+    """
+    for chunk_index, chunk in enumerate(chunks):
+        state = graph.invoke({"chunk_index": chunk_index, "chunk": chunk, "impression": impression})
+        impression = state["impression"]
+        yield chunk_index, impression
+
 
-info=graph.invoke({"messages":[
+def read(source: Union[str, Iterable[str]], impression: str = "") -> str:
+    """读完整个来源(文件路径或文本迭代器),返回最终印象"""
+    texts = read_file(source) if isinstance(source, str) else source
+    for _, impression in read_stream(chunk_cut(texts), impression):
+        pass
+    return impression
+
+
+demo_messages = [
     SystemMessage(content="""
         你们将阅读一个聊天记录,包括了一个人和AI的对话过程
         """),
@@ -683,4 +715,12 @@ info=graph.invoke({"messages":[
 
         Go.
     """)
-    ]})
\ No newline at end of file
+]
+
+
+if __name__ == "__main__":
+    # python main.py <聊天记录文件>;不给参数时阅读内置的示例聊天记录
+    if len(sys.argv) > 1:
+        info = read(sys.argv[1])
+    else:
+        info = read(read_messages(demo_messages))